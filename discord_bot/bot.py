@@ -1,3 +1,4 @@
+import asyncio
 import discord
 from discord import app_commands
 import os
@@ -8,6 +9,7 @@ from sqlalchemy import text
 # 共有フォルダからインポート
 from database import engine
 from scraper import update_public_url
+from bot_data import run_blocking, status_cache, player_stats_cache
 
 TOKEN = os.getenv("DISCORD_BOT_TOKEN")
 SHARED_ID = os.getenv("SHARED_LOGIN_ID")
@@ -20,6 +22,10 @@ class SF6Bot(discord.Client):
         self.tree = app_commands.CommandTree(self)
 
     async def setup_hook(self):
+        # system_status の変更通知を受けてキャッシュを破棄するスレッドを起動
+        status_cache.start_listener(asyncio.get_running_loop())
+        # /stats 用の要約を読み込み、player_analytics の変更通知で差し替えるスレッドを起動
+        player_stats_cache.start()
         await self.tree.sync()
         print("✅ Discord Bot スラッシュコマンド同期完了")
 
@@ -27,10 +33,8 @@ bot = SF6Bot()
 
 @bot.tree.command(name="url", description="現在のURLとログイン情報を表示します")
 async def send_url(interaction: discord.Interaction):
-    with engine.connect() as conn:
-        res = conn.execute(text("SELECT value FROM system_status WHERE key = 'public_url'"))
-        row = res.fetchone()
-        url = row[0] if row else "URLが未登録です。"
+    # 通常はメモリ上のキャッシュから即答する (URL更新時はDBからの通知で破棄される)
+    url = await status_cache.get("public_url") or "URLが未登録です。"
     
     # メッセージの組み立て
     response_msg = f"🌐 **SF6分析ダッシュボード**\n{url}"
@@ -49,13 +53,12 @@ async def refresh_url(interaction: discord.Interaction):
     
     try:
         # scraper.pyの関数を呼び出し（引数にはログ用のprintを渡す）
-        update_public_url(print)
+        # 最大1分ほどかかるため、イベントループを止めないよう別スレッドで実行する
+        await run_blocking(update_public_url, print)
         
         # 更新後のURLをDBから取得
-        with engine.connect() as conn:
-            res = conn.execute(text("SELECT value FROM system_status WHERE key = 'public_url'"))
-            row = res.fetchone()
-            url = row[0] if row else "更新に失敗した可能性があります。"
+        status_cache.invalidate("public_url")
+        url = await status_cache.get("public_url") or "更新に失敗した可能性があります。"
         
         await interaction.followup.send(f"✅ URLを最新に更新しました！メンバーの皆さんは `/url` で確認してください。(ID,PWがわからない人も `/url` で確認ください。)\n{url}")
     except Exception as e:
@@ -69,12 +72,15 @@ async def add_request(interaction: discord.Interaction, content: str):
     if len(content) > 100:
         return await interaction.response.send_message("❌ 要望は100文字以内でお願いします。", ephemeral=True)
 
-    try:
+    def insert_request():
         with engine.begin() as conn:
             conn.execute(
                 text("INSERT INTO feature_requests (content) VALUES (:content)"),
                 {"content": content}
             )
+
+    try:
+        await run_blocking(insert_request)
         
         await interaction.response.send_message(
             "🙏 匿名で要望を受け付けました！ありがとうございます。", 
@@ -89,9 +95,12 @@ async def show_requests(interaction: discord.Interaction):
     # もし自分だけに見せたいなら、ここに自分のDiscord IDチェックを入れる
     # if interaction.user.id != 123456789: return
     
-    with engine.connect() as conn:
-        res = conn.execute(text("SELECT content, created_at FROM feature_requests ORDER BY created_at DESC LIMIT 10"))
-        rows = res.fetchall()
+    def load_requests():
+        with engine.connect() as conn:
+            res = conn.execute(text("SELECT content, created_at FROM feature_requests ORDER BY created_at DESC LIMIT 10"))
+            return res.fetchall()
+
+    rows = await run_blocking(load_requests)
     
     if not rows:
         return await interaction.response.send_message("📭 現在、届いている要望はありません。", ephemeral=True)
@@ -104,5 +113,48 @@ async def show_requests(interaction: discord.Interaction):
     
     await interaction.response.send_message(msg, ephemeral=True)
 
+# --- コマンド5: 戦績の要約 ---
+def _rate(wins, matches):
+    return f"{wins / matches * 100:.0f}%" if matches else "-"
+
+def _signed(value):
+    return "-" if value is None else f"{value:+d}"
+
+def format_stats(s):
+    recent = s["recent"]
+    recent_wins = sum(m[2] for m in recent)
+    lines = [f"📊 **{s['my_name']}** の戦績"]
+    if recent:
+        marks = "".join("○" if m[2] else "●" for m in recent)
+        lines.append(f"直近{len(recent)}戦: {marks}（{recent_wins}勝{len(recent) - recent_wins}敗 / 勝率 {_rate(recent_wins, len(recent))}）")
+        mrs = [m[1] for m in recent if m[1]]
+        recent_delta = mrs[-1] - mrs[0] if len(mrs) >= 2 else None
+        lines.append(f"MR: {s['latest_mr'] or '-'}（直近{len(recent)}戦 {_signed(recent_delta)} / 前回セッション {_signed(s['last_session_mr_delta'])}）")
+    lines.append(f"通算: {s['wins']}勝{s['matches'] - s['wins']}敗（勝率 {_rate(s['wins'], s['matches'])}）")
+    streak = s["current_streak"] or 0
+    if streak:
+        lines.append(f"{'🔥' if streak > 0 else '🥶'} 現在 {abs(streak)}{'連勝' if streak > 0 else '連敗'}中")
+    if s["worst_char"]:
+        worst_wins = round(s["worst_win_rate"] * s["worst_matches"])
+        lines.append(f"苦手: {s['worst_char']}（{s['worst_control']}） {worst_wins}勝{s['worst_matches'] - worst_wins}敗 / 勝率 {_rate(worst_wins, s['worst_matches'])}")
+    if s["last_played_at"]:
+        lines.append(f"🗓 最終対戦: {s['last_played_at'].strftime('%m/%d %H:%M')}")
+    return "\n".join(lines)
+
+@bot.tree.command(name="stats", description="プレイヤーの直近の勝敗・勝率・MR増減・苦手キャラを表示します")
+@app_commands.describe(player="プレイヤー名")
+async def show_stats(interaction: discord.Interaction, player: str):
+    # DBへは問い合わせず、メモリ上の要約から即答する (新しい試合が反映されると通知で差し替わる)
+    summary = player_stats_cache.get(player.strip())
+    if summary is None:
+        if not player_stats_cache.loaded:
+            return await interaction.response.send_message("⏳ 戦績を読み込み中です。少し待ってから再度お試しください。", ephemeral=True)
+        return await interaction.response.send_message(f"❌ `{player}` の戦績が見つかりません。巡回対象のプレイヤー名を指定してください。", ephemeral=True)
+    await interaction.response.send_message(format_stats(summary))
+
+@show_stats.autocomplete("player")
+async def stats_player_autocomplete(interaction: discord.Interaction, current: str):
+    return [app_commands.Choice(name=n, value=n) for n in player_stats_cache.names(current)]
+
 if __name__ == "__main__":
     bot.run(TOKEN)
\ No newline at end of file
@@ -0,0 +1,216 @@
+import asyncio
+import queue
+import select
+import threading
+import time
+import psycopg2
+from sqlalchemy import bindparam, text
+
+# 共有フォルダからインポート
+from config import BOT_STATS_RECENT_MATCHES, BOT_STATS_MIN_MATCHUP_MATCHES
+from database import engine
+
+NOTIFY_CHANNEL = "system_status_changed"
+PLAYER_NOTIFY_CHANNEL = "player_analytics_changed"
+
+# 分析サマリーと、対戦数が一定以上の相手キャラ×操作タイプのうち最も勝率が低いもの
+PLAYER_SUMMARY_SQL = """
+    SELECT a.my_name, a.matches, a.wins, a.latest_mr, a.current_streak, a.last_session_mr_delta, a.last_played_at,
+        w.opponent_char AS worst_char, w.opponent_control AS worst_control, w.matches AS worst_matches, w.win_rate AS worst_win_rate
+    FROM player_analytics a
+    LEFT JOIN LATERAL (
+        SELECT opponent_char, opponent_control, SUM(matches) AS matches, SUM(wins)::FLOAT / SUM(matches) AS win_rate
+        FROM player_matchup_matrix m
+        WHERE m.my_name = a.my_name
+        GROUP BY opponent_char, opponent_control
+        HAVING SUM(matches) >= :min_matches
+        ORDER BY win_rate, matches DESC
+        LIMIT 1
+    ) w ON TRUE
+"""
+
+# プレイヤーごとの直近 :n 試合 (idx_battle_facts_player_played_at で新しい順に読む)
+PLAYER_RECENT_SQL = """
+    SELECT a.my_name, r.played_at, r.my_mr, r.is_win
+    FROM player_analytics a
+    JOIN players p ON p.name = a.my_name
+    CROSS JOIN LATERAL (
+        SELECT f.played_at, f.my_mr, f.is_win
+        FROM battle_facts f
+        WHERE f.my_player_id = p.id AND f.played_at IS NOT NULL
+        ORDER BY f.played_at DESC, f.battle_key DESC
+        LIMIT :n
+    ) r
+"""
+
+async def run_blocking(func, *args):
+    """同期的な処理 (DBアクセスやHTTP通信) をスレッドで実行し、イベントループを止めない"""
+    return await asyncio.to_thread(func, *args)
+
+def _load_status(key):
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT value FROM system_status WHERE key = :key"), {"key": key}).fetchone()
+    return row[0] if row else None
+
+class StatusCache:
+    """system_status の値をメモリに保持する。DBの変更通知 (LISTEN/NOTIFY) を受けると該当キーを破棄する"""
+
+    def __init__(self):
+        self._values = {}
+        self._generation = 0
+        self._loop = None
+        self._thread = None
+
+    async def get(self, key):
+        if key in self._values:
+            return self._values[key]
+        generation = self._generation
+        value = await run_blocking(_load_status, key)
+        # 読み込み中に変更通知が届いていたら、古い値の可能性があるため保持しない
+        if generation == self._generation:
+            self._values[key] = value
+        return value
+
+    def invalidate(self, key=None):
+        self._generation += 1
+        if key is None:
+            self._values.clear()
+        else:
+            self._values.pop(key, None)
+
+    def start_listener(self, loop):
+        """通知を待ち受けるスレッドを起動する (Bot起動時に1回呼ぶ)"""
+        if self._thread is not None:
+            return
+        self._loop = loop
+        self._thread = threading.Thread(target=self._listen_forever, name="StatusListener", daemon=True)
+        self._thread.start()
+
+    def _invalidate_threadsafe(self, key=None):
+        self._loop.call_soon_threadsafe(self.invalidate, key)
+
+    def _listen_forever(self):
+        # 接続し直した直後は取りこぼした通知があり得るため全て破棄する
+        listen_forever(NOTIFY_CHANNEL, self._invalidate_threadsafe, self._invalidate_threadsafe)
+
+def listen_forever(channel, on_notify, on_reconnect):
+    """channel の通知ごとに on_notify(payload) を呼ぶ。接続が切れたら再接続し、そのたびに on_reconnect() を呼ぶ"""
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(**engine.url.translate_connect_args(username="user"))
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {channel};")
+            on_reconnect()
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    on_notify(conn.notifies.pop(0).payload)
+        except Exception as e:
+            print(f"⚠️ 変更通知 ({channel}) の待ち受けに失敗しました。再接続します: {e}")
+            on_reconnect()
+        finally:
+            if conn is not None:
+                conn.close()
+        time.sleep(5)
+
+def _load_player_summaries(names=None):
+    """/stats 用の要約を {プレイヤー名: 要約} で返す。names を省略すると分析済みの全員分"""
+    summary_sql, recent_sql = PLAYER_SUMMARY_SQL, PLAYER_RECENT_SQL
+    params = {"min_matches": BOT_STATS_MIN_MATCHUP_MATCHES, "n": BOT_STATS_RECENT_MATCHES}
+    if names is not None:
+        summary_sql += " WHERE a.my_name IN :names"
+        recent_sql += " WHERE a.my_name IN :names"
+        params["names"] = list(names)
+    summary_stmt, recent_stmt = text(summary_sql), text(recent_sql)
+    if names is not None:
+        summary_stmt = summary_stmt.bindparams(bindparam("names", expanding=True))
+        recent_stmt = recent_stmt.bindparams(bindparam("names", expanding=True))
+
+    with engine.connect() as conn:
+        summaries = {r.my_name: {**r._mapping, "recent": []} for r in conn.execute(summary_stmt, params)}
+        for r in conn.execute(recent_stmt, params):
+            if r.my_name in summaries:
+                summaries[r.my_name]["recent"].append((r.played_at, r.my_mr, r.is_win))
+    # 直近の試合は古い順に並べ直す
+    for s in summaries.values():
+        s["recent"].sort(key=lambda m: m[0])
+    return summaries
+
+class PlayerStatsCache:
+    """/stats 用のプレイヤー別要約をメモリに保持する
+
+    コマンドはメモリ上の値だけを読んで即答する (DBが巡回で混んでいても待たない)。
+    analytics.py が player_analytics を更新すると通知が届き、そのプレイヤーの分だけ別スレッドで読み直して差し替える。
+    """
+
+    def __init__(self):
+        self._summaries = {}
+        self._keys = {}        # 小文字化した名前 → プレイヤー名 (大文字小文字を区別せずに引くため)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._threads = []
+        self.loaded = False
+
+    def get(self, name):
+        with self._lock:
+            key = name if name in self._summaries else self._keys.get(name.lower())
+            return self._summaries.get(key)
+
+    def names(self, prefix="", limit=25):
+        """名前の候補 (オートコンプリート用)"""
+        prefix = prefix.lower()
+        with self._lock:
+            return sorted(n for n in self._summaries if prefix in n.lower())[:limit]
+
+    def start(self):
+        """全員分の読み込みと通知の待ち受けを開始する (Bot起動時に1回呼ぶ)"""
+        if self._threads:
+            return
+        self._threads = [
+            threading.Thread(target=listen_forever, args=(PLAYER_NOTIFY_CHANNEL, self._queue.put, self._reload_all),
+                             name="PlayerStatsListener", daemon=True),
+            threading.Thread(target=self._refresh_forever, name="PlayerStatsRefresher", daemon=True),
+        ]
+        for t in self._threads: t.start()
+
+    def _reload_all(self):
+        # 通知を取りこぼした可能性があるときは全員分を読み直す
+        self._queue.put(None)
+
+    def _refresh_forever(self):
+        while True:
+            pending = [self._queue.get()]
+            # 巡回が続くと同じプレイヤーの通知がまとめて届くため、溜まっている分を1回で読み直す
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            names = None if None in pending else set(pending)
+            try:
+                summaries = _load_player_summaries(names)
+            except Exception as e:
+                print(f"⚠️ /stats 用の要約の読み込みに失敗しました: {e}")
+                time.sleep(5)
+                for name in (pending if names is not None else [None]):
+                    self._queue.put(name)
+                continue
+            self._apply(names, summaries)
+
+    def _apply(self, names, summaries):
+        """読み直した要約を反映する。names が None なら全員分を差し替え、それ以外は該当プレイヤーだけ (消えていれば削除)"""
+        with self._lock:
+            if names is None:
+                self._summaries = summaries
+            else:
+                for name in names:
+                    if name in summaries:
+                        self._summaries[name] = summaries[name]
+                    else:
+                        self._summaries.pop(name, None)
+            self._keys = {n.lower(): n for n in self._summaries}
+            self.loaded = True
+
+status_cache = StatusCache()
+player_stats_cache = PlayerStatsCache()
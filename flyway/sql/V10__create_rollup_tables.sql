@@ -0,0 +1,45 @@
+-- ==========================================
+-- 10. ダッシュボード用の事前集計テーブル
+--     取り込み時に差分加算し、画面表示のたびに battle_results を集計しないようにする
+-- ==========================================
+CREATE TABLE IF NOT EXISTS daily_player_summary (
+    my_name TEXT NOT NULL,
+    day DATE NOT NULL,
+    matches INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    max_mr INTEGER,
+    PRIMARY KEY (my_name, day)
+);
+
+CREATE TABLE IF NOT EXISTS matchup_summary (
+    my_name TEXT NOT NULL,
+    opponent_char TEXT NOT NULL,
+    opponent_control TEXT NOT NULL,
+    matches INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (my_name, opponent_char, opponent_control)
+);
+
+-- 既存データのバックフィル
+INSERT INTO daily_player_summary (my_name, day, matches, wins, max_mr)
+SELECT my_name, played_at::DATE, COUNT(*), SUM(is_win), MAX(my_mr)
+FROM battle_facts
+WHERE my_name IS NOT NULL AND played_at IS NOT NULL
+GROUP BY my_name, played_at::DATE
+ON CONFLICT (my_name, day) DO NOTHING;
+
+INSERT INTO matchup_summary (my_name, opponent_char, opponent_control, matches, wins)
+SELECT my_name, COALESCE(opponent_char, 'Unknown'), COALESCE(opponent_control, 'Unknown'), COUNT(*), SUM(is_win)
+FROM battle_facts
+WHERE my_name IS NOT NULL
+GROUP BY my_name, COALESCE(opponent_char, 'Unknown'), COALESCE(opponent_control, 'Unknown')
+ON CONFLICT (my_name, opponent_char, opponent_control) DO NOTHING;
+
+COMMENT ON TABLE daily_player_summary IS 'プレイヤー×日ごとの試合数・勝利数・最高MR (日次MR推移・日別勝率用)';
+COMMENT ON COLUMN daily_player_summary.day IS '試合日';
+COMMENT ON COLUMN daily_player_summary.matches IS '試合数';
+COMMENT ON COLUMN daily_player_summary.wins IS '勝利数';
+COMMENT ON COLUMN daily_player_summary.max_mr IS 'その日の最高MR/LP';
+COMMENT ON TABLE matchup_summary IS 'プレイヤー×相手キャラ×相手操作タイプごとの試合数・勝利数 (キャラ別・操作タイプ別勝率用)';
+COMMENT ON COLUMN matchup_summary.opponent_char IS '相手キャラ';
+COMMENT ON COLUMN matchup_summary.opponent_control IS '相手の操作タイプ';
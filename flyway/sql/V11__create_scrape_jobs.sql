@@ -0,0 +1,37 @@
+-- ==========================================
+-- 11. 巡回ジョブキュー (scrape_jobs)
+--     ワーカーは FOR UPDATE SKIP LOCKED で1件ずつ取得し、リース期限切れのジョブは再取得される
+-- ==========================================
+CREATE TABLE IF NOT EXISTS scrape_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    user_code TEXT NOT NULL,
+    player_name TEXT,
+    max_pages INTEGER NOT NULL DEFAULT 2,
+    incremental BOOLEAN NOT NULL DEFAULT TRUE,
+    slot_key TEXT,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by TEXT,
+    lease_until TIMESTAMP WITH TIME ZONE,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    -- 定期実行は (ユーザー, 実行枠) ごとに1件だけ登録する。手動実行は slot_key が NULL のため重複可
+    UNIQUE (user_code, slot_key)
+);
+
+-- 取得対象 (待機中・実行中) のみを対象にした部分インデックス
+CREATE INDEX IF NOT EXISTS idx_scrape_jobs_pending ON scrape_jobs (run_after, id) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS idx_scrape_jobs_created_at ON scrape_jobs (created_at DESC);
+
+COMMENT ON TABLE scrape_jobs IS '巡回ジョブキュー。定期実行・手動実行ともにここへ登録し、ワーカーが処理する';
+COMMENT ON COLUMN scrape_jobs.slot_key IS '定期実行の枠 (例: 2024-01-01 09:00)。手動実行はNULL';
+COMMENT ON COLUMN scrape_jobs.status IS 'ジョブ状態（queued:待機, running:実行中, done:完了, failed:失敗）';
+COMMENT ON COLUMN scrape_jobs.attempts IS '実行を試みた回数';
+COMMENT ON COLUMN scrape_jobs.run_after IS 'この日時以降に実行する (リトライ時のバックオフに使用)';
+COMMENT ON COLUMN scrape_jobs.locked_by IS '実行中のワーカーID';
+COMMENT ON COLUMN scrape_jobs.lease_until IS 'リース期限。過ぎても完了しない場合は他のワーカーが再取得する';
+COMMENT ON COLUMN scrape_jobs.last_error IS '直近の失敗理由';
@@ -0,0 +1,17 @@
+-- ==========================================
+-- 12. system_status 変更時の通知 (LISTEN/NOTIFY)
+--     Discord Bot はこの通知を受けてメモリ上のキャッシュを破棄する
+-- ==========================================
+CREATE OR REPLACE FUNCTION notify_system_status_changed() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('system_status_changed', NEW.key);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_system_status_changed ON system_status;
+CREATE TRIGGER trg_system_status_changed
+    AFTER INSERT OR UPDATE ON system_status
+    FOR EACH ROW EXECUTE FUNCTION notify_system_status_changed();
+
+COMMENT ON FUNCTION notify_system_status_changed() IS 'system_status の変更を system_status_changed チャネルへ通知する';
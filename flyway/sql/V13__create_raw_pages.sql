@@ -0,0 +1,21 @@
+-- ==========================================
+-- 13. 取得ページの原本アーカイブ索引 (raw_pages)
+--     本文は内容ハッシュ名の zstd 圧縮ファイルとして ARCHIVE_DIR に保存し、ここには取得履歴のみを記録する
+-- ==========================================
+CREATE TABLE IF NOT EXISTS raw_pages (
+    id BIGSERIAL PRIMARY KEY,
+    content_hash CHAR(64) NOT NULL,
+    user_code TEXT NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    page_no INTEGER NOT NULL DEFAULT 1,
+    fetched_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_raw_pages_fetched_at ON raw_pages (fetched_at);
+CREATE INDEX IF NOT EXISTS idx_raw_pages_hash ON raw_pages (content_hash);
+
+COMMENT ON TABLE raw_pages IS '取得したページ原本の索引。同一内容は content_hash で1ファイルに集約される';
+COMMENT ON COLUMN raw_pages.content_hash IS '本文のSHA-256 (アーカイブファイル名)';
+COMMENT ON COLUMN raw_pages.kind IS 'ページ種別（play:プロフィール/実績, battlelog:戦績）';
+COMMENT ON COLUMN raw_pages.page_no IS '戦績のページ番号 (playは1)';
+COMMENT ON COLUMN raw_pages.fetched_at IS '取得日時';
@@ -0,0 +1,11 @@
+-- ==========================================
+-- 14. 過去戦績の一括取得ジョブ (scrape_jobs の拡張)
+--     mode = 'backfill' のジョブは複数タブでページを並列取得し、進捗を pages_done / pages_total に記録する
+-- ==========================================
+ALTER TABLE scrape_jobs ADD COLUMN IF NOT EXISTS mode VARCHAR(20) NOT NULL DEFAULT 'crawl';
+ALTER TABLE scrape_jobs ADD COLUMN IF NOT EXISTS pages_done INTEGER;
+ALTER TABLE scrape_jobs ADD COLUMN IF NOT EXISTS pages_total INTEGER;
+
+COMMENT ON COLUMN scrape_jobs.mode IS 'ジョブ種別（crawl:通常巡回, backfill:過去戦績の一括取得）';
+COMMENT ON COLUMN scrape_jobs.pages_done IS '取得済みの戦績ページ数 (backfillのみ)';
+COMMENT ON COLUMN scrape_jobs.pages_total IS '取得予定の戦績ページ数 (backfillのみ)';
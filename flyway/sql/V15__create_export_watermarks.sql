@@ -0,0 +1,15 @@
+-- ==========================================
+-- 15. Parquet書き出しの到達点管理 (export_watermarks)
+--     export.py は前回の到達点より後に追加された行だけを書き出す
+-- ==========================================
+CREATE TABLE IF NOT EXISTS export_watermarks (
+    name TEXT PRIMARY KEY,
+    last_id BIGINT,
+    last_date DATE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE export_watermarks IS 'Parquet書き出しの到達点。書き出し先ごとに1行';
+COMMENT ON COLUMN export_watermarks.name IS '書き出し先 (battle_results / player_stats)';
+COMMENT ON COLUMN export_watermarks.last_id IS '書き出し済みの battle_results.id の最大値';
+COMMENT ON COLUMN export_watermarks.last_date IS '書き出し済みの player_stats.recorded_at の最終日';
@@ -0,0 +1,70 @@
+-- ==========================================
+-- 16. プレイヤー別の分析結果テーブル (analytics.py が書き込む)
+--     直近勝率・連勝/連敗・セッションごとのMR増減・キャラ×操作タイプの相性表・統計の日次推移を
+--     Metabase や Bot から集計なしで読めるようにする
+-- ==========================================
+CREATE TABLE IF NOT EXISTS player_analytics (
+    my_name TEXT PRIMARY KEY,
+    user_code TEXT,
+    last_battle_id TEXT,
+    last_played_at TIMESTAMP,
+    matches INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    rolling_win_rate DOUBLE PRECISION,
+    current_streak INTEGER,
+    best_win_streak INTEGER,
+    worst_lose_streak INTEGER,
+    latest_mr INTEGER,
+    last_session_mr_delta INTEGER,
+    sessions INTEGER,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS player_sessions (
+    my_name TEXT NOT NULL,
+    session_start TIMESTAMP NOT NULL,
+    session_end TIMESTAMP NOT NULL,
+    matches INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    mr_start INTEGER,
+    mr_end INTEGER,
+    mr_delta INTEGER,
+    rolling_win_rate DOUBLE PRECISION,
+    PRIMARY KEY (my_name, session_start)
+);
+
+CREATE TABLE IF NOT EXISTS player_matchup_matrix (
+    my_name TEXT NOT NULL,
+    my_char TEXT NOT NULL,
+    opponent_char TEXT NOT NULL,
+    opponent_control TEXT NOT NULL,
+    matches INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    win_rate DOUBLE PRECISION,
+    PRIMARY KEY (my_name, my_char, opponent_char, opponent_control)
+);
+
+CREATE TABLE IF NOT EXISTS player_stats_trends (
+    user_id TEXT NOT NULL,
+    recorded_at DATE NOT NULL,
+    metric TEXT NOT NULL,
+    value DOUBLE PRECISION,
+    rolling_avg DOUBLE PRECISION,
+    delta DOUBLE PRECISION,
+    PRIMARY KEY (user_id, metric, recorded_at)
+);
+
+COMMENT ON TABLE player_analytics IS 'プレイヤーごとの分析サマリー。last_battle_id が最新試合と一致していれば再計算しない';
+COMMENT ON COLUMN player_analytics.last_battle_id IS '計算に含めた最新の試合ID (キャッシュキー)';
+COMMENT ON COLUMN player_analytics.rolling_win_rate IS '直近 ANALYTICS_ROLLING_WINDOW 試合の勝率';
+COMMENT ON COLUMN player_analytics.current_streak IS '現在の連勝数 (連敗中は負の値)';
+COMMENT ON COLUMN player_analytics.best_win_streak IS '最大連勝数';
+COMMENT ON COLUMN player_analytics.worst_lose_streak IS '最大連敗数';
+COMMENT ON COLUMN player_analytics.last_session_mr_delta IS '直近セッションのMR増減';
+COMMENT ON TABLE player_sessions IS '試合間隔が ANALYTICS_SESSION_GAP_MIN 分を超えたら区切ったプレイセッションごとの成績';
+COMMENT ON COLUMN player_sessions.mr_delta IS 'セッション中のMR増減 (最後の試合 - 最初の試合)';
+COMMENT ON COLUMN player_sessions.rolling_win_rate IS 'セッション終了時点の直近勝率';
+COMMENT ON TABLE player_matchup_matrix IS '自キャラ×相手キャラ×相手操作タイプごとの勝率表';
+COMMENT ON TABLE player_stats_trends IS 'player_stats の項目ごとの日次推移 (縦持ち)';
+COMMENT ON COLUMN player_stats_trends.rolling_avg IS '直近7回の記録の平均';
+COMMENT ON COLUMN player_stats_trends.delta IS '前回の記録からの増減';
@@ -0,0 +1,242 @@
+-- ==========================================
+-- 17. battle_results / battle_facts の正規化
+--     ・試合IDを固定長の64bitハッシュ (battle_key) に置き換える。
+--       従来のIDは同じ分に同じ相手と続けて対戦すると衝突したため、両者の試合時点のMRもハッシュに含める
+--     ・プレイヤー名・キャラ名・操作タイプを小さな辞書テーブルへ移し、整数IDで参照する
+--     既存の列構成で参照したい場合は v_battle_results (battle_results と同じ列 + battle_key) を使う。
+--     v_battle_analytics の列構成は変わらない (末尾に battle_key を追加)。
+-- ==========================================
+
+-- 辞書テーブル
+CREATE TABLE IF NOT EXISTS players (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS characters (
+    id SMALLSERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS control_types (
+    id SMALLSERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+INSERT INTO control_types (name) VALUES ('Classic'), ('Modern') ON CONFLICT (name) DO NOTHING;
+
+INSERT INTO players (name)
+SELECT p1_name FROM battle_results WHERE p1_name IS NOT NULL
+UNION SELECT p2_name FROM battle_results WHERE p2_name IS NOT NULL
+ON CONFLICT (name) DO NOTHING;
+
+INSERT INTO characters (name)
+SELECT p1_char FROM battle_results WHERE p1_char IS NOT NULL
+UNION SELECT p2_char FROM battle_results WHERE p2_char IS NOT NULL
+ON CONFLICT (name) DO NOTHING;
+
+INSERT INTO control_types (name)
+SELECT p1_control FROM battle_results WHERE p1_control IS NOT NULL
+UNION SELECT p2_control FROM battle_results WHERE p2_control IS NOT NULL
+ON CONFLICT (name) DO NOTHING;
+
+-- 従来の試合ID文字列 (rank_ + 試合日時(分) + P1名 + P2名) と両者のMRから64bitキーを求める。
+-- ingest.battle_key() と同じ計算 (「ID|P1 MR|P2 MR」の MD5 の先頭8バイトを符号付き64bit整数として読む)
+CREATE OR REPLACE FUNCTION battle_key(battle_id TEXT, p1_mr INTEGER, p2_mr INTEGER) RETURNS BIGINT AS $$
+    SELECT ('x' || substr(md5(battle_id || '|' || COALESCE(p1_mr, 0) || '|' || COALESCE(p2_mr, 0)), 1, 16))::BIT(64)::BIGINT;
+$$ LANGUAGE SQL IMMUTABLE;
+
+COMMENT ON FUNCTION battle_key(TEXT, INTEGER, INTEGER) IS '試合ID文字列と両者のMRから battle_results.battle_key を求める';
+
+-- ------------------------------------------
+-- battle_results を新しい列構成で作り直す (V9 と同じく退避 → 作成 → 移行 → 削除)
+-- ------------------------------------------
+DROP VIEW IF EXISTS v_battle_analytics;
+
+ALTER TABLE battle_results RENAME TO battle_results_legacy;
+ALTER TABLE battle_results_legacy RENAME CONSTRAINT battle_results_pkey TO battle_results_legacy_pkey;
+ALTER TABLE battle_results_legacy RENAME CONSTRAINT battle_results_battle_id_played_at_key TO battle_results_legacy_battle_id_played_at_key;
+ALTER INDEX idx_battle_results_played_at_brin RENAME TO idx_battle_results_legacy_played_at_brin;
+
+-- 月別パーティションも退避名に変える (新テーブル側で同じ名前のパーティションを作るため)
+DO $$
+DECLARE
+    part RECORD;
+BEGIN
+    FOR part IN
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'battle_results_legacy'::regclass
+    LOOP
+        EXECUTE format('ALTER TABLE %I RENAME TO %I', part.relname, replace(part.relname, 'battle_results_', 'battle_results_legacy_'));
+    END LOOP;
+END $$;
+
+CREATE TABLE battle_results (
+    id INTEGER NOT NULL DEFAULT nextval('battle_results_id_seq'),
+    battle_key BIGINT NOT NULL,
+    played_at TIMESTAMP NOT NULL,
+    mode TEXT,
+    p1_player_id INTEGER REFERENCES players (id),
+    p1_char_id SMALLINT REFERENCES characters (id),
+    p1_mr INTEGER,
+    p1_control_id SMALLINT REFERENCES control_types (id),
+    p1_result TEXT,
+    p2_player_id INTEGER REFERENCES players (id),
+    p2_char_id SMALLINT REFERENCES characters (id),
+    p2_mr INTEGER,
+    p2_control_id SMALLINT REFERENCES control_types (id),
+    p2_result TEXT,
+    PRIMARY KEY (id, played_at),
+    UNIQUE (battle_key, played_at)
+) PARTITION BY RANGE (played_at);
+
+ALTER SEQUENCE battle_results_id_seq OWNED BY battle_results.id;
+
+CREATE INDEX IF NOT EXISTS idx_battle_results_played_at_brin ON battle_results USING BRIN (played_at);
+
+DO $$
+DECLARE
+    m TIMESTAMP;
+BEGIN
+    FOR m IN
+        SELECT generate_series(
+            date_trunc('month', COALESCE((SELECT MIN(played_at) FROM battle_results_legacy), CURRENT_TIMESTAMP::TIMESTAMP)),
+            date_trunc('month', CURRENT_TIMESTAMP::TIMESTAMP + INTERVAL '1 month'),
+            INTERVAL '1 month'
+        )
+    LOOP
+        PERFORM ensure_battle_results_partition(m);
+    END LOOP;
+END $$;
+
+-- MRまで同じ試合は1行にまとめる。まとめた (ON CONFLICT で捨てた) 行数を NOTICE で出力する
+DO $$
+DECLARE
+    legacy_rows BIGINT;
+    migrated_rows BIGINT;
+BEGIN
+    SELECT COUNT(*) INTO legacy_rows FROM battle_results_legacy;
+
+    INSERT INTO battle_results (id, battle_key, played_at, mode,
+        p1_player_id, p1_char_id, p1_mr, p1_control_id, p1_result,
+        p2_player_id, p2_char_id, p2_mr, p2_control_id, p2_result)
+    SELECT r.id, battle_key(r.battle_id, r.p1_mr, r.p2_mr), r.played_at, r.mode,
+        p1.id, c1.id, r.p1_mr, k1.id, r.p1_result,
+        p2.id, c2.id, r.p2_mr, k2.id, r.p2_result
+    FROM battle_results_legacy r
+    LEFT JOIN players p1 ON p1.name = r.p1_name
+    LEFT JOIN characters c1 ON c1.name = r.p1_char
+    LEFT JOIN control_types k1 ON k1.name = r.p1_control
+    LEFT JOIN players p2 ON p2.name = r.p2_name
+    LEFT JOIN characters c2 ON c2.name = r.p2_char
+    LEFT JOIN control_types k2 ON k2.name = r.p2_control
+    ON CONFLICT (battle_key, played_at) DO NOTHING;
+
+    GET DIAGNOSTICS migrated_rows = ROW_COUNT;
+    RAISE NOTICE 'battle_results: % 行中 % 行を移行し、battle_key が重複した % 行をスキップしました',
+        legacy_rows, migrated_rows, legacy_rows - migrated_rows;
+END $$;
+
+DROP TABLE battle_results_legacy;
+
+-- ------------------------------------------
+-- battle_facts も整数IDで作り直す
+-- ------------------------------------------
+CREATE TABLE battle_facts_new (
+    battle_key BIGINT NOT NULL,
+    side SMALLINT NOT NULL,
+    played_at TIMESTAMP,
+    my_player_id INTEGER,
+    my_char_id SMALLINT,
+    my_mr INTEGER,
+    my_result TEXT,
+    opponent_char_id SMALLINT,
+    opponent_control_id SMALLINT,
+    is_win INTEGER,
+    PRIMARY KEY (battle_key, side)
+);
+
+INSERT INTO battle_facts_new (battle_key, side, played_at, my_player_id, my_char_id, my_mr, my_result, opponent_char_id, opponent_control_id, is_win)
+SELECT battle_key, 1, played_at, p1_player_id, p1_char_id, p1_mr, p1_result, p2_char_id, p2_control_id, CASE WHEN p1_result = 'WIN' THEN 1 ELSE 0 END
+FROM battle_results
+UNION ALL
+SELECT battle_key, 2, played_at, p2_player_id, p2_char_id, p2_mr, p2_result, p1_char_id, p1_control_id, CASE WHEN p2_result = 'WIN' THEN 1 ELSE 0 END
+FROM battle_results;
+
+DROP TABLE battle_facts;
+ALTER TABLE battle_facts_new RENAME TO battle_facts;
+ALTER TABLE battle_facts RENAME CONSTRAINT battle_facts_new_pkey TO battle_facts_pkey;
+
+CREATE INDEX IF NOT EXISTS idx_battle_facts_player_played_at ON battle_facts (my_player_id, played_at);
+CREATE INDEX IF NOT EXISTS idx_battle_facts_player_opponent_char ON battle_facts (my_player_id, opponent_char_id);
+
+-- ------------------------------------------
+-- 従来の列構成で読むためのビュー
+-- ------------------------------------------
+CREATE OR REPLACE VIEW v_battle_results AS
+SELECT
+    r.id,
+    'rank_' || to_char(r.played_at, 'YYYYMMDDHH24MI') || '_' || p1.name || '_' || p2.name AS battle_id,
+    r.played_at,
+    r.mode,
+    p1.name AS p1_name, c1.name AS p1_char, r.p1_mr, k1.name AS p1_control, r.p1_result,
+    p2.name AS p2_name, c2.name AS p2_char, r.p2_mr, k2.name AS p2_control, r.p2_result,
+    r.battle_key
+FROM battle_results r
+LEFT JOIN players p1 ON p1.id = r.p1_player_id
+LEFT JOIN characters c1 ON c1.id = r.p1_char_id
+LEFT JOIN control_types k1 ON k1.id = r.p1_control_id
+LEFT JOIN players p2 ON p2.id = r.p2_player_id
+LEFT JOIN characters c2 ON c2.id = r.p2_char_id
+LEFT JOIN control_types k2 ON k2.id = r.p2_control_id;
+
+-- 列構成は V3 / V8 と同一 (末尾に battle_key を追加)
+CREATE OR REPLACE VIEW v_battle_analytics AS
+SELECT
+    f.played_at,
+    p.name AS my_name,
+    c.name AS my_char,
+    f.my_mr,
+    f.my_result,
+    oc.name AS opponent_char,
+    ok.name AS opponent_control,
+    f.is_win,
+    f.battle_key
+FROM battle_facts f
+LEFT JOIN players p ON p.id = f.my_player_id
+LEFT JOIN characters c ON c.id = f.my_char_id
+LEFT JOIN characters oc ON oc.id = f.opponent_char_id
+LEFT JOIN control_types ok ON ok.id = f.opponent_control_id;
+
+-- 分析結果のキャッシュキーも battle_key に置き換える (次回の更新で全員分が再計算される)
+TRUNCATE player_analytics, player_sessions, player_matchup_matrix;
+ALTER TABLE player_analytics DROP COLUMN IF EXISTS last_battle_id;
+ALTER TABLE player_analytics ADD COLUMN IF NOT EXISTS last_battle_key BIGINT;
+
+COMMENT ON TABLE players IS 'プレイヤー名の辞書';
+COMMENT ON TABLE characters IS 'キャラ名の辞書';
+COMMENT ON TABLE control_types IS '操作タイプの辞書 (Classic / Modern)';
+COMMENT ON TABLE battle_results IS '戦績テーブル (played_at による月次レンジパーティション。名前等は辞書テーブルのIDで保持)';
+COMMENT ON COLUMN battle_results.battle_key IS '試合キー (従来の試合ID文字列のMD5先頭64bit)';
+COMMENT ON COLUMN battle_results.played_at IS '試合日時';
+COMMENT ON COLUMN battle_results.mode IS 'モード';
+COMMENT ON COLUMN battle_results.p1_player_id IS 'P1：名前 (players.id)';
+COMMENT ON COLUMN battle_results.p1_char_id IS 'P1：キャラ (characters.id)';
+COMMENT ON COLUMN battle_results.p1_mr IS 'P1：MR/LP';
+COMMENT ON COLUMN battle_results.p1_control_id IS 'P1：操作 (control_types.id)';
+COMMENT ON COLUMN battle_results.p1_result IS 'P1：結果';
+COMMENT ON COLUMN battle_results.p2_player_id IS 'P2：名前 (players.id)';
+COMMENT ON COLUMN battle_results.p2_char_id IS 'P2：キャラ (characters.id)';
+COMMENT ON COLUMN battle_results.p2_mr IS 'P2 : MR/LP';
+COMMENT ON COLUMN battle_results.p2_control_id IS 'P2 : 操作 (control_types.id)';
+COMMENT ON COLUMN battle_results.p2_result IS 'P2 : 結果';
+COMMENT ON TABLE battle_facts IS '戦績をプレイヤー視点(1試合2行)に展開した分析用ファクトテーブル。取り込み時に差分更新される';
+COMMENT ON COLUMN battle_facts.battle_key IS '試合キー (battle_results.battle_key)';
+COMMENT ON COLUMN battle_facts.side IS '視点 (1: P1, 2: P2)';
+COMMENT ON COLUMN battle_facts.my_player_id IS '視点側プレイヤー (players.id)';
+COMMENT ON COLUMN battle_facts.opponent_char_id IS '相手キャラ (characters.id)';
+COMMENT ON COLUMN battle_facts.is_win IS '勝利なら1';
+COMMENT ON VIEW v_battle_results IS 'battle_results を辞書テーブルと結合し、従来の列構成 (名前・キャラ・操作タイプの文字列) で返すビュー';
+COMMENT ON VIEW v_battle_analytics IS '自分視点と相手視点を統合した戦績分析用ビュー (battle_facts を参照)';
+COMMENT ON COLUMN player_analytics.last_battle_key IS '計算に含めた最新の試合キー (キャッシュキー)';
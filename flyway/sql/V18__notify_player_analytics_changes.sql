@@ -0,0 +1,18 @@
+-- ==========================================
+-- 18. player_analytics 変更時の通知 (LISTEN/NOTIFY)
+--     analytics.py が新しい試合を反映するとプレイヤー名を通知し、
+--     Discord Bot はそのプレイヤーの /stats 用の要約だけを読み直す
+-- ==========================================
+CREATE OR REPLACE FUNCTION notify_player_analytics_changed() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('player_analytics_changed', NEW.my_name);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_player_analytics_changed ON player_analytics;
+CREATE TRIGGER trg_player_analytics_changed
+    AFTER INSERT OR UPDATE ON player_analytics
+    FOR EACH ROW EXECUTE FUNCTION notify_player_analytics_changed();
+
+COMMENT ON FUNCTION notify_player_analytics_changed() IS 'player_analytics の変更を player_analytics_changed チャネルへ通知する';
@@ -0,0 +1,27 @@
+-- ==========================================
+-- 19. 巡回のチェックポイント (crawl_checkpoints)
+--     戦績はページごとに保存し、保存済みのページ番号をここに記録する。
+--     途中で失敗・中断した巡回は、次回そのページの続きから再開する
+-- ==========================================
+CREATE TABLE IF NOT EXISTS crawl_checkpoints (
+    user_code TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'running',
+    last_page INTEGER NOT NULL DEFAULT 0,
+    max_pages INTEGER NOT NULL,
+    cursor_battle_id TEXT,
+    cursor_played_at TIMESTAMP,
+    stop_at TIMESTAMP,
+    last_error TEXT,
+    started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT chk_crawl_checkpoints_status CHECK (status IN ('running', 'failed', 'completed'))
+);
+
+COMMENT ON TABLE crawl_checkpoints IS 'ユーザーごとの巡回の進み具合。running / failed のまま残っていれば次回は続きのページから再開する';
+COMMENT ON COLUMN crawl_checkpoints.status IS 'running: 巡回中 (中断された場合もこのまま残る) / failed: 失敗 / completed: 完了';
+COMMENT ON COLUMN crawl_checkpoints.last_page IS '保存済みの最後の戦績ページ番号';
+COMMENT ON COLUMN crawl_checkpoints.max_pages IS '巡回するページ数の上限';
+COMMENT ON COLUMN crawl_checkpoints.cursor_battle_id IS '最後に保存したページの最も古い試合ID';
+COMMENT ON COLUMN crawl_checkpoints.cursor_played_at IS '最後に保存したページの最も古い試合日時 (再開時に表示ページがずれていないかの確認に使う)';
+COMMENT ON COLUMN crawl_checkpoints.stop_at IS '巡回開始時点の到達点 (差分巡回の打ち切り条件。全件巡回ならNULL)';
+COMMENT ON COLUMN crawl_checkpoints.last_error IS '失敗時のエラー内容';
@@ -0,0 +1,25 @@
+-- ==========================================
+-- 20. 到達点との間の未取得分を crawl_checkpoints で追跡する
+--     ページ数の上限 (max_pages) で打ち切った差分巡回は、保存済みの試合との間に未取得の試合が残る。
+--     到達点 (crawl_watermarks) はその間を取得し終えるまで進めず、次回の巡回で続きのページを取得する
+-- ==========================================
+ALTER TABLE crawl_checkpoints ADD COLUMN IF NOT EXISTS incremental BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE crawl_checkpoints ADD COLUMN IF NOT EXISTS end_page INTEGER;
+ALTER TABLE crawl_checkpoints ADD COLUMN IF NOT EXISTS pending_battle_id TEXT;
+ALTER TABLE crawl_checkpoints ADD COLUMN IF NOT EXISTS pending_played_at TIMESTAMP;
+
+UPDATE crawl_checkpoints SET end_page = max_pages WHERE end_page IS NULL;
+ALTER TABLE crawl_checkpoints ALTER COLUMN end_page SET NOT NULL;
+
+ALTER TABLE crawl_checkpoints DROP CONSTRAINT IF EXISTS chk_crawl_checkpoints_status;
+ALTER TABLE crawl_checkpoints ADD CONSTRAINT chk_crawl_checkpoints_status
+    CHECK (status IN ('running', 'failed', 'partial', 'completed'));
+
+COMMENT ON TABLE crawl_checkpoints IS 'ユーザーごとの巡回の進み具合。running / failed / partial のまま残っていれば次回は続きのページから再開する';
+COMMENT ON COLUMN crawl_checkpoints.status IS 'running: 巡回中 (中断された場合もこのまま残る) / failed: 失敗 / partial: 到達点に届く前に max_pages で打ち切り / completed: 完了';
+COMMENT ON COLUMN crawl_checkpoints.max_pages IS '1回の巡回で取得するページ数 (巡回の要求値)';
+COMMENT ON COLUMN crawl_checkpoints.end_page IS '今回の巡回で取得する最後のページ番号 (partial の続きでは last_page + max_pages)';
+COMMENT ON COLUMN crawl_checkpoints.incremental IS '差分巡回 (保存済みの試合で打ち切る) かどうか';
+COMMENT ON COLUMN crawl_checkpoints.stop_at IS '一連の巡回を開始した時点の到達点。これ以前の試合まで取得し終えたら到達点を進める';
+COMMENT ON COLUMN crawl_checkpoints.pending_battle_id IS '一連の巡回の1ページ目の最新試合ID (完了時に到達点になる)';
+COMMENT ON COLUMN crawl_checkpoints.pending_played_at IS '一連の巡回の1ページ目の最新試合日時 (完了時に到達点になる)';
@@ -0,0 +1,13 @@
+-- ==========================================
+-- 21. 共有レートリミッター (rate_limits)
+--     巡回ワーカーは複数のプロセス・コンテナで動くため、Buckler へのリクエスト頻度は
+--     プロセス内ではなくDB上の1行で全体の上限を管理する (GCRA: 次に空くリクエスト時刻を記録する方式)
+-- ==========================================
+CREATE TABLE IF NOT EXISTS rate_limits (
+    name TEXT PRIMARY KEY,
+    tat TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+COMMENT ON TABLE rate_limits IS 'プロセスを跨いで共有するレートリミッターの状態 (rate_limit.SharedRateLimiter)';
+COMMENT ON COLUMN rate_limits.name IS 'リミッター名 (buckler など)';
+COMMENT ON COLUMN rate_limits.tat IS '理論上の次のリクエスト到着時刻。現在時刻 + バースト分 を超えていれば、その差だけ待機する';
@@ -0,0 +1,25 @@
+-- ==========================================
+-- 22. 巡回ログ (scrape_logs)
+--     巡回はワーカー (worker.py) の別プロセス・別コンテナで動くため、管理画面 (Streamlit) から
+--     ログを参照できるよう、各プロセスのログをDBにも書き込む (log_pipeline のリスナースレッドが書き込む)
+-- ==========================================
+CREATE TABLE IF NOT EXISTS scrape_logs (
+    id BIGSERIAL PRIMARY KEY,
+    logged_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    host TEXT NOT NULL,
+    user_name TEXT,
+    phase TEXT,
+    duration DOUBLE PRECISION,
+    message TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_scrape_logs_logged_at ON scrape_logs (logged_at DESC);
+CREATE INDEX IF NOT EXISTS idx_scrape_logs_user ON scrape_logs (user_name, logged_at DESC);
+
+COMMENT ON TABLE scrape_logs IS '全プロセス (管理画面・ワーカー) のログ。LOG_DB_RETENTION_DAYS 日より古いものは書き込み時に削除される';
+COMMENT ON COLUMN scrape_logs.logged_at IS 'ログの記録日時';
+COMMENT ON COLUMN scrape_logs.host IS '記録したプロセスのホスト名 (コンテナID)';
+COMMENT ON COLUMN scrape_logs.user_name IS '巡回中のユーザー (log_context の user)';
+COMMENT ON COLUMN scrape_logs.phase IS '処理フェーズ (log_context / set_phase の phase)';
+COMMENT ON COLUMN scrape_logs.duration IS '所要秒 (write_log に duration を渡した場合)';
+COMMENT ON COLUMN scrape_logs.message IS 'ログ本文';
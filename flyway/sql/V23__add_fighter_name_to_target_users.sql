@@ -0,0 +1,8 @@
+-- ==========================================
+-- 23. ターゲットユーザーの Buckler 上の名前 (target_users.fighter_name)
+--     target_users.player_name は管理画面で付ける表示名のため、戦績 (v_battle_analytics.my_name) と
+--     突き合わせる名前は巡回時に戦績ページから求めて別に保持する
+-- ==========================================
+ALTER TABLE target_users ADD COLUMN IF NOT EXISTS fighter_name TEXT;
+
+COMMENT ON COLUMN target_users.fighter_name IS 'Buckler上のファイター名 (戦績の名前)。戦績ページ1ページ目の全試合に登場する名前を巡回時に記録する。分析 (analytics.py) はこの名前で戦績を引く';
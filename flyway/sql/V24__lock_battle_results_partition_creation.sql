@@ -0,0 +1,27 @@
+-- ==========================================
+-- 24. 月パーティション作成の競合対策 (ensure_battle_results_partition)
+--     複数ワーカーが同時に同じ月のパーティションを作ると、duplicate_table ではなく
+--     pg_type の一意制約違反 (unique_violation) で失敗することがあるため、
+--     作成する側だけ月ごとのアドバイザリロックを取って直列化し、例外も両方を握りつぶす
+-- ==========================================
+CREATE OR REPLACE FUNCTION ensure_battle_results_partition(target TIMESTAMP) RETURNS VOID AS $$
+DECLARE
+    start_at DATE := date_trunc('month', target)::DATE;
+    end_at DATE := (date_trunc('month', target) + INTERVAL '1 month')::DATE;
+    part_name TEXT := 'battle_results_' || to_char(target, 'YYYYMM');
+BEGIN
+    -- 作成済みなら (通常はこちら) ロックを取らずに戻る
+    IF to_regclass(part_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    -- ロックは呼び出し元のトランザクション終了まで保持されるため、後続は先行の作成がコミットされてから確認する
+    PERFORM pg_advisory_xact_lock(hashtext(part_name));
+    IF to_regclass(part_name) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF battle_results FOR VALUES FROM (%L) TO (%L)', part_name, start_at, end_at);
+    END IF;
+EXCEPTION
+    WHEN duplicate_table OR unique_violation THEN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION ensure_battle_results_partition(TIMESTAMP) IS '指定日時を含む月の battle_results パーティションを作成する (同時実行時は月ごとのアドバイザリロックで直列化)';
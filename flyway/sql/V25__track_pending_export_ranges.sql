@@ -0,0 +1,10 @@
+-- ==========================================
+-- 25. 書き出し中の範囲 (export_watermarks.pending_*)
+--     書き出しの上限 (battle_results.id / player_stats の確定日) は実行のたびに変わるため、
+--     書き出す前に範囲を記録し、途中で失敗した場合は同じ範囲で書き出し直す (同じファイル名で上書きされ、重複しない)
+-- ==========================================
+ALTER TABLE export_watermarks ADD COLUMN IF NOT EXISTS pending_id BIGINT;
+ALTER TABLE export_watermarks ADD COLUMN IF NOT EXISTS pending_date DATE;
+
+COMMENT ON COLUMN export_watermarks.pending_id IS '書き出し中の battle_results.id の上限。完了すると last_id に移してNULLに戻す';
+COMMENT ON COLUMN export_watermarks.pending_date IS '書き出し中の player_stats.recorded_at の上限。完了すると last_date に移してNULLに戻す';
@@ -0,0 +1,14 @@
+-- ==========================================
+-- 7. 差分巡回用の到達点管理 (crawl_watermarks)
+-- ==========================================
+CREATE TABLE IF NOT EXISTS crawl_watermarks (
+    user_code TEXT PRIMARY KEY,
+    last_battle_id TEXT,
+    last_played_at TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE crawl_watermarks IS 'ユーザーごとに保存済みの最新戦績を記録し、差分巡回の停止位置として使うテーブル';
+COMMENT ON COLUMN crawl_watermarks.user_code IS 'バックラーのユーザーID';
+COMMENT ON COLUMN crawl_watermarks.last_battle_id IS '保存済みの最新試合ID';
+COMMENT ON COLUMN crawl_watermarks.last_played_at IS '保存済みの最新試合日時';
@@ -0,0 +1,51 @@
+-- ==========================================
+-- 8. 分析用ファクトテーブル (battle_facts)
+--    v_battle_analytics (V3) は battle_results を毎回 UNION ALL で2回走査していたため、
+--    プレイヤー視点の行を実体化してインデックスを貼る
+-- ==========================================
+CREATE TABLE IF NOT EXISTS battle_facts (
+    battle_id TEXT NOT NULL,
+    side SMALLINT NOT NULL,
+    played_at TIMESTAMP,
+    my_name TEXT,
+    my_char TEXT,
+    my_mr INTEGER,
+    my_result TEXT,
+    opponent_char TEXT,
+    opponent_control TEXT,
+    is_win INTEGER,
+    PRIMARY KEY (battle_id, side)
+);
+
+CREATE INDEX IF NOT EXISTS idx_battle_facts_name_played_at ON battle_facts (my_name, played_at);
+CREATE INDEX IF NOT EXISTS idx_battle_facts_name_opponent_char ON battle_facts (my_name, opponent_char);
+
+-- 既存データのバックフィル (P1視点 + P2視点)
+INSERT INTO battle_facts (battle_id, side, played_at, my_name, my_char, my_mr, my_result, opponent_char, opponent_control, is_win)
+SELECT battle_id, 1, played_at, p1_name, p1_char, p1_mr, p1_result, p2_char, p2_control, CASE WHEN p1_result = 'WIN' THEN 1 ELSE 0 END
+FROM battle_results
+UNION ALL
+SELECT battle_id, 2, played_at, p2_name, p2_char, p2_mr, p2_result, p1_char, p1_control, CASE WHEN p2_result = 'WIN' THEN 1 ELSE 0 END
+FROM battle_results
+ON CONFLICT (battle_id, side) DO NOTHING;
+
+-- 既存のMetabaseカードが参照するビューはファクトテーブルを読むように差し替える (列構成は V3 と同一)
+CREATE OR REPLACE VIEW v_battle_analytics AS
+SELECT
+    played_at,
+    my_name,
+    my_char,
+    my_mr,
+    my_result,
+    opponent_char,
+    opponent_control,
+    is_win
+FROM battle_facts;
+
+COMMENT ON TABLE battle_facts IS '戦績をプレイヤー視点(1試合2行)に展開した分析用ファクトテーブル。取り込み時に差分更新される';
+COMMENT ON COLUMN battle_facts.battle_id IS '試合固有ID (battle_results.battle_id)';
+COMMENT ON COLUMN battle_facts.side IS '視点 (1: P1, 2: P2)';
+COMMENT ON COLUMN battle_facts.my_name IS '視点側プレイヤー名';
+COMMENT ON COLUMN battle_facts.opponent_char IS '相手キャラ';
+COMMENT ON COLUMN battle_facts.is_win IS '勝利なら1';
+COMMENT ON VIEW v_battle_analytics IS '自分視点と相手視点を統合した戦績分析用ビュー (battle_facts を参照)';
@@ -0,0 +1,90 @@
+-- ==========================================
+-- 9. battle_results の月次レンジパーティション化
+--    played_at で月ごとに分割し、日付で絞り込むクエリが該当月だけを読むようにする。
+--    古いシーズンは DETACH PARTITION で切り離して退避できる。
+--      例) ALTER TABLE battle_results DETACH PARTITION battle_results_202306;
+-- ==========================================
+
+-- 指定日時を含む月のパーティションが無ければ作成する (取り込み処理からも呼ばれる)
+CREATE OR REPLACE FUNCTION ensure_battle_results_partition(target TIMESTAMP) RETURNS VOID AS $$
+DECLARE
+    start_at DATE := date_trunc('month', target)::DATE;
+    end_at DATE := (date_trunc('month', target) + INTERVAL '1 month')::DATE;
+    part_name TEXT := 'battle_results_' || to_char(target, 'YYYYMM');
+BEGIN
+    IF to_regclass(part_name) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF battle_results FOR VALUES FROM (%L) TO (%L)', part_name, start_at, end_at);
+    END IF;
+EXCEPTION
+    -- 複数ワーカーが同時に同じ月を作成しようとした場合は先勝ちで良い
+    WHEN duplicate_table THEN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION ensure_battle_results_partition(TIMESTAMP) IS '指定日時を含む月の battle_results パーティションを作成する';
+
+-- 既存テーブルを退避 (制約名が新テーブルと衝突しないようリネーム)
+ALTER TABLE battle_results RENAME TO battle_results_legacy;
+ALTER TABLE battle_results_legacy RENAME CONSTRAINT battle_results_pkey TO battle_results_legacy_pkey;
+ALTER TABLE battle_results_legacy RENAME CONSTRAINT battle_results_battle_id_key TO battle_results_legacy_battle_id_key;
+
+-- パーティションテーブルでは一意制約にパーティションキーを含める必要がある。
+-- battle_id は試合日時(分)を含んで組み立てられ、同じ battle_id は常に同じ played_at を持つため、
+-- (battle_id, played_at) の一意性は battle_id 単体の一意性と等価 (パーティションを跨いでも重複しない)。
+CREATE TABLE battle_results (
+    id INTEGER NOT NULL DEFAULT nextval('battle_results_id_seq'),
+    battle_id TEXT NOT NULL,
+    played_at TIMESTAMP NOT NULL,
+    mode TEXT,
+    p1_name TEXT, p1_char TEXT, p1_mr INTEGER, p1_control TEXT, p1_result TEXT,
+    p2_name TEXT, p2_char TEXT, p2_mr INTEGER, p2_control TEXT, p2_result TEXT,
+    PRIMARY KEY (id, played_at),
+    UNIQUE (battle_id, played_at)
+) PARTITION BY RANGE (played_at);
+
+ALTER SEQUENCE battle_results_id_seq OWNED BY battle_results.id;
+
+-- 時系列に追記されるため、日付の範囲検索は BRIN で十分に絞り込める
+CREATE INDEX IF NOT EXISTS idx_battle_results_played_at_brin ON battle_results USING BRIN (played_at);
+
+-- 既存データの月 + 当月/翌月分のパーティションを作成
+DO $$
+DECLARE
+    m TIMESTAMP;
+BEGIN
+    FOR m IN
+        SELECT generate_series(
+            date_trunc('month', COALESCE((SELECT MIN(played_at) FROM battle_results_legacy), CURRENT_TIMESTAMP::TIMESTAMP)),
+            date_trunc('month', CURRENT_TIMESTAMP::TIMESTAMP + INTERVAL '1 month'),
+            INTERVAL '1 month'
+        )
+    LOOP
+        PERFORM ensure_battle_results_partition(m);
+    END LOOP;
+END $$;
+
+INSERT INTO battle_results (id, battle_id, played_at, mode,
+    p1_name, p1_char, p1_mr, p1_control, p1_result,
+    p2_name, p2_char, p2_mr, p2_control, p2_result)
+SELECT id, battle_id, played_at, mode,
+    p1_name, p1_char, p1_mr, p1_control, p1_result,
+    p2_name, p2_char, p2_mr, p2_control, p2_result
+FROM battle_results_legacy
+WHERE battle_id IS NOT NULL AND played_at IS NOT NULL;
+
+DROP TABLE battle_results_legacy;
+
+COMMENT ON TABLE battle_results IS '戦績テーブル (played_at による月次レンジパーティション)';
+COMMENT ON COLUMN battle_results.battle_id IS '試合固有ID';
+COMMENT ON COLUMN battle_results.played_at IS '試合日時';
+COMMENT ON COLUMN battle_results.mode IS 'モード';
+COMMENT ON COLUMN battle_results.p1_name IS 'P1：名前';
+COMMENT ON COLUMN battle_results.p1_char IS 'P1：キャラ';
+COMMENT ON COLUMN battle_results.p1_mr IS 'P1：MR/LP';
+COMMENT ON COLUMN battle_results.p1_control IS 'P1：操作';
+COMMENT ON COLUMN battle_results.p1_result IS 'P1：結果';
+COMMENT ON COLUMN battle_results.p2_name IS 'P2：名前';
+COMMENT ON COLUMN battle_results.p2_char IS 'P2：キャラ';
+COMMENT ON COLUMN battle_results.p2_mr IS 'P2 : MR/LP';
+COMMENT ON COLUMN battle_results.p2_control IS 'P2 : 操作';
+COMMENT ON COLUMN battle_results.p2_result IS 'P2 : 結果';
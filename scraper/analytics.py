@@ -0,0 +1,251 @@
+# プレイヤーごとの戦績をNumPy/pandasの配列として保持し、直近勝率・連勝/連敗・セッションごとのMR増減・
+# キャラ×操作タイプの相性表・統計の日次推移をまとめて計算して分析テーブル (V16) へ書き込む。
+#
+# 最新の試合IDと試合数が前回の計算時から変わっていなければ何もしない。新しい試合が末尾に増えただけなら
+# その分だけをDBから読んで配列に追加し、影響するセッション以降だけを書き直す。
+#
+# 戦績は target_users.fighter_name (巡回時に戦績ページから記録した Buckler 上の名前) で引く。
+# player_name は管理画面の表示名のため使わない。
+#
+# 使い方 (scraper ディレクトリで実行):
+#   python analytics.py                      # 有効なユーザー全員分を更新
+#   python analytics.py --user-code CODE     # 1人分だけ更新
+#   python analytics.py --rebuild            # キャッシュを無視して全件を再計算
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from config import ANALYTICS_ROLLING_WINDOW, ANALYTICS_SESSION_GAP_MIN
+from database import engine
+
+HISTORY_SQL = """
+    SELECT battle_key, played_at, COALESCE(my_char, 'Unknown') AS my_char, my_mr,
+        COALESCE(opponent_char, 'Unknown') AS opponent_char, COALESCE(opponent_control, 'Unknown') AS opponent_control, is_win
+    FROM v_battle_analytics
+    WHERE my_name = :name AND played_at IS NOT NULL AND played_at >= :since
+    ORDER BY played_at, battle_key
+"""
+
+LATEST_SQL = """
+    SELECT (SELECT COUNT(*) FROM v_battle_analytics WHERE my_name = :name AND played_at IS NOT NULL) AS matches,
+        battle_key, played_at
+    FROM v_battle_analytics
+    WHERE my_name = :name AND played_at IS NOT NULL
+    ORDER BY played_at DESC, battle_key DESC
+    LIMIT 1
+"""
+
+STATS_EXCLUDED_COLUMNS = {"id", "user_id", "player_name", "recorded_at"}
+STATS_ROLLING_RECORDS = 7
+
+# ユーザーコード → (ファイター名, 読み込み済みの戦績 (played_at 昇順))。ワーカーの複数スレッドから使うためロックで保護する。
+# 巡回対象から外れたユーザーの分は、次の更新時に捨てる
+_histories = {}
+_histories_lock = threading.Lock()
+
+def latest_key(conn, name):
+    """キャッシュキー (試合数, 最新の試合ID, 最新の試合日時) を返す。試合が無ければNone"""
+    row = conn.execute(text(LATEST_SQL), {"name": name}).fetchone()
+    return (row.matches, row.battle_key, row.played_at) if row else None
+
+def stored_key(conn, name):
+    row = conn.execute(text("SELECT matches, last_battle_key FROM player_analytics WHERE my_name = :name"), {"name": name}).fetchone()
+    return (row.matches, row.last_battle_key) if row else None
+
+def load_history(conn, name, since=None):
+    return pd.read_sql(text(HISTORY_SQL), conn, params={"name": name, "since": since or pd.Timestamp("1970-01-01")})
+
+def load_target(conn, user_code):
+    """分析対象のファイター名を返す。巡回対象でない・名前が未記録ならNone"""
+    row = conn.execute(text("SELECT fighter_name FROM target_users WHERE user_code = :uid AND is_active = TRUE"),
+                       {"uid": user_code}).fetchone()
+    return row.fighter_name if row else None
+
+def evict_untargeted(conn):
+    """巡回対象から外れたユーザーのキャッシュを捨てる"""
+    active = set(conn.execute(text("SELECT user_code FROM target_users WHERE is_active = TRUE")).scalars())
+    with _histories_lock:
+        for user_code in [c for c in _histories if c not in active]:
+            del _histories[user_code]
+
+def update_history(conn, user_code, name, key, rebuild=False):
+    """キャッシュ済みの戦績に新しい試合だけを追加して返す。過去分が後から増えた場合は全件を読み直す
+
+    戻り値: (戦績, 新しい試合を含む最初の行番号)
+    """
+    with _histories_lock:
+        cached = None if rebuild else _histories.get(user_code)
+    # ファイター名が変わった場合は別人の戦績として読み直す
+    hist = cached[1] if cached is not None and cached[0] == name else None
+    if hist is not None and len(hist):
+        last_at = hist["played_at"].iloc[-1]
+        new = load_history(conn, name, since=last_at)
+        # 同じ分に行われた試合は played_at が等しいため、読み込み済みのものを除く
+        known = set(hist.loc[hist["played_at"] == last_at, "battle_key"])
+        new = new[~new["battle_key"].isin(known)]
+        if len(new) and len(hist) + len(new) == key[0]:
+            first_new = len(hist)
+            hist = pd.concat([hist, new], ignore_index=True)
+        else:
+            hist, first_new = load_history(conn, name), 0
+    else:
+        hist, first_new = load_history(conn, name), 0
+    with _histories_lock:
+        _histories[user_code] = (name, hist)
+    return hist, first_new
+
+def compute(hist, window=ANALYTICS_ROLLING_WINDOW, gap_min=ANALYTICS_SESSION_GAP_MIN):
+    """戦績配列から各指標をまとめて計算する (試合ごとのループは行わない)"""
+    win = hist["is_win"].to_numpy(dtype=np.int64)
+    n = len(win)
+
+    # 直近 window 試合の勝率: 累積和の差分で全試合分を一度に求める
+    csum = np.concatenate(([0], np.cumsum(win)))
+    idx = np.arange(1, n + 1)
+    lo = np.maximum(0, idx - window)
+    rolling = (csum[idx] - csum[lo]) / (idx - lo)
+
+    # 連勝/連敗: 勝敗が切り替わる位置で区切った連続区間の長さ
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(win)) + 1))
+    lengths = np.diff(np.concatenate((starts, [n])))
+    values = win[starts]
+    current_streak = int(lengths[-1] if values[-1] else -lengths[-1])
+
+    # セッション: 試合間隔が gap_min 分を超えたら区切る。MRが0 (未計測) の試合は直前の値で埋める
+    played = hist["played_at"].to_numpy(dtype="datetime64[s]")
+    session_no = np.concatenate(([0], np.cumsum(np.diff(played) > np.timedelta64(gap_min, "m"))))
+    frame = pd.DataFrame({
+        "session": session_no, "played_at": hist["played_at"], "is_win": win,
+        "mr": hist["my_mr"].where(hist["my_mr"] > 0).ffill(), "rolling": rolling,
+    })
+    sessions = frame.groupby("session").agg(
+        session_start=("played_at", "first"), session_end=("played_at", "last"),
+        matches=("is_win", "size"), wins=("is_win", "sum"),
+        mr_start=("mr", "first"), mr_end=("mr", "last"), rolling_win_rate=("rolling", "last"),
+    )
+    sessions["mr_delta"] = sessions["mr_end"] - sessions["mr_start"]
+    sessions[["mr_start", "mr_end", "mr_delta"]] = sessions[["mr_start", "mr_end", "mr_delta"]].round().astype("Int64")
+
+    matrix = hist.groupby(["my_char", "opponent_char", "opponent_control"])["is_win"].agg(matches="size", wins="sum").reset_index()
+    matrix["win_rate"] = matrix["wins"] / matrix["matches"]
+
+    last = hist.iloc[-1]
+    summary = {
+        "last_battle_key": last["battle_key"], "last_played_at": last["played_at"].to_pydatetime(),
+        "matches": n, "wins": int(csum[-1]), "rolling_win_rate": float(rolling[-1]),
+        "current_streak": current_streak,
+        "best_win_streak": int(lengths[values == 1].max(initial=0)),
+        "worst_lose_streak": int(lengths[values == 0].max(initial=0)),
+        "latest_mr": _int(frame["mr"].iloc[-1]), "last_session_mr_delta": _int(sessions["mr_delta"].iloc[-1]),
+        "sessions": len(sessions),
+    }
+    return summary, session_no, sessions, matrix
+
+def _int(value):
+    return None if pd.isna(value) else int(value)
+
+def _records(df, columns):
+    """DataFrame をDB書き込み用の辞書リストへ変換する (NaN は NULL)"""
+    out = df[columns].astype(object).where(df[columns].notna(), None)
+    return out.to_dict("records")
+
+def write_battle_analytics(conn, name, user_code, summary, session_no, sessions, matrix, first_new):
+    """サマリー・相性表は全体を、セッションは新しい試合を含むセッション以降だけを書き直す"""
+    conn.execute(text("""
+        INSERT INTO player_analytics (my_name, user_code, last_battle_key, last_played_at, matches, wins, rolling_win_rate,
+            current_streak, best_win_streak, worst_lose_streak, latest_mr, last_session_mr_delta, sessions, updated_at)
+        VALUES (:name, :user_code, :last_battle_key, :last_played_at, :matches, :wins, :rolling_win_rate,
+            :current_streak, :best_win_streak, :worst_lose_streak, :latest_mr, :last_session_mr_delta, :sessions, CURRENT_TIMESTAMP)
+        ON CONFLICT (my_name) DO UPDATE SET
+            user_code = COALESCE(EXCLUDED.user_code, player_analytics.user_code),
+            last_battle_key = EXCLUDED.last_battle_key, last_played_at = EXCLUDED.last_played_at,
+            matches = EXCLUDED.matches, wins = EXCLUDED.wins, rolling_win_rate = EXCLUDED.rolling_win_rate,
+            current_streak = EXCLUDED.current_streak, best_win_streak = EXCLUDED.best_win_streak,
+            worst_lose_streak = EXCLUDED.worst_lose_streak, latest_mr = EXCLUDED.latest_mr,
+            last_session_mr_delta = EXCLUDED.last_session_mr_delta, sessions = EXCLUDED.sessions, updated_at = CURRENT_TIMESTAMP
+    """), {**summary, "name": name, "user_code": user_code})
+
+    changed = sessions.loc[sessions.index >= session_no[first_new]]
+    conn.execute(text("DELETE FROM player_sessions WHERE my_name = :name AND session_start >= :since"),
+                 {"name": name, "since": changed["session_start"].iloc[0].to_pydatetime()})
+    rows = _records(changed, ["session_start", "session_end", "matches", "wins", "mr_start", "mr_end", "mr_delta", "rolling_win_rate"])
+    conn.execute(text("""
+        INSERT INTO player_sessions (my_name, session_start, session_end, matches, wins, mr_start, mr_end, mr_delta, rolling_win_rate)
+        VALUES (:name, :session_start, :session_end, :matches, :wins, :mr_start, :mr_end, :mr_delta, :rolling_win_rate)
+    """), [{**r, "name": name} for r in rows])
+
+    conn.execute(text("DELETE FROM player_matchup_matrix WHERE my_name = :name"), {"name": name})
+    conn.execute(text("""
+        INSERT INTO player_matchup_matrix (my_name, my_char, opponent_char, opponent_control, matches, wins, win_rate)
+        VALUES (:name, :my_char, :opponent_char, :opponent_control, :matches, :wins, :win_rate)
+    """), [{**r, "name": name} for r in _records(matrix, ["my_char", "opponent_char", "opponent_control", "matches", "wins", "win_rate"])])
+
+def refresh_stats_trends(conn, user_code):
+    """player_stats の各項目について 値 / 直近7回の平均 / 前回からの増減 を求め、前回書き込んだ日以降を更新する"""
+    stats = pd.read_sql(text("SELECT * FROM player_stats WHERE user_id = :uid ORDER BY recorded_at"), conn, params={"uid": user_code})
+    if stats.empty:
+        return 0
+    metrics = [c for c in stats.columns if c not in STATS_EXCLUDED_COLUMNS]
+    values = stats[metrics].astype(float)
+    # 3つの表は同じ行・列の並びなので、縦持ちにした順序も一致する
+    long = values.assign(recorded_at=stats["recorded_at"]).melt(id_vars="recorded_at", var_name="metric", value_name="value")
+    long["rolling_avg"] = values.rolling(STATS_ROLLING_RECORDS, min_periods=1).mean().melt()["value"].to_numpy()
+    long["delta"] = values.diff().melt()["value"].to_numpy()
+
+    # 当日分は再取得で上書きされるため、前回書き込んだ最終日も含めて書き直す
+    since = conn.execute(text("SELECT MAX(recorded_at) FROM player_stats_trends WHERE user_id = :uid"), {"uid": user_code}).scalar()
+    if since is not None:
+        long = long[long["recorded_at"] >= since]
+    conn.execute(text("""
+        INSERT INTO player_stats_trends (user_id, recorded_at, metric, value, rolling_avg, delta)
+        VALUES (:uid, :recorded_at, :metric, :value, :rolling_avg, :delta)
+        ON CONFLICT (user_id, metric, recorded_at) DO UPDATE SET
+            value = EXCLUDED.value, rolling_avg = EXCLUDED.rolling_avg, delta = EXCLUDED.delta
+    """), [{**r, "uid": user_code} for r in _records(long, ["recorded_at", "metric", "value", "rolling_avg", "delta"])])
+    return len(long)
+
+def refresh_player(user_code, rebuild=False, write_log_func=print):
+    """1人分の分析結果を更新する。戻り値は 'cached' / 'appended' / 'rebuilt' / 'empty' / 'unnamed'
+
+    最新の試合と試合数が前回書き込んだ時から変わっていなければ、戦績の読み込みも再計算も行わない。
+    """
+    with engine.begin() as conn:
+        evict_untargeted(conn)
+        # 同じユーザーを複数のワーカースレッドが同時に更新しないよう、トランザクション単位でロックする
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:uid))"), {"uid": user_code})
+        refresh_stats_trends(conn, user_code)
+        name = load_target(conn, user_code)
+        if name is None:
+            return "unnamed"
+        key = latest_key(conn, name)
+        if key is None:
+            return "empty"
+        if not rebuild and stored_key(conn, name) == key[:2]:
+            return "cached"
+        hist, first_new = update_history(conn, user_code, name, key, rebuild=rebuild)
+        summary, session_no, sessions, matrix = compute(hist)
+        write_battle_analytics(conn, name, user_code, summary, session_no, sessions, matrix, first_new)
+    status = "appended" if first_new else "rebuilt"
+    write_log_func(f"📈 分析を更新しました ({name}: {summary['matches']}試合, {'差分' if first_new else '全件'})")
+    return status
+
+def refresh_all(rebuild=False, write_log_func=print):
+    with engine.connect() as conn:
+        users = conn.execute(text("SELECT user_code, player_name FROM target_users WHERE is_active = TRUE")).fetchall()
+    for u in users:
+        try:
+            if refresh_player(u.user_code, rebuild=rebuild, write_log_func=write_log_func) == "unnamed":
+                write_log_func(f"ℹ️ ファイター名が未記録のため分析をスキップしました ({u.player_name})。一度巡回すると記録されます。")
+        except Exception as e:
+            write_log_func(f"⚠️ 分析の更新に失敗しました ({u.player_name}): {e}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="プレイヤー別の分析テーブルの更新")
+    parser.add_argument("--user-code", help="更新するユーザーコード (省略時は有効なユーザー全員)")
+    parser.add_argument("--rebuild", action="store_true", help="キャッシュを無視して全件を再計算する")
+    args = parser.parse_args()
+    if args.user_code:
+        print(refresh_player(args.user_code, rebuild=args.rebuild))
+    else:
+        refresh_all(rebuild=args.rebuild)
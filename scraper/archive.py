@@ -0,0 +1,46 @@
+import hashlib
+import os
+import tempfile
+import zstandard
+from sqlalchemy import text
+from config import ARCHIVE_PAGES, ARCHIVE_DIR
+from database import engine
+
+_compressor = zstandard.ZstdCompressor(level=10)
+_decompressor = zstandard.ZstdDecompressor()
+
+def path_for(content_hash):
+    """ハッシュ先頭2文字でディレクトリを分けて1ディレクトリあたりのファイル数を抑える"""
+    return os.path.join(ARCHIVE_DIR, content_hash[:2], f"{content_hash}.html.zst")
+
+def store(kind, user_code, page_no, html):
+    """ページ原本を保存し、取得履歴を記録する。同じ内容は1ファイルだけ保持する。内容ハッシュを返す"""
+    if not ARCHIVE_PAGES or not html:
+        return None
+    data = html.encode("utf-8")
+    content_hash = hashlib.sha256(data).hexdigest()
+    path = path_for(content_hash)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 書き込み途中のファイルを読まれないよう、一時ファイルに書いてからリネームする
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(_compressor.compress(data))
+        os.replace(tmp, path)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO raw_pages (content_hash, user_code, kind, page_no) VALUES (:h, :uid, :kind, :page_no)
+        """), {"h": content_hash, "uid": user_code, "kind": kind, "page_no": page_no})
+    return content_hash
+
+def safe_store(kind, user_code, page_no, html, write_log_func):
+    """巡回を止めないよう、保存に失敗しても警告のみで続行する"""
+    try:
+        return store(kind, user_code, page_no, html)
+    except Exception as e:
+        write_log_func(f"⚠️ ページ原本の保存に失敗しました: {e}")
+        return None
+
+def load(content_hash):
+    with open(path_for(content_hash), "rb") as f:
+        return _decompressor.decompress(f.read()).decode("utf-8")
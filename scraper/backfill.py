@@ -0,0 +1,191 @@
+# 1ユーザーの過去戦績をまとめて取り込む一括取得 (backfill) モード。
+# 通常巡回のように「次へ」を順にクリックせず、?page=N で各ページを直接開き、
+# 最大 BACKFILL_CONCURRENCY 本のタブで並列に取得してから1回の一括INSERTで保存する。
+import contextlib
+import threading
+from config import BUCKLER_BASE_URL, SCRAPE_BACKEND, BACKFILL_CONCURRENCY
+from browser_pool import BrowserPool
+from rate_limit import buckler_limiter
+from readiness import PageTimings
+from log_pipeline import log_context, set_phase
+from scraper import BATTLELOG_EXTRACT_JS, save_battles, scrape_sf6_browser, remember_fighter_name
+from checkpoints import load_watermark, save_watermark, covers_watermark
+import archive
+import http_fetch
+from ingest import battle_key
+import metrics
+from resource_filter import ResourceFilter
+
+class PageQueue:
+    """ページ番号を小さい順に払い出す。空のページが見つかったら、それより後ろは払い出さない"""
+
+    def __init__(self, pages, last_page, on_progress=None):
+        self._pending = list(pages)
+        self.last_page = last_page
+        self.results = {}
+        self.errors = {}
+        self._on_progress = on_progress
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            while self._pending:
+                n = self._pending.pop(0)
+                if n <= self.last_page:
+                    return n
+            return None
+
+    def done(self, n, rows):
+        with self._lock:
+            self.results[n] = rows
+            if not rows:
+                self.last_page = min(self.last_page, n - 1)
+            done, total = len(self.results), self.last_page
+        if self._on_progress:
+            self._on_progress(min(done, total), total)
+
+    def failed(self, n, error):
+        with self._lock:
+            self.errors[n] = error
+
+    def battles(self):
+        """ページ順に連結し、ページ境界で重複した試合を除いた戦績を返す"""
+        merged = {}
+        for n in sorted(self.results):
+            if n <= self.last_page:
+                for b in self.results[n]:
+                    merged.setdefault(battle_key(b), b)
+        return list(merged.values())
+
+def _battlelog_url(user_code):
+    return f"{BUCKLER_BASE_URL}/ja-jp/profile/{user_code}/battlelog/rank"
+
+@contextlib.contextmanager
+def browser_tab(user_code, write_log_func, pool=None):
+    """1タブ分の取得関数 fetch(page_no) -> (戦績リスト, HTML) を返す。poolを省略するとこのスレッド用に起動する"""
+    own_pool = pool is None
+    pool = pool or BrowserPool(write_log_func=write_log_func)
+    timings = PageTimings()
+    try:
+        with pool.context() as context:
+            resources = ResourceFilter().attach(context)
+            page = context.new_page()
+
+            def fetch(n):
+                buckler_limiter.acquire()
+                timings.goto(page, f"{_battlelog_url(user_code)}?page={n}")
+                timings.battlelog_rows(page)
+                metrics.PAGES_TOTAL.labels(**metrics.labels(backend="browser")).inc()
+                html = page.content()
+                archive.safe_store("battlelog", user_code, n, html, write_log_func)
+                with metrics.timed(metrics.EXTRACT_SECONDS, kind="battlelog"):
+                    return page.evaluate(BATTLELOG_EXTRACT_JS), html
+
+            yield fetch
+            write_log_func(f"🧹 リソース制限: {resources.summary()}")
+        write_log_func(f"⏱️ 待機計測: {timings.summary()}")
+    finally:
+        if own_pool:
+            pool.close()
+
+@contextlib.contextmanager
+def http_tab(user_code, write_log_func, pool=None):
+    """HTTP取得用の fetch(page_no)。セッションは全スレッドで共有する"""
+    def fetch(n):
+        html = http_fetch.fetch_page(_battlelog_url(user_code), params={"page": n})
+        metrics.PAGES_TOTAL.labels(**metrics.labels(backend="http")).inc()
+        archive.safe_store("battlelog", user_code, n, html, write_log_func)
+        with metrics.timed(metrics.EXTRACT_SECONDS, kind="battlelog"):
+            return http_fetch.parse_battlelog(http_fetch.extract_page_props(html)), html
+
+    yield fetch
+
+def _page_count(html, max_pages):
+    """埋め込みJSONから総ページ数を読む。読めなければ max_pages まで取得して空ページで打ち切る"""
+    try:
+        return min(max_pages, http_fetch.total_pages(http_fetch.extract_page_props(html)))
+    except http_fetch.PageDataError:
+        return max_pages
+
+def _drain(queue, fetch, write_log_func):
+    while (n := queue.next()) is not None:
+        try:
+            rows, _ = fetch(n)
+            queue.done(n, rows)
+        except Exception as e:
+            queue.failed(n, e)
+            write_log_func(f"⚠️ 戦績 {n}ページ目の取得に失敗しました: {e}")
+
+def _crawl(tab, user_code, player_name, write_log_func, pool, max_pages, concurrency, on_progress):
+    """1ページ目で総ページ数を確認し、残りを呼び出し元スレッド + 補助スレッドで分担して取得する"""
+    with tab(user_code, write_log_func, pool) as fetch:
+        first_rows, html = fetch(1)
+        last_page = _page_count(html, max_pages) if first_rows else 0
+        queue = PageQueue(range(2, last_page + 1), last_page, on_progress)
+        queue.done(1, first_rows)
+        if last_page >= 2:
+            # ?page=N が効かずに1ページ目と同じ内容が返る場合は、並列化せず従来のページ送りに任せる
+            second_rows, _ = fetch(queue.next())
+            if second_rows and [b["id"] for b in second_rows] == [b["id"] for b in first_rows]:
+                return None
+            queue.done(2, second_rows)
+
+        def helper():
+            with log_context(user=player_name, phase="backfill"):
+                try:
+                    with tab(user_code, write_log_func) as helper_fetch:
+                        _drain(queue, helper_fetch, write_log_func)
+                except Exception as e:
+                    write_log_func(f"💥 補助タブの起動に失敗しました: {e}")
+
+        helpers = [
+            threading.Thread(target=helper, name=f"Backfill-{user_code}-{i+1}", daemon=True)
+            for i in range(min(max(1, concurrency) - 1, max(0, queue.last_page - 2)))
+        ]
+        for t in helpers: t.start()
+        _drain(queue, fetch, write_log_func)
+        for t in helpers: t.join()
+    return queue
+
+def backfill_user(user_code, player_name, write_log_func, pool=None, max_pages=50, concurrency=BACKFILL_CONCURRENCY, on_progress=None):
+    """1ユーザーの戦績を最大 max_pages ページまで並列取得して一括保存する
+
+    on_progress(取得済みページ数, 予定ページ数) で進捗を通知する。
+    一部のページで取得に失敗した場合も取得できた分は保存し、Falseを返す (再実行しても重複は保存されない)。
+    """
+    if not user_code: return False
+    with log_context(user=player_name):
+        set_phase("backfill")
+        write_log_func(f"📚 過去戦績の一括取得を開始 (ID: {user_code}, 最大 {max_pages}ページ, 並列 {concurrency})")
+        queue = None
+        if SCRAPE_BACKEND == "http":
+            try:
+                queue = _crawl(http_tab, user_code, player_name, write_log_func, None, max_pages, concurrency, on_progress)
+            except Exception as e:
+                write_log_func(f"↩️ HTTP取得に失敗したためブラウザで再取得します: {e}")
+        if queue is None:
+            with contextlib.ExitStack() as stack:
+                if pool is None:
+                    pool = stack.enter_context(BrowserPool(write_log_func=write_log_func))
+                try:
+                    queue = _crawl(browser_tab, user_code, player_name, write_log_func, pool, max_pages, concurrency, on_progress)
+                except Exception as e:
+                    write_log_func(f"💥 エラー: {e}")
+                    return False
+                if queue is None:
+                    write_log_func("↩️ ページ番号を指定した表示ができないため、ページ送りで取得します。")
+                    return scrape_sf6_browser(user_code, player_name, write_log_func, pool, max_pages=max_pages, incremental=False)
+
+        set_phase("ingest")
+        battles = queue.battles()
+        new_count = save_battles(battles)
+        if queue.results.get(1):
+            remember_fighter_name(user_code, queue.results[1])
+        # 到達点は、保存済みの試合か戦績の末尾まで途切れずに取得できたときだけ進める (間に未取得の試合を残さない)
+        reached_end = queue.last_page < max_pages
+        if 1 in queue.results and not queue.errors and (reached_end or covers_watermark(battles, load_watermark(user_code))):
+            save_watermark(user_code, battles)
+        if queue.errors:
+            write_log_func(f"⚠️ 取得に失敗したページ: {', '.join(map(str, sorted(queue.errors)))}")
+        write_log_func(f"🏁 一括取得完了。{queue.last_page}ページ / {len(battles)}件 (新規 {new_count}件)")
+        return not queue.errors
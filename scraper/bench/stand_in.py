@@ -0,0 +1,193 @@
+# Buckler の代わりにプロフィール(プレイ)・戦績ページを返すローカルHTTPサーバー。
+# 実サイトと同じクラス名・ページ送り(クライアント側でのリスト差し替え)・埋め込みJSON(__NEXT_DATA__)を持つ
+# ページを決定的に生成するため、ネットワークなしで scrape_sf6 をそのまま実行できる。
+import datetime
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+PAGE_SIZE = 10
+CHARACTERS = ["リュウ", "ケン", "春麗", "ジュリ", "キャミィ", "ルーク", "JP", "マリーザ"]
+BASE_TIME = datetime.datetime(2024, 6, 30, 23, 0)
+
+PLAY_RE = re.compile(r"^/ja-jp/profile/(\w+)/play$")
+BATTLELOG_RE = re.compile(r"^/ja-jp/profile/(\w+)/battlelog/rank$")
+
+# 実績タブの表示ラベルと埋め込みJSONのキー (http_fetch.PLAY_STATS_KEYS と対応)
+STYLE_ITEMS = [
+    ("ドライブパリィ", "gauge_rate_drive_guard"), ("ドライブインパクト", "gauge_rate_drive_impact"),
+    ("オーバードライブアーツ", "gauge_rate_drive_arts"), ("パリィドライブラッシュ", "gauge_rate_drive_rush_from_parry"),
+    ("キャンセルドライブラッシュ", "gauge_rate_drive_rush_from_cancel"), ("ドライブリバーサル", "gauge_rate_drive_reversal"),
+    ("Lv1", "gauge_rate_sa_lv1"), ("Lv2", "gauge_rate_sa_lv2"), ("Lv3", "gauge_rate_sa_lv3"), ("CA", "gauge_rate_ca"),
+]
+DETAIL_SECTIONS = [
+    ("ドライブパリィ", [("ジャストパリィ回数", "just_parry")]),
+    ("ドライブインパクト", [
+        ("決めた回数", "drive_impact"), ("パニッシュカウンターを決めた回数", "punish_counter"),
+        ("相手のドライブインパクトに決めた回数", "drive_impact_to_drive_impact"), ("受けた回数", "received_drive_impact"),
+        ("パニッシュカウンターを受けた回数", "received_punish_counter"),
+        ("相手にドライブインパクトで返された回数", "received_drive_impact_to_drive_impact"),
+    ]),
+    ("スタン", [("スタンさせた回数", "stun"), ("スタンさせられた回数", "received_stun")]),
+    ("投げ", [("決めた回数", "throw_count"), ("受けた回数", "received_throw_count"), ("投げ抜け回数", "throw_tech")]),
+    ("壁際", [("相手を追い詰めている時間", "corner_time"), ("相手に追い詰められている時間", "cornered_time")]),
+]
+
+PAGER_JS = """
+document.addEventListener('click', async (e) => {
+    const next = e.target.closest('li.next');
+    if (!next || next.classList.contains('disabled')) return;
+    e.preventDefault();
+    const page = next.dataset.page;
+    const res = await fetch(location.pathname + '?fragment=1&page=' + page);
+    document.querySelector('#battlelog').outerHTML = await res.text();
+    history.replaceState(null, '', location.pathname + '?page=' + page);
+});
+"""
+
+def _battle(user_code, index):
+    """ユーザーごとに決定的な1試合を生成する (index が小さいほど新しい)"""
+    seed = sum(map(ord, user_code)) + index
+    played = BASE_TIME - datetime.timedelta(minutes=7 * index)
+    p1_wins = seed % 3 != 0
+    return {
+        "uploaded_at": int(played.replace(tzinfo=datetime.timezone(datetime.timedelta(hours=9))).timestamp()),
+        "date": played.strftime("%Y/%m/%d %H:%M"),
+        "p1": {"name": f"bench_{user_code}", "char": CHARACTERS[seed % len(CHARACTERS)], "mr": 1500 + seed % 200,
+               "control": seed % 2, "rounds": [1, 1] if p1_wins else [1, 0, 0]},
+        "p2": {"name": f"opp_{seed % 97}", "char": CHARACTERS[(seed * 7) % len(CHARACTERS)], "mr": 1480 + seed % 150,
+               "control": (seed // 2) % 2, "rounds": [0, 0] if p1_wins else [0, 1, 1]},
+    }
+
+def _play_stats(user_code):
+    seed = sum(map(ord, user_code))
+    keys = [k for _, k in STYLE_ITEMS] + [k for _, items in DETAIL_SECTIONS for _, k in items]
+    return {k: round((seed * (i + 3)) % 500 / 10, 1) for i, k in enumerate(keys)}
+
+def _next_data(page_props):
+    payload = json.dumps({"props": {"pageProps": page_props}}, ensure_ascii=False).replace("</", "<\\/")
+    return f'<script id="__NEXT_DATA__" type="application/json">{payload}</script>'
+
+def render_play(user_code):
+    stats = _play_stats(user_code)
+    styles = "".join(
+        f'<li class="battle_style_item"><span class="battle_style_type">{label}</span><span class="battle_style_number">{stats[k]}%</span></li>'
+        for label, k in STYLE_ITEMS
+    )
+    details = "".join(
+        f'<dl><dt>{title}</dt><dd>' + "".join(f'<p><span>{label}</span><span>{stats[k]}</span></p>' for label, k in items) + '</dd></dl>'
+        for title, items in DETAIL_SECTIONS
+    )
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"></head><body>'
+        f'<ul class="profile_nav"><li>プレイ</li><li>実績</li></ul>'
+        f'<ul class="battle_style">{styles}</ul>{details}'
+        f'{_next_data({"play": {"battle_stats": stats}})}</body></html>'
+    )
+
+def _side_html(side, p):
+    ctrl = "type0" if p["control"] == 0 else "type1"
+    return (
+        f'<div class="battle_data_player{side}">'
+        f'<span class="battle_data_lp">{p["mr"]:,} MR</span>'
+        f'<span class="battle_data_character"><img alt="{p["char"]}" src="/img/char.png"></span>'
+        f'<span class="battle_data_control"><img src="/img/{ctrl}.png"></span></div>'
+        f'<span class="battle_data_name_p{side}">{p["name"]}</span>'
+        f'<span class="battle_data_player_{side}">{"WIN" if sum(p["rounds"]) >= 2 else "LOSE"}</span>'
+    )
+
+def render_battlelog_fragment(user_code, page, total_pages):
+    rows = "".join(
+        f'<li data-index="{i}">{_side_html(1, b["p1"])}{_side_html(2, b["p2"])}<span class="battle_data_date">{b["date"]}</span></li>'
+        for i, b in enumerate(_battle(user_code, (page - 1) * PAGE_SIZE + i) for i in range(PAGE_SIZE))
+    )
+    disabled = " disabled" if page >= total_pages else ""
+    return f'<div id="battlelog"><ul>{rows}</ul><ul class="pager"><li class="next{disabled}" data-page="{page + 1}">次へ</li></ul></div>'
+
+def render_battlelog(user_code, page, total_pages):
+    replays = []
+    for i in range(PAGE_SIZE):
+        b = _battle(user_code, (page - 1) * PAGE_SIZE + i)
+        replays.append({
+            "uploaded_at": b["uploaded_at"],
+            **{f"player{n}_info": {
+                "player": {"fighter_id": b[side]["name"]}, "character_name": b[side]["char"], "master_rating": b[side]["mr"],
+                "battle_input_type": b[side]["control"], "round_results": b[side]["rounds"],
+            } for n, side in ((1, "p1"), (2, "p2"))},
+        })
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"></head><body>'
+        f'{render_battlelog_fragment(user_code, page, total_pages)}<script>{PAGER_JS}</script>'
+        f'{_next_data({"replay_list": replays, "current_page": page, "total_page": total_pages})}</body></html>'
+    )
+
+class StandInServer:
+    """スタンドインサーバー。latency_ms で1リクエストごとの応答遅延を模擬できる"""
+
+    def __init__(self, total_pages=50, latency_ms=0, host="127.0.0.1", port=0):
+        self.total_pages = total_pages
+        self.latency = latency_ms / 1000
+        self.counts = {"play": 0, "battlelog": 0, "other": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+
+    def reset_counts(self):
+        with self._lock:
+            self.counts = {k: 0 for k in self.counts}
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                if m := PLAY_RE.match(url.path):
+                    stand_in._count("play")
+                    return self._send(render_play(m.group(1)))
+                if m := BATTLELOG_RE.match(url.path):
+                    page = max(1, int(query.get("page", ["1"])[0]))
+                    stand_in._count("battlelog")
+                    if query.get("fragment"):
+                        return self._send(render_battlelog_fragment(m.group(1), page, stand_in.total_pages))
+                    return self._send(render_battlelog(m.group(1), page, stand_in.total_pages))
+                stand_in._count("other")
+                self.send_response(404)
+                self.end_headers()
+
+            def _send(self, body):
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="StandInServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
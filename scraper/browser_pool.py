@@ -0,0 +1,128 @@
+import contextlib
+import uuid
+import psutil
+from playwright.sync_api import sync_playwright
+from config import COOKIE_PATH, BROWSER_MAX_USES, BROWSER_MAX_RSS_MB
+import metrics
+
+LAUNCH_ARGS = ["--disable-blink-features=AutomationControlled", "--no-sandbox"]
+CONTEXT_OPTIONS = {
+    "viewport": {'width': 1280, 'height': 1200},
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0.0.0 Safari/537.36",
+    "locale": "ja-JP",
+}
+
+# プールごとに起動したChromiumを見分けるための引数 (Chromiumは未知のスイッチを無視する)
+POOL_MARKER_ARG = "--sf6-browser-pool"
+
+def find_process_with_arg(arg):
+    """このプロセス配下で、起動引数に arg を含むプロセスのPIDを返す (見つからなければNone)"""
+    for child in psutil.Process().children(recursive=True):
+        try:
+            if arg in child.cmdline():
+                return child.pid
+        except psutil.Error:
+            continue
+    return None
+
+def chromium_rss_mb(pid):
+    """pid のプロセスとその子孫 (Chromium本体 + レンダラ等) の合計RSSをMBで返す
+
+    ワーカーのスレッドごとにプールがあるため、他のプールのChromiumは含めない。プロセスが無ければ0。
+    """
+    try:
+        root = psutil.Process(pid)
+        procs = [root, *root.children(recursive=True)]
+    except psutil.Error:
+        return 0.0
+    total = 0
+    for proc in procs:
+        try:
+            total += proc.memory_info().rss
+        except psutil.Error:
+            continue
+    return total / (1024 * 1024)
+
+class BrowserPool:
+    """Chromiumを1プロセスだけ起動し続け、ユーザーごとに新しいコンテキストを払い出す
+
+    Playwrightの同期APIはスレッドを跨げないため、プールは作成したスレッド内でのみ使うこと。
+    """
+
+    def __init__(self, max_uses=BROWSER_MAX_USES, max_rss_mb=BROWSER_MAX_RSS_MB, write_log_func=print):
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.write_log = write_log_func
+        self._playwright = None
+        self._browser = None
+        self._browser_pid = None
+        self.uses = 0
+
+    def _launch(self):
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+        marker = f"{POOL_MARKER_ARG}={uuid.uuid4().hex}"
+        try:
+            self._browser = self._playwright.chromium.launch(headless=True, args=[*LAUNCH_ARGS, marker])
+        except Exception:
+            metrics.BROWSER_LAUNCHES_TOTAL.labels(result="error").inc()
+            raise
+        metrics.BROWSER_LAUNCHES_TOTAL.labels(result="ok").inc()
+        self._browser_pid = find_process_with_arg(marker)
+        if self._browser_pid is None:
+            self.write_log("⚠️ 起動したChromiumのプロセスが見つからないため、RSSによる再起動は行いません。")
+        self.uses = 0
+
+    def _close_browser(self):
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+            self._browser_pid = None
+
+    def _needs_recycle(self):
+        if self._browser is None:
+            return True
+        if not self._browser.is_connected():
+            metrics.BROWSER_RECYCLES_TOTAL.labels(reason="disconnected").inc()
+            return True
+        if self.uses >= self.max_uses:
+            self.write_log(f"♻️ ブラウザを再起動します (使用回数 {self.uses}回)")
+            metrics.BROWSER_RECYCLES_TOTAL.labels(reason="uses").inc()
+            return True
+        rss = chromium_rss_mb(self._browser_pid) if self._browser_pid else 0.0
+        if rss > self.max_rss_mb:
+            self.write_log(f"♻️ ブラウザを再起動します (RSS {rss:.0f}MB)")
+            metrics.BROWSER_RECYCLES_TOTAL.labels(reason="rss").inc()
+            return True
+        return False
+
+    @contextlib.contextmanager
+    def context(self):
+        """Cookie読込済みの新しいブラウザコンテキストを貸し出し、終了時に破棄する"""
+        if self._needs_recycle():
+            self._close_browser()
+            self._launch()
+        context = self._browser.new_context(storage_state=COOKIE_PATH, **CONTEXT_OPTIONS)
+        self.uses += 1
+        try:
+            yield context
+        finally:
+            try:
+                context.close()
+            except Exception:
+                pass
+
+    def close(self):
+        self._close_browser()
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
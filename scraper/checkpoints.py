@@ -0,0 +1,139 @@
+# 巡回のチェックポイント (V19 / V20 crawl_checkpoints) と差分巡回の到達点 (crawl_watermarks)。
+# 戦績はページごとに保存し、保存できたページ番号と最も古い試合 (カーソル) を記録する。
+#
+# 到達点は「これ以前の試合は保存済み」を表すため、巡回が開始時点の到達点 (stop_at) か戦績の末尾まで
+# 届いたときだけ、1ページ目の最新試合 (pending_*) へ進める。届かずに終わった巡回は
+#   ・失敗・中断 (failed / running) … 次回 last_page + 1 ページ目から end_page まで取得し直す
+#   ・max_pages で打ち切り (partial、差分巡回のみ) … 間に未取得の試合が残っているため、次回は続きの max_pages ページを取得する
+# として残し、到達点は進めない。再開までに新しい試合が増えるとページの中身は後ろへずれるが、
+# 重複はINSERT時に除かれるため取りこぼしは起きない。
+from collections import namedtuple
+from sqlalchemy import text
+from database import engine
+from ingest import parse_played_at
+
+# start_page 〜 end_page を巡回する。stop_at は開始時点の到達点 (差分巡回ならここで打ち切る)
+CrawlPlan = namedtuple("CrawlPlan", ["start_page", "end_page", "stop_at", "incremental", "cursor_played_at", "resumed"])
+
+def load_watermark(user_code):
+    """保存済みの最新試合日時を返す (未巡回ならNone)"""
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT last_played_at FROM crawl_watermarks WHERE user_code = :uid"), {"uid": user_code}).fetchone()
+    return row[0] if row else None
+
+def save_watermark(user_code, battles):
+    """渡した戦績のうち最新の試合を到達点として記録する (到達点は後戻りしない)"""
+    if not battles:
+        return
+    latest = max(battles, key=lambda it: parse_played_at(it['date']))
+    with engine.begin() as conn:
+        _upsert_watermark(conn, user_code, latest['id'], parse_played_at(latest['date']))
+
+def _upsert_watermark(conn, user_code, battle_id, played_at):
+    conn.execute(text("""
+        INSERT INTO crawl_watermarks (user_code, last_battle_id, last_played_at, updated_at)
+        VALUES (:uid, :bid, :pat, CURRENT_TIMESTAMP)
+        ON CONFLICT (user_code) DO UPDATE SET
+            last_battle_id = EXCLUDED.last_battle_id, last_played_at = EXCLUDED.last_played_at, updated_at = CURRENT_TIMESTAMP
+        WHERE crawl_watermarks.last_played_at IS NULL OR crawl_watermarks.last_played_at <= EXCLUDED.last_played_at
+    """), {"uid": user_code, "bid": battle_id, "pat": played_at})
+
+def covers_watermark(battles, watermark):
+    """戦績に到達点以前の試合が含まれていればTrue (到達点が無ければ常にTrue)"""
+    if watermark is None:
+        return True
+    return any(parse_played_at(it['date']) <= watermark for it in battles)
+
+def reached_watermark(page_battles, watermark):
+    """ページ内に保存済みの試合が含まれていればTrue (戦績は新しい順のため、以降のページは全て既知)"""
+    if not page_battles:
+        return True
+    if watermark is None:
+        return False
+    return covers_watermark(page_battles, watermark)
+
+def plan_from_row(row, max_pages, incremental, watermark):
+    """前回のチェックポイント row から今回の巡回計画を決める (続きが無ければ1ページ目からの計画)
+
+    ページ数や差分巡回の指定が前回と異なる場合は、呼び出し側の指定を優先して1ページ目からやり直す。
+    """
+    same_request = row is not None and row.max_pages == max_pages and row.incremental == incremental
+    if same_request and (row.status in ("running", "failed") or (row.status == "partial" and incremental)):
+        # 最後のページまで保存してから中断した場合も、打ち切りと同じく続きの max_pages ページを取得する
+        end_page = row.end_page if row.last_page < row.end_page else row.last_page + max_pages
+        return CrawlPlan(row.last_page + 1, end_page, row.stop_at, row.incremental, row.cursor_played_at, row.last_page > 0)
+    return CrawlPlan(1, max_pages, watermark, incremental, None, False)
+
+def load(user_code):
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT status, last_page, end_page, max_pages, incremental, cursor_played_at, stop_at
+            FROM crawl_checkpoints WHERE user_code = :uid
+        """), {"uid": user_code}).fetchone()
+
+def begin(user_code, max_pages, incremental):
+    """巡回を開始する。前回の巡回の続きがあれば、そこから再開する計画を返す"""
+    plan = plan_from_row(load(user_code), max_pages, incremental, load_watermark(user_code))
+    with engine.begin() as conn:
+        if plan.start_page > 1:
+            conn.execute(text("""
+                UPDATE crawl_checkpoints SET status = 'running', end_page = :end_page, last_error = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE user_code = :uid
+            """), {"uid": user_code, "end_page": plan.end_page})
+        else:
+            conn.execute(text("""
+                INSERT INTO crawl_checkpoints (user_code, status, last_page, end_page, max_pages, incremental, stop_at, started_at, updated_at)
+                VALUES (:uid, 'running', 0, :max_pages, :max_pages, :incremental, :stop_at, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                ON CONFLICT (user_code) DO UPDATE SET
+                    status = 'running', last_page = 0, end_page = EXCLUDED.end_page, max_pages = EXCLUDED.max_pages,
+                    incremental = EXCLUDED.incremental, stop_at = EXCLUDED.stop_at,
+                    cursor_battle_id = NULL, cursor_played_at = NULL, pending_battle_id = NULL, pending_played_at = NULL,
+                    last_error = NULL, started_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            """), {"uid": user_code, "max_pages": max_pages, "incremental": incremental, "stop_at": plan.stop_at})
+    return plan
+
+def advance(user_code, page_no, page_battles):
+    """page_no ページ目までの戦績を保存し終えたことを記録する
+
+    1ページ目の最新試合は、巡回が到達点まで届いたときに新しい到達点になるため pending_* に控えておく。
+    """
+    oldest = min(page_battles, key=lambda it: parse_played_at(it['date'])) if page_battles else None
+    newest = max(page_battles, key=lambda it: parse_played_at(it['date'])) if page_battles and page_no == 1 else None
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE crawl_checkpoints SET last_page = :page,
+                cursor_battle_id = COALESCE(:bid, cursor_battle_id), cursor_played_at = COALESCE(:pat, cursor_played_at),
+                pending_battle_id = COALESCE(:new_bid, pending_battle_id), pending_played_at = COALESCE(:new_pat, pending_played_at),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE user_code = :uid
+        """), {"uid": user_code, "page": page_no,
+               "bid": oldest['id'] if oldest else None, "pat": parse_played_at(oldest['date']) if oldest else None,
+               "new_bid": newest['id'] if newest else None, "new_pat": parse_played_at(newest['date']) if newest else None})
+
+def finish(user_code, error=None, closed=True):
+    """巡回の終了を記録する
+
+    error を渡すと failed として残る。closed=True (到達点か戦績の末尾まで届いた) なら到達点を進めて completed、
+    closed=False なら到達点との間に未取得の試合が残っているため partial として残す。
+    """
+    status = "failed" if error else ("completed" if closed else "partial")
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE crawl_checkpoints SET status = :status, last_error = :error, updated_at = CURRENT_TIMESTAMP
+            WHERE user_code = :uid
+        """), {"uid": user_code, "status": status, "error": str(error)[:1000] if error else None})
+        if status == "completed":
+            row = conn.execute(text("SELECT pending_battle_id, pending_played_at FROM crawl_checkpoints WHERE user_code = :uid"),
+                               {"uid": user_code}).fetchone()
+            if row is not None and row.pending_played_at is not None:
+                _upsert_watermark(conn, user_code, row.pending_battle_id, row.pending_played_at)
+    return status
+
+def page_misaligned(page_battles, plan):
+    """再開時に開いたページが前回の続きになっていなければTrue
+
+    ?page=N が効かずに1ページ目が返った場合などは、前回保存した最も古い試合より新しい試合だけが並ぶ。
+    """
+    if not plan.resumed or plan.cursor_played_at is None or not page_battles:
+        return False
+    return min(parse_played_at(it['date']) for it in page_battles) > plan.cursor_played_at
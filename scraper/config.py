@@ -1,4 +1,5 @@
 import os
+import socket
 import pytz
 
 # --- 1. 環境変数のバリデーション ---
@@ -13,9 +14,10 @@ else:
 
 # --- 2. 基本設定 ---
 JST = pytz.timezone('Asia/Tokyo')
-COOKIE_PATH = "./auth/local_cookies.json"
+COOKIE_PATH = os.getenv("COOKIE_PATH", "./auth/local_cookies.json")
 FULL_SCREENSHOT_PATH = "./debug_full_screen.png"
-LOG_FILE = "scraper.log"
+# {host} はホスト名 (コンテナID) に置き換わる。複数のプロセスが同じファイルをローテーションしないよう、サービスごとに分ける
+LOG_FILE = os.getenv("LOG_FILE", "scraper.log").format(host=socket.gethostname())
 
 # カラムコメントリスト
 COLUMN_COMMENTS = [
@@ -36,4 +38,96 @@ COLUMN_COMMENTS = [
     ("battle_results.p1_control", "P1：操作"), ("battle_results.p1_result", "P1：結果"),
     ("battle_results.p2_name", "P2：名前"), ("battle_results.p2_char", "P2：キャラ"), ("battle_results.p2_mr", "P2 : MR/LP"),
     ("battle_results.p2_control", "P2 : 操作"), ("battle_results.p2_result", "P2 : 結果")
-]
\ No newline at end of file
+]
+
+# --- 3. 巡回スケジューラ設定 ---
+# 同時に巡回するユーザー数
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "3"))
+# Buckler へのリクエスト許容レート (回/秒) とバースト上限 (全ワーカープロセスの合計。DBの rate_limits で共有する)
+BUCKLER_RATE_PER_SEC = float(os.getenv("BUCKLER_RATE_PER_SEC", "0.5"))
+BUCKLER_BURST = int(os.getenv("BUCKLER_BURST", "3"))
+
+# --- 4. ブラウザプール設定 ---
+# 同じChromiumプロセスを使い回すコンテキスト数の上限
+BROWSER_MAX_USES = int(os.getenv("BROWSER_MAX_USES", "20"))
+# Chromium関連プロセスの合計RSSがこの値(MB)を超えたら再起動する
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "1024"))
+
+# --- 5. ページ待機設定 ---
+# 要素の描画・ページ切替を待つ上限時間(ms)
+READY_TIMEOUT_MS = int(os.getenv("READY_TIMEOUT_MS", "15000"))
+
+# --- 6. 取得方式 ---
+BUCKLER_BASE_URL = os.getenv("BUCKLER_BASE_URL", "https://www.streetfighter.com/6/buckler")
+# browser: Playwrightで描画して取得 / http: 埋め込みJSONを直接取得し、失敗時のみPlaywrightへ切替
+SCRAPE_BACKEND = os.getenv("SCRAPE_BACKEND", "browser")
+
+# --- 7. DB書き込み設定 ---
+# 戦績の一括INSERTで1文にまとめる行数
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+
+# --- 8. 管理画面設定 ---
+# DBから読み込んだ画面表示用データのキャッシュ有効期間(秒)
+UI_CACHE_TTL_SEC = int(os.getenv("UI_CACHE_TTL_SEC", "30"))
+
+# --- 9. ログ設定 ---
+# メモリ上に保持する直近ログの件数 (このプロセスの分。log_pipeline.recent() で引ける)
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", "2000"))
+# ログをDB (V22 scrape_logs) にも書き込むか (管理画面からワーカーのログを見るために使う)、および保持日数
+LOG_TO_DB = os.getenv("LOG_TO_DB", "1") == "1"
+LOG_DB_RETENTION_DAYS = int(os.getenv("LOG_DB_RETENTION_DAYS", "7"))
+# DBへは LOG_DB_BATCH_SIZE 件ごと (溜まらなくても LOG_DB_FLUSH_SEC 秒ごと) にまとめて書き込む。
+# DBが落ちていても待たされないよう、接続・実行は LOG_DB_TIMEOUT_SEC 秒で打ち切る
+LOG_DB_BATCH_SIZE = int(os.getenv("LOG_DB_BATCH_SIZE", "200"))
+LOG_DB_FLUSH_SEC = float(os.getenv("LOG_DB_FLUSH_SEC", "2"))
+LOG_DB_TIMEOUT_SEC = int(os.getenv("LOG_DB_TIMEOUT_SEC", "5"))
+# ログファイルのローテーション (1ファイルの上限バイト数と世代数)
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# 書き込み待ちのログの上限件数。ディスクやDBが詰まって溢れた分は捨てて件数だけ数える
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# --- 10. ジョブキュー設定 ---
+# ワーカーが1ジョブを保持できる期間(秒)。実行中は定期的に延長される
+JOB_LEASE_SEC = int(os.getenv("JOB_LEASE_SEC", "600"))
+# キューが空のときの問い合わせ間隔(秒)
+JOB_POLL_SEC = int(os.getenv("JOB_POLL_SEC", "10"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# --- 11. ページ原本アーカイブ ---
+# 取得したHTMLを圧縮保存し、後から再解析できるようにする (0で無効)
+ARCHIVE_PAGES = os.getenv("ARCHIVE_PAGES", "1") == "1"
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+# 再解析 (reparse.py) で一度に解析・書き込みするページ数 (この単位でコミットする)
+REPARSE_CHUNK_PAGES = int(os.getenv("REPARSE_CHUNK_PAGES", "200"))
+
+# --- 12. 過去戦績の一括取得 (backfill) ---
+# 1ユーザーの戦績ページを同時に取得する数の上限 (ブラウザ取得時は2本目以降のタブごとにChromiumを起動する)
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "3"))
+
+# --- 13. Parquet書き出し ---
+EXPORT_DIR = os.getenv("EXPORT_DIR", "./export")
+# 1ファイルあたりの最大行数 (読み込み時のメモリ使用量の上限にもなる)
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "100000"))
+
+# --- 14. 分析 (analytics.py) ---
+# 直近勝率を計算する試合数と、セッションを区切る試合間隔(分)
+ANALYTICS_ROLLING_WINDOW = int(os.getenv("ANALYTICS_ROLLING_WINDOW", "20"))
+ANALYTICS_SESSION_GAP_MIN = int(os.getenv("ANALYTICS_SESSION_GAP_MIN", "30"))
+
+# --- 15. メトリクス (Prometheus形式) ---
+# /metrics を公開するポート (0で無効)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# --- 16. リソースの読み込み制限 (Playwright) ---
+# 画像・フォント・計測タグなど、抽出に不要なリクエストを読み込まない (0で無効)
+RESOURCE_FILTER = os.getenv("RESOURCE_FILTER", "1") == "1"
+# 読み込みを許可するドメイン (BUCKLER_BASE_URL のホストは常に許可)
+RESOURCE_ALLOWED_HOSTS = [h.strip() for h in os.getenv("RESOURCE_ALLOWED_HOSTS", "streetfighter.com,capcom.com").split(",") if h.strip()]
+# 許可ドメイン内でも遮断するURL (Cookie同意ダイアログ・計測タグ)
+RESOURCE_BLOCKED_KEYWORDS = [k.strip() for k in os.getenv("RESOURCE_BLOCKED_KEYWORDS", "cookiebot,googletagmanager,google-analytics,doubleclick,beacon").split(",") if k.strip()]
+
+# --- 17. Discord Bot /stats ---
+# 直近の勝敗として表示する試合数と、苦手キャラとして扱うのに必要な最低対戦数
+BOT_STATS_RECENT_MATCHES = int(os.getenv("BOT_STATS_RECENT_MATCHES", "10"))
+BOT_STATS_MIN_MATCHUP_MATCHES = int(os.getenv("BOT_STATS_MIN_MATCHUP_MATCHES", "5"))
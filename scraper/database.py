@@ -1,8 +1,11 @@
 from sqlalchemy import create_engine, text
 from config import DATABASE_URL, ENV_ERROR
+from metrics import instrument_engine
 
 # エンジンの作成
 engine = create_engine(DATABASE_URL) if not ENV_ERROR else None
+if engine is not None:
+    instrument_engine(engine)
 
 def init_db():
     """FlywayがDB管理を行うため、ここでは接続確認のみ実施"""
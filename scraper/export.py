@@ -0,0 +1,165 @@
+# 戦績・統計を月ごとに分割したParquetファイルへ書き出す。
+# 前回の到達点 (export_watermarks) より後の行だけを追記するため、本番DBへの負荷は新規分の読み込みのみ。
+# 書き出す範囲は開始前に pending_* として記録し、途中で失敗した場合は次回も同じ範囲・同じファイル名で書き直す。
+#
+# 出力 (EXPORT_DIR 配下、Hive形式のパーティション):
+#   battle_results/month=YYYY-MM/*.parquet  … 戦績 (1試合1行、v_battle_results と同じ列)
+#   battle_facts/month=YYYY-MM/*.parquet    … v_battle_analytics と同じプレイヤー視点 (1試合2行)
+#   player_stats/month=YYYY-MM/*.parquet    … 日次の統計 (前日までの確定分のみ)
+#
+# 使い方 (scraper ディレクトリで実行):
+#   python export.py            # 差分のみ書き出す
+#   python export.py --full     # 到達点を無視して全件を書き出し直す
+import argparse
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text
+from config import EXPORT_DIR, EXPORT_CHUNK_ROWS
+from database import engine
+
+BATTLES_SQL = """
+    SELECT id, battle_key, battle_id, played_at, mode,
+        p1_name, p1_char, p1_mr, p1_control, p1_result,
+        p2_name, p2_char, p2_mr, p2_control, p2_result
+    FROM v_battle_results
+    WHERE id > :last_id AND id <= :upper_id
+    ORDER BY id
+"""
+
+FACTS_SQL = """
+    SELECT r.id AS battle_row_id, f.battle_key, f.side, f.played_at, p.name AS my_name, c.name AS my_char, f.my_mr, f.my_result,
+        oc.name AS opponent_char, ok.name AS opponent_control, f.is_win
+    FROM battle_results r
+    JOIN battle_facts f ON f.battle_key = r.battle_key
+    LEFT JOIN players p ON p.id = f.my_player_id
+    LEFT JOIN characters c ON c.id = f.my_char_id
+    LEFT JOIN characters oc ON oc.id = f.opponent_char_id
+    LEFT JOIN control_types ok ON ok.id = f.opponent_control_id
+    WHERE r.id > :last_id AND r.id <= :upper_id
+    ORDER BY r.id, f.side
+"""
+
+# 当日分は再取得で上書きされるため、前日までの確定した日だけを書き出す (:upper_date は export_player_stats で決める)
+PLAYER_STATS_SQL = """
+    SELECT * FROM player_stats
+    WHERE recorded_at > COALESCE(:last_date, DATE '1970-01-01') AND recorded_at <= :upper_date
+    ORDER BY recorded_at, user_id
+"""
+
+def load_watermark(conn, name):
+    """(last_id, last_date, pending_id, pending_date) を返す"""
+    row = conn.execute(text("SELECT last_id, last_date, pending_id, pending_date FROM export_watermarks WHERE name = :name"),
+                       {"name": name}).fetchone()
+    return tuple(row) if row else (None, None, None, None)
+
+def save_pending(name, pending_id=None, pending_date=None):
+    """これから書き出す範囲の上限を記録する (到達点は変えない)"""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO export_watermarks (name, pending_id, pending_date, updated_at)
+            VALUES (:name, :pending_id, :pending_date, CURRENT_TIMESTAMP)
+            ON CONFLICT (name) DO UPDATE SET
+                pending_id = EXCLUDED.pending_id, pending_date = EXCLUDED.pending_date, updated_at = CURRENT_TIMESTAMP
+        """), {"name": name, "pending_id": pending_id, "pending_date": pending_date})
+
+def save_watermark(name, last_id=None, last_date=None):
+    """書き出しの完了を記録する (書き出し中の範囲は消す)"""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO export_watermarks (name, last_id, last_date, updated_at)
+            VALUES (:name, :last_id, :last_date, CURRENT_TIMESTAMP)
+            ON CONFLICT (name) DO UPDATE SET
+                last_id = EXCLUDED.last_id, last_date = EXCLUDED.last_date,
+                pending_id = NULL, pending_date = NULL, updated_at = CURRENT_TIMESTAMP
+        """), {"name": name, "last_id": last_id, "last_date": last_date})
+
+def committed_upper_id():
+    """書き出してよい battle_results.id の上限を返す
+
+    SHARE ロックは実行中の INSERT の完了を待ってから取得されるため、この時点の MAX(id) 以下の行は全てコミット済みで、
+    後から小さい id の行が現れて取りこぼすことがない。ロックは MAX(id) を読む間だけ保持する。
+    """
+    with engine.begin() as conn:
+        conn.execute(text("LOCK TABLE battle_results IN SHARE MODE"))
+        return conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM battle_results")).scalar()
+
+def write_chunks(sql, params, dataset, date_column, tag, write_log_func):
+    """クエリ結果を EXPORT_CHUNK_ROWS 行ずつ月別パーティションへ書き出し、書き出した行数を返す
+
+    ファイル名は書き出す範囲 (tag) から決まる。範囲は pending_* として記録して再実行時も同じものを使うため、
+    途中で失敗して再実行しても同じファイルが上書きされるだけで重複しない。
+    """
+    root = os.path.join(EXPORT_DIR, dataset)
+    total = 0
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for i, df in enumerate(pd.read_sql(text(sql), conn, params=params, chunksize=EXPORT_CHUNK_ROWS)):
+            if df.empty:
+                continue
+            df["month"] = pd.to_datetime(df[date_column]).dt.strftime("%Y-%m")
+            pq.write_to_dataset(
+                pa.Table.from_pandas(df, preserve_index=False), root, partition_cols=["month"],
+                basename_template=f"part-{tag}-{i:04d}-{{i}}.parquet", compression="zstd",
+                existing_data_behavior="overwrite_or_ignore",
+            )
+            total += len(df)
+    if total:
+        write_log_func(f"📦 {dataset}: {total}行を書き出しました。")
+    return total
+
+def export_battles(write_log_func=print):
+    with engine.connect() as conn:
+        last_id, _, pending_id, _ = load_watermark(conn, "battle_results")
+    last_id = last_id or 0
+    if pending_id is not None and pending_id > last_id:
+        # 前回の書き出しが途中で失敗した: 新しい戦績が増えていても同じ範囲を書き直す
+        upper_id = pending_id
+        write_log_func(f"⏯️ battle_results: 前回失敗した範囲 (id {last_id + 1}〜{upper_id}) を書き出し直します。")
+    else:
+        upper_id = committed_upper_id()
+        if upper_id <= last_id:
+            write_log_func("ℹ️ battle_results: 新しい戦績はありません。")
+            return 0
+        save_pending("battle_results", pending_id=upper_id)
+    params = {"last_id": last_id, "upper_id": upper_id}
+    tag = f"{last_id + 1:010d}-{upper_id:010d}"
+    count = write_chunks(BATTLES_SQL, params, "battle_results", "played_at", tag, write_log_func)
+    write_chunks(FACTS_SQL, params, "battle_facts", "played_at", tag, write_log_func)
+    save_watermark("battle_results", last_id=upper_id)
+    return count
+
+def export_player_stats(write_log_func=print):
+    with engine.connect() as conn:
+        _, last_date, _, pending_date = load_watermark(conn, "player_stats")
+        upper_date = pending_date if pending_date is not None else conn.execute(text("""
+            SELECT MAX(recorded_at) FROM player_stats
+            WHERE recorded_at > COALESCE(:last_date, DATE '1970-01-01') AND recorded_at < CURRENT_DATE
+        """), {"last_date": last_date}).scalar()
+    if upper_date is None:
+        write_log_func("ℹ️ player_stats: 新しい確定日はありません。")
+        return 0
+    if pending_date is None:
+        save_pending("player_stats", pending_date=upper_date)
+    tag = f"{last_date or '0000-00-00'}-{upper_date}".replace("-", "")
+    count = write_chunks(PLAYER_STATS_SQL, {"last_date": last_date, "upper_date": upper_date}, "player_stats", "recorded_at", tag, write_log_func)
+    save_watermark("player_stats", last_date=upper_date)
+    return count
+
+def reset(write_log_func=print):
+    """書き出し済みファイルと到達点を消去する (--full 用)"""
+    for dataset in ("battle_results", "battle_facts", "player_stats"):
+        shutil.rmtree(os.path.join(EXPORT_DIR, dataset), ignore_errors=True)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM export_watermarks"))
+    write_log_func("🧹 書き出し済みのParquetと到達点を削除しました。")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="戦績・統計のParquet書き出し")
+    parser.add_argument("--full", action="store_true", help="到達点を無視して全件を書き出し直す")
+    args = parser.parse_args()
+    if args.full:
+        reset()
+    export_battles()
+    export_player_stats()
@@ -0,0 +1,141 @@
+import datetime
+import json
+import re
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from config import COOKIE_PATH, JST, CRAWL_CONCURRENCY
+from browser_pool import CONTEXT_OPTIONS
+from rate_limit import buckler_limiter
+
+NEXT_DATA_RE = re.compile(r'<script id="__NEXT_DATA__" type="application/json"[^>]*>(.*?)</script>', re.S)
+RATING_RE = re.compile(r"\d[\d,]*")
+
+# 実績タブの表示項目と、埋め込みJSON(play.battle_stats)のキーの対応
+PLAY_STATS_KEYS = {
+    "d_parry_pct": "gauge_rate_drive_guard",
+    "d_impact_pct": "gauge_rate_drive_impact",
+    "d_od_pct": "gauge_rate_drive_arts",
+    "d_rush_p_pct": "gauge_rate_drive_rush_from_parry",
+    "d_rush_c_pct": "gauge_rate_drive_rush_from_cancel",
+    "d_reversal_pct": "gauge_rate_drive_reversal",
+    "sa1_pct": "gauge_rate_sa_lv1",
+    "sa2_pct": "gauge_rate_sa_lv2",
+    "sa3_pct": "gauge_rate_sa_lv3",
+    "ca_pct": "gauge_rate_ca",
+    "just_parry": "just_parry",
+    "imp_win": "drive_impact",
+    "imp_pc_win": "punish_counter",
+    "imp_returned_win": "drive_impact_to_drive_impact",
+    "imp_lose": "received_drive_impact",
+    "imp_pc_lose": "received_punish_counter",
+    "imp_returned_lose": "received_drive_impact_to_drive_impact",
+    "stun_win": "stun",
+    "stun_lose": "received_stun",
+    "throw_win": "throw_count",
+    "throw_lose": "received_throw_count",
+    "throw_escape": "throw_tech",
+    "wall_push": "corner_time",
+    "wall_pushed": "cornered_time",
+}
+
+class PageDataError(Exception):
+    """埋め込みJSONが見つからない・想定した構造でない (未ログイン・仕様変更など)"""
+
+_session = None
+_session_lock = threading.Lock()
+
+def load_cookies(session, path=COOKIE_PATH):
+    """Playwrightのstorage_state形式のCookieをrequestsのセッションへ読み込む"""
+    with open(path, "r") as f:
+        state = json.load(f)
+    for c in state.get("cookies", []):
+        session.cookies.set(c["name"], c["value"], domain=c.get("domain"), path=c.get("path", "/"))
+
+def get_session():
+    """Keep-Aliveで接続を使い回す共有セッションを返す"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, CRAWL_CONCURRENCY))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"User-Agent": CONTEXT_OPTIONS["user_agent"], "Accept-Language": "ja-JP"})
+            load_cookies(session)
+            _session = session
+        return _session
+
+def extract_page_props(html):
+    """HTMLに埋め込まれた __NEXT_DATA__ から pageProps を取り出す"""
+    match = NEXT_DATA_RE.search(html)
+    if not match:
+        raise PageDataError("__NEXT_DATA__ が見つかりません")
+    return json.loads(match.group(1)).get("props", {}).get("pageProps", {})
+
+def fetch_page(url, params=None):
+    """1ページ分のHTMLを取得する"""
+    buckler_limiter.acquire()
+    res = get_session().get(url, params=params, timeout=30)
+    res.raise_for_status()
+    return res.text
+
+def _format_date(unix_sec):
+    return datetime.datetime.fromtimestamp(unix_sec, JST).strftime("%Y/%m/%d %H:%M")
+
+def normalize_rating(value):
+    """MR/LP を戦績の "mr" (battle_key の計算にも使う) の整数へ揃える
+
+    埋め込みJSONの数値と、ブラウザ版が読む画面表示 ("1,580 MR" / "25,000 LP") のどちらからでも同じ値になるよう、
+    文字列は最初の数字の並びを桁区切りを除いて読む (scraper.py の BATTLELOG_EXTRACT_JS も同じ規則)。
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    m = RATING_RE.search(value or "")
+    return int(m.group().replace(",", "")) if m else 0
+
+def _result(rounds, opponent_rounds):
+    """取得ラウンド数から結果を決める。どちらも勝っていない (同数) 場合は引き分け"""
+    if rounds == opponent_rounds:
+        return "DRAW"
+    return "WIN" if rounds > opponent_rounds else "LOSE"
+
+def _player(info, res):
+    # 画面にはマスターならMR、それ以外ならLPが表示されるため、同じ優先順位で選ぶ
+    mr = info.get("master_rating") or info.get("league_point") or 0
+    return {
+        "name": info.get("player", {}).get("fighter_id") or "Unknown",
+        "mr": normalize_rating(mr),
+        "char": info.get("character_name") or "Unknown",
+        "ctrl": "Classic" if info.get("battle_input_type") == 0 else "Modern",
+        "res": res,
+    }
+
+def parse_battlelog(page_props):
+    """戦績ページのpagePropsを、ブラウザ版の抽出結果と同じ形の辞書リストへ変換する"""
+    if "replay_list" not in page_props:
+        raise PageDataError("replay_list がありません")
+    results = []
+    for r in page_props["replay_list"]:
+        p1_info, p2_info = r["player1_info"], r["player2_info"]
+        p1_rounds = sum(1 for x in p1_info.get("round_results", []) if x)
+        p2_rounds = sum(1 for x in p2_info.get("round_results", []) if x)
+        date = _format_date(r["uploaded_at"])
+        p1 = _player(p1_info, _result(p1_rounds, p2_rounds))
+        p2 = _player(p2_info, _result(p2_rounds, p1_rounds))
+        results.append({"id": "rank_" + re.sub(r"[^0-9]", "", date) + "_" + p1["name"] + "_" + p2["name"], "date": date, "p1": p1, "p2": p2})
+    return results
+
+def parse_play_stats(page_props):
+    """プロフィール(プレイ)ページのpagePropsから実績タブ相当の統計を取り出す"""
+    try:
+        battle_stats = page_props["play"]["battle_stats"]
+    except (KeyError, TypeError):
+        raise PageDataError("play.battle_stats がありません")
+    missing = [key for key in PLAY_STATS_KEYS.values() if key not in battle_stats]
+    if missing:
+        raise PageDataError(f"統計項目が不足しています: {', '.join(missing)}")
+    return {col: float(battle_stats[key] or 0) for col, key in PLAY_STATS_KEYS.items()}
+
+def total_pages(page_props):
+    return int(page_props.get("total_page") or 1)
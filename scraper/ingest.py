@@ -0,0 +1,168 @@
+import datetime
+import hashlib
+import threading
+from psycopg2.extras import execute_values
+from config import INGEST_BATCH_SIZE
+from database import engine
+from rollups import apply_rollups
+import metrics
+
+INSERT_BATTLES_SQL = """
+    INSERT INTO battle_results (battle_key, played_at, mode,
+        p1_player_id, p1_char_id, p1_mr, p1_control_id, p1_result,
+        p2_player_id, p2_char_id, p2_mr, p2_control_id, p2_result)
+    VALUES %s
+    ON CONFLICT (battle_key, played_at) DO NOTHING
+    RETURNING battle_key
+"""
+
+# 再解析 (reparse.py) 用: 既存の試合も解析結果で上書きする。値が変わらない行は更新しない。
+# xmax = 0 の行は今回新たに挿入された行 (更新された行には更新したトランザクションIDが入る)
+UPSERT_BATTLES_SQL = """
+    INSERT INTO battle_results (battle_key, played_at, mode,
+        p1_player_id, p1_char_id, p1_mr, p1_control_id, p1_result,
+        p2_player_id, p2_char_id, p2_mr, p2_control_id, p2_result)
+    VALUES %s
+    ON CONFLICT (battle_key, played_at) DO UPDATE SET
+        p1_player_id = EXCLUDED.p1_player_id, p1_char_id = EXCLUDED.p1_char_id, p1_mr = EXCLUDED.p1_mr,
+        p1_control_id = EXCLUDED.p1_control_id, p1_result = EXCLUDED.p1_result,
+        p2_player_id = EXCLUDED.p2_player_id, p2_char_id = EXCLUDED.p2_char_id, p2_mr = EXCLUDED.p2_mr,
+        p2_control_id = EXCLUDED.p2_control_id, p2_result = EXCLUDED.p2_result
+    WHERE (battle_results.p1_player_id, battle_results.p1_char_id, battle_results.p1_mr, battle_results.p1_control_id, battle_results.p1_result,
+           battle_results.p2_player_id, battle_results.p2_char_id, battle_results.p2_mr, battle_results.p2_control_id, battle_results.p2_result)
+        IS DISTINCT FROM
+          (EXCLUDED.p1_player_id, EXCLUDED.p1_char_id, EXCLUDED.p1_mr, EXCLUDED.p1_control_id, EXCLUDED.p1_result,
+           EXCLUDED.p2_player_id, EXCLUDED.p2_char_id, EXCLUDED.p2_mr, EXCLUDED.p2_control_id, EXCLUDED.p2_result)
+    RETURNING battle_key, xmax = 0
+"""
+
+# 新規に入った試合だけをプレイヤー視点のファクトへ展開する (V17 の移行と同じ射影)
+INSERT_FACTS_SQL = """
+    INSERT INTO battle_facts (battle_key, side, played_at, my_player_id, my_char_id, my_mr, my_result, opponent_char_id, opponent_control_id, is_win)
+    SELECT battle_key, 1, played_at, p1_player_id, p1_char_id, p1_mr, p1_result, p2_char_id, p2_control_id, CASE WHEN p1_result = 'WIN' THEN 1 ELSE 0 END
+    FROM battle_results WHERE battle_key = ANY(%(keys)s) AND played_at BETWEEN %(from)s AND %(to)s
+    UNION ALL
+    SELECT battle_key, 2, played_at, p2_player_id, p2_char_id, p2_mr, p2_result, p1_char_id, p1_control_id, CASE WHEN p2_result = 'WIN' THEN 1 ELSE 0 END
+    FROM battle_results WHERE battle_key = ANY(%(keys)s) AND played_at BETWEEN %(from)s AND %(to)s
+    ON CONFLICT (battle_key, side) DO NOTHING
+"""
+
+# 再解析で上書きした試合のファクトを battle_results に合わせ直す
+REFRESH_FACTS_SQL = INSERT_FACTS_SQL.replace("DO NOTHING", """DO UPDATE SET
+        my_player_id = EXCLUDED.my_player_id, my_char_id = EXCLUDED.my_char_id, my_mr = EXCLUDED.my_mr, my_result = EXCLUDED.my_result,
+        opponent_char_id = EXCLUDED.opponent_char_id, opponent_control_id = EXCLUDED.opponent_control_id, is_win = EXCLUDED.is_win""")
+
+# 辞書テーブル名 → 戦績の各プレイヤー情報から値を取り出すキー
+DIMENSIONS = {"players": "name", "characters": "char", "control_types": "ctrl"}
+
+# 辞書テーブルの 名前 → ID。値は増える一方で変わらないため、コミット済みの分をプロセス内に保持する
+_dimension_ids = {table: {} for table in DIMENSIONS}
+_dimension_lock = threading.Lock()
+
+def parse_played_at(date_str):
+    """戦績の日時表記 (YYYY/MM/DD HH:MM) をdatetimeへ変換 (strptimeより軽量な固定位置パース)"""
+    return datetime.datetime(int(date_str[0:4]), int(date_str[5:7]), int(date_str[8:10]), int(date_str[11:13]), int(date_str[14:16]))
+
+def battle_key(it):
+    """試合ID文字列と両者のMRから64bitの試合キーを求める (SQLの battle_key() と同じ: MD5先頭8バイトの符号付き整数)
+
+    IDは分単位の日時と名前だけなので、同じ分に同じ相手と続けて対戦しても区別できるようMRを含める。
+    MRはHTTP版 (埋め込みJSON) とブラウザ版 (画面表示) で同じ値になるよう http_fetch.normalize_rating で揃えてある。
+    """
+    source = f"{it['id']}|{it['p1']['mr'] or 0}|{it['p2']['mr'] or 0}"
+    return int.from_bytes(hashlib.md5(source.encode("utf-8")).digest()[:8], "big", signed=True)
+
+def resolve_dimensions(cur, battles):
+    """戦績に含まれる名前・キャラ・操作タイプの辞書IDを返す。未登録の値はこのトランザクション内で登録する
+
+    戻り値: {テーブル名: {値: ID}}。呼び出し元はコミット後に remember_dimensions() でキャッシュへ反映する。
+    """
+    resolved = {}
+    for table, field in DIMENSIONS.items():
+        values = {it[side][field] for it in battles for side in ("p1", "p2") if it[side][field] is not None}
+        with _dimension_lock:
+            known = {v: _dimension_ids[table][v] for v in values if v in _dimension_ids[table]}
+        missing = sorted(values - known.keys())
+        if missing:
+            cur.execute(f"INSERT INTO {table} (name) SELECT unnest(%s::text[]) ON CONFLICT (name) DO NOTHING", (missing,))
+            cur.execute(f"SELECT name, id FROM {table} WHERE name = ANY(%s)", (missing,))
+            known.update(cur.fetchall())
+        resolved[table] = known
+    return resolved
+
+def remember_dimensions(resolved):
+    with _dimension_lock:
+        for table, ids in resolved.items():
+            _dimension_ids[table].update(ids)
+
+def _battle_row(it, dims):
+    p1, p2 = it['p1'], it['p2']
+    players, chars, ctrls = dims["players"], dims["characters"], dims["control_types"]
+    return (
+        battle_key(it), parse_played_at(it['date']), 'RankMatch',
+        players.get(p1['name']), chars.get(p1['char']), p1['mr'], ctrls.get(p1['ctrl']), p1['res'],
+        players.get(p2['name']), chars.get(p2['char']), p2['mr'], ctrls.get(p2['ctrl']), p2['res'],
+    )
+
+def insert_battles(battles, batch_size=INGEST_BATCH_SIZE):
+    """戦績をまとめてINSERTし、新規に追加された試合キー (battle_key) のリストを返す
+
+    batch_size件ごとに複数行VALUESの1文へまとめ、全件を1トランザクションで書き込む。
+    同じトランザクション内で辞書テーブル・battle_facts・事前集計テーブルにも新規分を反映する。
+    """
+    return _write_battles(battles, batch_size, overwrite=False)[0]
+
+def upsert_battles(battles, batch_size=INGEST_BATCH_SIZE):
+    """insert_battles と同じく書き込むが、保存済みの試合も解析結果で上書きする (再解析用)
+
+    戻り値: (新規に追加された試合キー, 内容が変わって上書きした試合キー)。
+    上書きした試合は battle_facts も合わせ直すが、事前集計テーブルには反映しないため、
+    上書きがあった場合は rollups.rebuild_rollups() で作り直すこと。
+    """
+    return _write_battles(battles, batch_size, overwrite=True)
+
+def _write_battles(battles, batch_size, overwrite):
+    # ページ送り中に新しい試合が入ると同じ試合が2ページに跨るため、先に重複を除く
+    unique = list({battle_key(it): it for it in battles}.values())
+    if not unique:
+        return [], []
+    played = [parse_played_at(it['date']) for it in unique]
+    months = {dt.replace(day=1, hour=0, minute=0) for dt in played}
+
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            # 挿入先の月パーティションを先に用意しておく
+            with metrics.db_timer("ensure_partition"):
+                for month in sorted(months):
+                    cur.execute("SELECT ensure_battle_results_partition(%s)", (month,))
+            with metrics.db_timer("resolve_dimensions"):
+                dims = resolve_dimensions(cur, unique)
+            rows = [_battle_row(it, dims) for it in unique]
+            with metrics.db_timer("insert_battles"):
+                if overwrite:
+                    written = execute_values(cur, UPSERT_BATTLES_SQL, rows, page_size=batch_size, fetch=True)
+                    new_keys = [r[0] for r in written if r[1]]
+                    updated_keys = [r[0] for r in written if not r[1]]
+                else:
+                    new_keys = [r[0] for r in execute_values(cur, INSERT_BATTLES_SQL, rows, page_size=batch_size, fetch=True)]
+                    updated_keys = []
+            if new_keys:
+                with metrics.db_timer("insert_facts"):
+                    cur.execute(INSERT_FACTS_SQL, {"keys": new_keys, "from": min(played), "to": max(played)})
+                with metrics.db_timer("apply_rollups"):
+                    apply_rollups(cur, new_keys)
+            if updated_keys:
+                with metrics.db_timer("refresh_facts"):
+                    cur.execute(REFRESH_FACTS_SQL, {"keys": updated_keys, "from": min(played), "to": max(played)})
+        with metrics.db_timer("commit"):
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    remember_dimensions(dims)
+    metrics.ROWS_INSERTED_TOTAL.labels(**metrics.labels()).inc(len(new_keys))
+    metrics.ROWS_SKIPPED_TOTAL.labels(**metrics.labels()).inc(len(rows) - len(new_keys) - len(updated_keys))
+    return new_keys, updated_keys
@@ -0,0 +1,129 @@
+import datetime
+from sqlalchemy import text
+from config import JST, JOB_LEASE_SEC, JOB_MAX_ATTEMPTS
+from database import engine
+
+DEFAULT_RUN_TIMES = ["09:00", "21:00"]
+
+def load_run_times():
+    """scraper_config の run_times を HH:MM のリストで返す"""
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(text("SELECT value FROM scraper_config WHERE key = 'run_times'")).fetchone()
+        raw_times = row[0].split(",") if row else DEFAULT_RUN_TIMES
+    except Exception:
+        raw_times = DEFAULT_RUN_TIMES
+    run_times = []
+    for t in raw_times:
+        t = t.strip()
+        if len(t) == 4 and ":" in t: t = "0" + t
+        run_times.append(t)
+    return run_times
+
+def due_slots(now_dt, run_times):
+    """現在時刻が実行枠 (設定時刻から60分以内) に入っている枠キーを返す"""
+    current = now_dt.hour * 60 + now_dt.minute
+    slots = []
+    for t_str in run_times:
+        try:
+            h, m = map(int, t_str.split(":"))
+        except ValueError:
+            continue
+        if h * 60 + m <= current < h * 60 + m + 60:
+            slots.append(f"{now_dt.strftime('%Y-%m-%d')} {t_str}")
+    return slots
+
+def enqueue_active_users(max_pages=2, incremental=True, slot_key=None):
+    """有効なユーザー全員分のジョブを登録し、新たに登録された件数を返す
+
+    slot_key を指定した場合、同じ枠のジョブは何度呼んでも1件しか作られない (複数ワーカーから呼んでも安全)。
+    """
+    with engine.begin() as conn:
+        res = conn.execute(text("""
+            INSERT INTO scrape_jobs (user_code, player_name, max_pages, incremental, slot_key, max_attempts)
+            SELECT user_code, player_name, :max_pages, :incremental, :slot_key, :max_attempts
+            FROM target_users WHERE is_active = TRUE
+            ON CONFLICT (user_code, slot_key) DO NOTHING
+        """), {"max_pages": max_pages, "incremental": incremental, "slot_key": slot_key, "max_attempts": JOB_MAX_ATTEMPTS})
+    return res.rowcount
+
+def enqueue_user(user_code, player_name, max_pages=5, incremental=True, mode="crawl"):
+    """1ユーザー分のジョブを登録する。mode='backfill' は過去戦績の一括取得 (backfill.py)"""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO scrape_jobs (user_code, player_name, max_pages, incremental, mode, max_attempts)
+            VALUES (:uid, :name, :max_pages, :incremental, :mode, :max_attempts)
+        """), {"uid": user_code, "name": player_name, "max_pages": max_pages, "incremental": incremental, "mode": mode, "max_attempts": JOB_MAX_ATTEMPTS})
+
+def enqueue_scheduled(write_log_func, now_dt=None):
+    """定期実行の枠に入っていれば全員分のジョブを登録する"""
+    now_dt = now_dt or datetime.datetime.now(JST)
+    for slot_key in due_slots(now_dt, load_run_times()):
+        added = enqueue_active_users(max_pages=2, incremental=True, slot_key=slot_key)
+        if added:
+            write_log_func(f"⏰ 定期巡回ジョブを登録しました (枠: {slot_key}, {added}件)")
+
+def claim(worker_id):
+    """実行可能なジョブを1件ロックして取得する。無ければNone"""
+    with engine.begin() as conn:
+        return conn.execute(text("""
+            UPDATE scrape_jobs SET
+                status = 'running', attempts = attempts + 1, locked_by = :wid,
+                lease_until = CURRENT_TIMESTAMP + make_interval(secs => :lease),
+                started_at = CURRENT_TIMESTAMP
+            WHERE id = (
+                SELECT id FROM scrape_jobs
+                WHERE status IN ('queued', 'running')
+                  AND ((status = 'queued' AND run_after <= CURRENT_TIMESTAMP)
+                    OR (status = 'running' AND lease_until < CURRENT_TIMESTAMP))
+                  AND attempts < max_attempts
+                ORDER BY run_after, id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, user_code, player_name, max_pages, incremental, mode, attempts, max_attempts
+        """), {"wid": worker_id, "lease": JOB_LEASE_SEC}).fetchone()
+
+def renew(job_ids, worker_id):
+    """実行中ジョブのリースを延長する"""
+    if not job_ids:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE scrape_jobs SET lease_until = CURRENT_TIMESTAMP + make_interval(secs => :lease)
+            WHERE id = ANY(:ids) AND locked_by = :wid AND status = 'running'
+        """), {"ids": list(job_ids), "wid": worker_id, "lease": JOB_LEASE_SEC})
+
+def progress(job_id, pages_done, pages_total):
+    """一括取得ジョブの進捗を記録する (UIの進捗表示用)"""
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE scrape_jobs SET pages_done = :done, pages_total = :total WHERE id = :id"),
+                     {"id": job_id, "done": pages_done, "total": pages_total})
+
+def complete(job_id, worker_id):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE scrape_jobs SET status = 'done', finished_at = CURRENT_TIMESTAMP, lease_until = NULL
+            WHERE id = :id AND locked_by = :wid
+        """), {"id": job_id, "wid": worker_id})
+
+def fail(job_id, worker_id, error):
+    """失敗を記録する。試行回数が残っていれば 試行回数×5分 後に再実行する"""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE scrape_jobs SET
+                status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                run_after = CURRENT_TIMESTAMP + make_interval(mins => attempts * 5),
+                finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE CURRENT_TIMESTAMP END,
+                lease_until = NULL, last_error = :err
+            WHERE id = :id AND locked_by = :wid
+        """), {"id": job_id, "wid": worker_id, "err": str(error)[:1000]})
+
+def reap_expired():
+    """リース切れのまま試行回数を使い切ったジョブを失敗扱いにする"""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE scrape_jobs SET status = 'failed', finished_at = CURRENT_TIMESTAMP,
+                last_error = COALESCE(last_error, 'lease expired')
+            WHERE status = 'running' AND lease_until < CURRENT_TIMESTAMP AND attempts >= max_attempts
+        """))
@@ -0,0 +1,220 @@
+import atexit
+import collections
+import contextlib
+import datetime
+import logging
+import logging.handlers
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from sqlalchemy import create_engine, text
+from config import (
+    JST, DATABASE_URL, ENV_ERROR, LOG_FILE, LOG_BUFFER_SIZE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE,
+    LOG_TO_DB, LOG_DB_RETENTION_DAYS, LOG_DB_BATCH_SIZE, LOG_DB_FLUSH_SEC, LOG_DB_TIMEOUT_SEC,
+)
+
+# このプロセスの直近のログを構造化して保持するリングバッファ (古いものから自動的に捨てられる)。
+# 別プロセスのワーカーの分も含めて見る場合は scrape_logs (V22) を読む
+_records = collections.deque(maxlen=LOG_BUFFER_SIZE)
+# スレッドごとの付帯情報 (巡回中のユーザー・処理フェーズ)
+_context = threading.local()
+
+_logger = logging.getLogger("sf6_scraper")
+_listener = None
+_db_writer = None
+_setup_lock = threading.Lock()
+# 書き込み待ちが溢れて捨てたログの件数
+dropped = 0
+
+class _JSTFormatter(logging.Formatter):
+    def formatTime(self, record, datefmt=None):
+        return datetime.datetime.fromtimestamp(record.created, JST).strftime(datefmt or "%Y-%m-%d %H:%M:%S")
+
+class _DropWhenFullHandler(logging.handlers.QueueHandler):
+    """キューが一杯なら待たずにログを捨て、件数を数える (呼び出し側の巡回を止めない)"""
+
+    def enqueue(self, record):
+        global dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped += 1
+            # metrics は log_pipeline を読み込むため、循環しないようここで読み込む
+            import metrics
+            metrics.LOG_RECORDS_DROPPED_TOTAL.inc()
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # 終了時はキューが一杯でも、溜まっている分を書き終えてから止める
+        self.queue.put(self._sentinel)
+
+def _count_db_lost(reason, n):
+    # metrics は log_pipeline を読み込むため、循環しないようここで読み込む
+    import metrics
+    metrics.LOG_DB_RECORDS_LOST_TOTAL.labels(reason=reason).inc(n)
+
+class _DBWriter:
+    """ログを scrape_logs (V22) に書き込む。管理画面から別プロセスのワーカーのログを見るために使う
+
+    ファイル・標準出力のリスナーとは別のキューとスレッドで動き、まとめてINSERTする。
+    DBが遅い・落ちている間もファイルと標準出力のログは止まらない。書き込めなかった件数はメトリクスに数える。
+    """
+
+    # この件数を書き込むごとに、保持期間を過ぎたログを削除する
+    PRUNE_EVERY = 5000
+    INSERT_SQL = """
+        INSERT INTO scrape_logs (logged_at, host, user_name, phase, duration, message)
+        VALUES (:at, :host, :user, :phase, :duration, :message)
+    """
+
+    def __init__(self, engine, batch_size=LOG_DB_BATCH_SIZE, flush_sec=LOG_DB_FLUSH_SEC, queue_size=LOG_QUEUE_SIZE):
+        self.engine = engine
+        self.batch_size = max(1, batch_size)
+        self.flush_sec = flush_sec
+        self.queue = queue.Queue(queue_size)
+        self.host = socket.gethostname()
+        self.written = 0
+        self.failing = False
+        self._stop = object()
+        self._thread = None
+
+    def put(self, record):
+        """呼び出し側を待たせずに書き込み待ちへ積む (一杯なら捨てて数える)"""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _count_db_lost("dropped", 1)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="LogDBWriter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=LOG_DB_TIMEOUT_SEC * 2):
+        try:
+            self.queue.put(self._stop, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            batch = []
+            item = self.queue.get()
+            deadline = time.monotonic() + self.flush_sec
+            while item is not self._stop:
+                batch.append(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            stopping = item is self._stop
+            if batch:
+                self.flush(batch)
+            if stopping:
+                return
+
+    def flush(self, batch):
+        rows = [{"at": r["at"], "host": self.host, "user": r.get("user"), "phase": r.get("phase"),
+                 "duration": float(r["duration"]) if r.get("duration") is not None else None, "message": r["message"]}
+                for r in batch]
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text(self.INSERT_SQL), rows)
+                if (self.written + len(rows)) // self.PRUNE_EVERY > self.written // self.PRUNE_EVERY:
+                    conn.execute(text("DELETE FROM scrape_logs WHERE logged_at < CURRENT_TIMESTAMP - make_interval(days => :days)"),
+                                 {"days": LOG_DB_RETENTION_DAYS})
+            self.written += len(rows)
+            self.failing = False
+        except Exception as e:
+            _count_db_lost("failed", len(rows))
+            # 障害中に毎回出さないよう、失敗し始めたときだけファイル・標準出力へ残す
+            if not self.failing:
+                _logger.warning(f"⚠️ ログのDB書き込みに失敗しました ({len(rows)}件、復旧までの分は破棄します): {e}")
+            self.failing = True
+
+def _log_engine():
+    """ログ書き込み専用の接続 (巡回側のプールを使わず、接続・実行ともに短いタイムアウトで打ち切る)"""
+    return create_engine(DATABASE_URL, pool_size=1, max_overflow=0, pool_pre_ping=True, connect_args={
+        "connect_timeout": LOG_DB_TIMEOUT_SEC, "options": f"-c statement_timeout={LOG_DB_TIMEOUT_SEC * 1000}",
+    })
+
+def setup():
+    """ファイル書き込み用のリスナーと、DB書き込み用のスレッドを起動する (何度呼んでも1回だけ)"""
+    global _listener, _db_writer
+    with _setup_lock:
+        if _listener is not None:
+            return
+        formatter = _JSTFormatter("[%(asctime)s] %(message)s")
+        if os.path.dirname(LOG_FILE):
+            os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+        stream_handler = logging.StreamHandler(sys.stdout)
+        handlers = [file_handler, stream_handler]
+        for h in handlers:
+            h.setFormatter(formatter)
+        # 呼び出し側はキューに積むだけで戻り、ディスクI/Oはリスナースレッドが行う
+        log_queue = queue.Queue(LOG_QUEUE_SIZE)
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+        _logger.addHandler(_DropWhenFullHandler(log_queue))
+        _listener = _Listener(log_queue, *handlers)
+        _listener.start()
+        atexit.register(_listener.stop)
+        if LOG_TO_DB and not ENV_ERROR:
+            _db_writer = _DBWriter(_log_engine()).start()
+            atexit.register(_db_writer.stop)
+
+@contextlib.contextmanager
+def log_context(**fields):
+    """with内で出力するログに user / phase などの付帯情報を付ける (スレッド単位)"""
+    previous = dict(getattr(_context, "fields", {}))
+    _context.fields = {**previous, **fields}
+    try:
+        yield
+    finally:
+        _context.fields = previous
+
+def set_phase(phase):
+    """現在のスレッドの処理フェーズを切り替える (外側の log_context を抜けると元に戻る)"""
+    _context.fields = {**getattr(_context, "fields", {}), "phase": phase}
+
+def current_fields():
+    """現在のスレッドの付帯情報 (user / phase) を返す (メトリクスのラベル付けに使う)"""
+    return dict(getattr(_context, "fields", {}))
+
+def write_log(message, **fields):
+    """ログを1件記録する。fields には user / phase / duration(秒) などを渡せる"""
+    if _listener is None:
+        setup()
+    record = {
+        "at": datetime.datetime.now(JST),
+        "message": message,
+        "thread": threading.current_thread().name,
+        **getattr(_context, "fields", {}),
+        **fields,
+    }
+    _records.append(record)
+    _logger.info(message)
+    if _db_writer is not None:
+        _db_writer.put(record)
+
+def recent(n=50, user=None, phase=None):
+    """このプロセスの直近のログを新しい順に最大n件返す。user / phase で絞り込める"""
+    results = []
+    for record in reversed(list(_records)):
+        if user is not None and record.get("user") != user: continue
+        if phase is not None and record.get("phase") != phase: continue
+        results.append(record)
+        if len(results) >= n: break
+    return results
+
+def users():
+    """バッファ内に記録があるユーザーの一覧"""
+    return sorted({r["user"] for r in list(_records) if r.get("user")})
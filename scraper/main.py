@@ -2,92 +2,87 @@ import streamlit as st
 import datetime
 import time
 import os
-import threading
-import random
 from sqlalchemy import text
-from config import TARGET_ID, DATABASE_URL, ENV_ERROR, JST, LOG_FILE, FULL_SCREENSHOT_PATH
+from config import TARGET_ID, DATABASE_URL, ENV_ERROR, JST, FULL_SCREENSHOT_PATH, UI_CACHE_TTL_SEC
 from database import init_db, engine
-from scraper import scrape_sf6, update_public_url
+from scraper import update_public_url
+import log_pipeline
+import metrics
+import jobs
 
 # --- 初期化 ---
-init_db()
+# Streamlitはウィジェット操作のたびにスクリプトを再実行するため、接続確認はプロセスにつき1回だけ行う
+@st.cache_resource
+def startup():
+    init_db()
+    metrics.start_server(log_pipeline.write_log)
+    return True
 
-def get_now_jst(): return datetime.datetime.now(JST)
+startup()
 
-def write_log(message):
-    now = get_now_jst().strftime("%Y-%m-%d %H:%M:%S")
-    formatted_msg = f"[{now}] {message}"
-    print(formatted_msg)
-    try:
-        with open(LOG_FILE, "a") as f: f.write(formatted_msg + "\n")
-    except: pass
-    if "log_messages" not in st.session_state: st.session_state.log_messages = ""
-    st.session_state.log_messages += formatted_msg + "\n"
+def get_now_jst(): return datetime.datetime.now(JST)
 
-def run_all_users(max_pages=2):
-    """【順次実行】登録されている有効なユーザー全員を順番に実行"""
+# --- 画面表示用の読み込み (TTLキャッシュ。書き込み後は該当キャッシュをclearする) ---
+@st.cache_data(ttl=UI_CACHE_TTL_SEC)
+def load_run_times():
     try:
         with engine.connect() as conn:
-            users = conn.execute(text("SELECT user_code, player_name FROM target_users WHERE is_active = TRUE")).fetchall()
-        
-        if not users:
-            write_log("⚠️ アクティブなユーザーが登録されていません。")
-            return
+            row = conn.execute(text("SELECT value FROM scraper_config WHERE key = 'run_times'")).fetchone()
+            return row[0] if row else "09:00,21:00"
+    except: return "09:00,21:00"
 
-        write_log(f"👥 計 {len(users)} 名の巡回を順次開始します。")
-        for i, u in enumerate(users):
-            scrape_sf6(u.user_code, u.player_name, write_log, max_pages=max_pages)
-            
-            if i < len(users) - 1:
-                wait_sec = random.randint(15, 30)
-                write_log(f"☕ 負荷軽減のため {wait_sec}秒 待機して次のユーザーへ移ります...")
-                time.sleep(wait_sec)
-        write_log("✨ 全員の巡回が終了しました。")
-    except Exception as e:
-        write_log(f"💥 全員実行中にエラーが発生しました: {e}")
-
-def background_worker():
-    last_run = ""
-    while True:
-        if ENV_ERROR: break
-        now_dt = get_now_jst()
-        today_str = now_dt.strftime("%Y-%m-%d")
-        current_time_total_minutes = now_dt.hour * 60 + now_dt.minute
-        
-        try:
-            with engine.connect() as conn:
-                res = conn.execute(text("SELECT value FROM scraper_config WHERE key = 'run_times'"))
-                row = res.fetchone()
-                raw_times = row[0].split(",") if row else ["09:00", "21:00"]
-                run_times = []
-                for t in raw_times:
-                    t = t.strip()
-                    if len(t) == 4 and ":" in t: t = "0" + t
-                    run_times.append(t)
-        except: run_times = ["09:00", "21:00"]
-
-        for t_str in run_times:
-            try:
-                h, m = map(int, t_str.split(":"))
-                target_total_minutes = h * 60 + m
-                if target_total_minutes <= current_time_total_minutes < target_total_minutes + 60:
-                    if last_run != today_str + t_str:
-                        write_log(f"⏰ 定期巡回開始 (設定: {t_str})")
-                        run_all_users(max_pages=2) 
-                        last_run = today_str + t_str
-                        break
-            except: continue
-        time.sleep(60)
+@st.cache_data(ttl=UI_CACHE_TTL_SEC)
+def load_target_users():
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT user_code, player_name, note, is_active FROM target_users")).fetchall()
+    return [r._asdict() for r in rows]
+
+@st.cache_data(ttl=UI_CACHE_TTL_SEC)
+def load_recent_jobs():
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT id, player_name, mode, status, attempts, max_pages, pages_done, pages_total, created_at, finished_at, last_error
+            FROM scrape_jobs ORDER BY created_at DESC LIMIT 20
+        """)).fetchall()
+    return [r._asdict() for r in rows]
+
+@st.cache_data(ttl=UI_CACHE_TTL_SEC)
+def load_pending_requests():
+    with engine.connect() as conn:
+        # 却下(rejected)でも完了(completed)でもない未処理分を表示
+        rows = conn.execute(text(
+            "SELECT id, content, created_at FROM feature_requests WHERE status = 'pending' ORDER BY created_at DESC"
+        )).fetchall()
+    return [r._asdict() for r in rows]
+
+@st.cache_data(ttl=UI_CACHE_TTL_SEC)
+def load_logs(user=None, n=50):
+    """全プロセス (管理画面・ワーカー) のログを新しい順に最大n件読み込む。user で絞り込める"""
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT logged_at, host, user_name, phase, duration, message FROM scrape_logs
+            WHERE CAST(:user AS TEXT) IS NULL OR user_name = :user
+            ORDER BY logged_at DESC LIMIT :n
+        """), {"user": user, "n": n}).fetchall()
+    return [r._asdict() for r in rows]
+
+@st.cache_data(ttl=UI_CACHE_TTL_SEC)
+def load_log_users():
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT DISTINCT user_name FROM scrape_logs
+            WHERE user_name IS NOT NULL AND logged_at >= CURRENT_TIMESTAMP - INTERVAL '1 day'
+            ORDER BY user_name
+        """)).fetchall()
+    return [r[0] for r in rows]
+
+def write_log(message, **fields):
+    """ログをローテーション付きファイルとDB (scrape_logs) へ記録する (どのスレッドからでも呼べる)"""
+    log_pipeline.write_log(message, **fields)
 
 # --- UI ---
 st.set_page_config(page_title="SF6 Stats Manager", layout="wide")
 
-# 背景スレッドの開始
-if "worker_thread_started" not in st.session_state:
-    if not any(t.name == "BackgroundWorker" for t in threading.enumerate()):
-        threading.Thread(target=background_worker, name="BackgroundWorker", daemon=True).start()
-    st.session_state.worker_thread_started = True
-
 with st.sidebar:
     st.title("⚙️ 設定")
     
@@ -116,16 +111,12 @@ with st.sidebar:
                             DO UPDATE SET player_name=EXCLUDED.player_name, note=EXCLUDED.note
                         """), {"uid": new_uid, "name": new_pname, "note": new_note})
                         conn.commit()
+                    load_target_users.clear()
                     st.success("✅ 保存しました")
                     time.sleep(1)
                     st.rerun()
 
-    try:
-        with engine.connect() as conn:
-            res = conn.execute(text("SELECT value FROM scraper_config WHERE key = 'run_times'"))
-            row = res.fetchone()
-            db_times = row[0] if row else "09:00,21:00"
-    except: db_times = "09:00,21:00"
+    db_times = load_run_times()
     
     st.subheader("⏰ 自動巡回スケジュール")
     new_times = st.text_input("実行時間 (カンマ区切り)", value=db_times)
@@ -133,6 +124,7 @@ with st.sidebar:
         with engine.connect() as conn:
             conn.execute(text("UPDATE scraper_config SET value = :val WHERE key = 'run_times'"), {"val": new_times})
             conn.commit()
+        load_run_times.clear()
         st.success("✅ 保存完了"); time.sleep(1); st.rerun()
 
 st.title("🥊 SF6 戦績＆統計収集システム")
@@ -140,40 +132,102 @@ col1, col2 = st.columns([1, 2])
 
 with col1:
     st.subheader("実行")
-    with engine.connect() as conn:
-        users_list = conn.execute(text("SELECT user_code, player_name FROM target_users")).fetchall()
+    users_list = load_target_users()
     
     if users_list:
-        selected_u = st.selectbox("単発実行対象", options=users_list, format_func=lambda x: f"{x.player_name} ({x.user_code})")
+        selected_u = st.selectbox("単発実行対象", options=users_list, format_func=lambda x: f"{x['player_name']} ({x['user_code']})")
         max_p = st.slider("巡回ページ数", 1, 50, 5)
+        incremental = st.checkbox("保存済みの戦績に到達したら停止 (差分取得)", value=True, help="過去分をさかのぼって取り込む場合はオフにしてください")
         
+        # 巡回はワーカー (worker.py) が行うため、ここではジョブの登録のみ
         c_btn1, c_btn2 = st.columns(2)
         with c_btn1:
             if st.button("🚀 選択ユーザーのみ実行", use_container_width=True):
-                scrape_sf6(selected_u.user_code, selected_u.player_name, write_log, max_pages=max_p)
+                jobs.enqueue_user(selected_u['user_code'], selected_u['player_name'], max_pages=max_p, incremental=incremental)
+                write_log(f"📥 ジョブを登録しました ({selected_u['player_name']})")
+                load_recent_jobs.clear()
                 st.rerun()
         with c_btn2:
-            if st.button("🔄 全員分を順次実行", use_container_width=True):
-                run_all_users(max_pages=max_p)
+            if st.button("🔄 全員分を実行", use_container_width=True):
+                added = jobs.enqueue_active_users(max_pages=max_p, incremental=incremental)
+                write_log(f"📥 全員分のジョブを登録しました ({added}件)")
+                load_recent_jobs.clear()
                 st.rerun()
+        # 差分取得をせず、指定ページ数までを複数タブで並列に取得する (新規ユーザーの初回取り込み向け)
+        if st.button("📚 選択ユーザーの過去戦績を一括取得", use_container_width=True, help="戦績ページを並列に開いて取得し、まとめて保存します"):
+            jobs.enqueue_user(selected_u['user_code'], selected_u['player_name'], max_pages=max_p, incremental=False, mode="backfill")
+            write_log(f"📥 一括取得ジョブを登録しました ({selected_u['player_name']}, {max_p}ページ)")
+            load_recent_jobs.clear()
+            st.rerun()
     else:
         st.info("サイドバーからユーザーを登録してください。")
 
+    st.divider()
+    st.subheader("ジョブの状況")
+    if st.button("🔄 状況を更新", key="refresh_jobs"):
+        load_recent_jobs.clear()
+    try:
+        recent_jobs = load_recent_jobs()
+        for j in recent_jobs:
+            if j["mode"] == "backfill" and j["status"] == "running" and j["pages_total"]:
+                st.progress(min(1.0, (j["pages_done"] or 0) / j["pages_total"]),
+                            text=f"📚 {j['player_name']}: {j['pages_done'] or 0} / {j['pages_total']} ページ")
+        if recent_jobs:
+            st.dataframe([
+                {"ID": j["id"], "名前": j["player_name"], "種別": "一括取得" if j["mode"] == "backfill" else "巡回", "状態": j["status"], "試行": j["attempts"], "ページ数": j["max_pages"],
+                 "登録": j["created_at"].astimezone(JST).strftime("%m/%d %H:%M"), "エラー": j["last_error"] or ""}
+                for j in recent_jobs
+            ], use_container_width=True)
+        else:
+            st.write("登録されたジョブはありません。")
+    except Exception as e:
+        st.error(f"ジョブ取得エラー (V14未実行?): {e}")
+
     st.divider()
     st.subheader("最新のログ")
-    if os.path.exists(LOG_FILE):
-        with open(LOG_FILE, "r") as f:
-            lines = f.readlines()
-            st.text_area("実行履歴 (最新50件)", value="".join(lines[-50:]), height=400)
+    # 巡回はワーカーの別プロセスで動くため、全プロセスが書き込む scrape_logs から読む
+    if st.button("🔄 ログを更新", key="refresh_logs"):
+        load_logs.clear()
+        load_log_users.clear()
+    try:
+        st.text_area("実行履歴 (最新50件)", height=400, value="\n".join(
+            f"[{r['logged_at'].astimezone(JST).strftime('%Y-%m-%d %H:%M:%S')}] {r['message']}" for r in reversed(load_logs(n=50))
+        ))
+
+        with st.expander("🔎 ユーザー別ログ (直近1日に記録があるユーザー)"):
+            log_users = load_log_users()
+            if log_users:
+                log_user = st.selectbox("対象ユーザー", options=log_users)
+                st.dataframe([
+                    {"時刻": r["logged_at"].astimezone(JST).strftime("%m/%d %H:%M:%S"), "フェーズ": r["phase"] or "", "所要秒": r["duration"],
+                     "内容": r["message"], "ホスト": r["host"]}
+                    for r in load_logs(user=log_user, n=100)
+                ], use_container_width=True)
+            else:
+                st.write("まだ記録がありません。")
+    except Exception as e:
+        st.error(f"ログ取得エラー (V22未実行?): {e}")
+
+    # DBに繋がらないときも確認できるよう、この画面のプロセス (登録操作・公開URL更新など) の分はメモリから読む
+    with st.expander("🖥️ この画面のプロセスの直近ログ"):
+        local_users = log_pipeline.users()
+        local_user = st.selectbox("対象ユーザー", options=["(全員)"] + local_users, key="local_log_user")
+        local_records = log_pipeline.recent(100, user=None if local_user == "(全員)" else local_user)
+        if local_records:
+            st.dataframe([
+                {"時刻": r["at"].strftime("%m/%d %H:%M:%S"), "フェーズ": r.get("phase", ""), "所要秒": r.get("duration"), "内容": r["message"]}
+                for r in local_records
+            ], use_container_width=True)
+        else:
+            st.write("まだ記録がありません。")
 
 with col2:
     st.subheader("登録ユーザー一覧")
-    with engine.connect() as conn:
-        df_users = conn.execute(text("SELECT player_name as 名前, user_code as ID, note as メモ, is_active as 有効 FROM target_users")).fetchall()
-        if df_users:
-            st.table(df_users)
-        else:
-            st.write("登録されているユーザーはいません。")
+    df_users = [{"名前": u["player_name"], "ID": u["user_code"], "メモ": u["note"], "有効": u["is_active"]} for u in users_list]
+    if df_users:
+        st.table(df_users)
+    else:
+        st.write("登録されているユーザーはいません。")
             
     if os.path.exists(FULL_SCREENSHOT_PATH):
         st.divider()
@@ -184,26 +238,24 @@ with col2:
     st.divider()
     st.subheader("💡 ユーザー要望管理")
     try:
-        with engine.connect() as conn:
-            # 却下(rejected)でも完了(completed)でもない未処理分を表示
-            req_rows = conn.execute(text(
-                "SELECT id, content, created_at FROM feature_requests WHERE status = 'pending' ORDER BY created_at DESC"
-            )).fetchall()
+        req_rows = load_pending_requests()
 
         if req_rows:
             for req in req_rows:
-                with st.expander(f"📩 {req.created_at.strftime('%m/%d %H:%M')} : {req.content[:30]}..."):
-                    st.write(f"**内容:** {req.content}")
-                    with st.form(key=f"req_form_{req.id}"):
-                        admin_msg = st.text_input("管理者コメント（理由）", key=f"input_{req.id}")
+                with st.expander(f"📩 {req['created_at'].strftime('%m/%d %H:%M')} : {req['content'][:30]}..."):
+                    st.write(f"**内容:** {req['content']}")
+                    with st.form(key=f"req_form_{req['id']}"):
+                        admin_msg = st.text_input("管理者コメント（理由）", key=f"input_{req['id']}")
                         b_col1, b_col2 = st.columns(2)
                         if b_col1.form_submit_button("✅ 完了"):
                             with engine.begin() as conn:
-                                conn.execute(text("UPDATE feature_requests SET status='completed', admin_comment=:c WHERE id=:id"), {"c":admin_msg, "id":req.id})
+                                conn.execute(text("UPDATE feature_requests SET status='completed', admin_comment=:c WHERE id=:id"), {"c":admin_msg, "id":req["id"]})
+                            load_pending_requests.clear()
                             st.rerun()
                         if b_col2.form_submit_button("❌ 却下"):
                             with engine.begin() as conn:
-                                conn.execute(text("UPDATE feature_requests SET status='rejected', admin_comment=:c WHERE id=:id"), {"c":admin_msg, "id":req.id})
+                                conn.execute(text("UPDATE feature_requests SET status='rejected', admin_comment=:c WHERE id=:id"), {"c":admin_msg, "id":req["id"]})
+                            load_pending_requests.clear()
                             st.rerun()
         else:
             st.info("未処理の要望はありません。")
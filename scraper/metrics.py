@@ -0,0 +1,88 @@
+# 巡回処理のメトリクス (Prometheus形式)。METRICS_PORT の /metrics で公開する。
+# user / phase ラベルは log_pipeline の付帯情報 (log_context / set_phase) から自動で付ける。
+import contextlib
+import threading
+import time
+from prometheus_client import Counter, Histogram, start_http_server
+from sqlalchemy import event
+from config import METRICS_PORT
+import log_pipeline
+
+# ページ遷移・描画待ちは数百ms〜数十秒、DB文は数ms〜数秒に分布する
+PAGE_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+DB_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+NAVIGATION_SECONDS = Histogram("sf6_navigation_seconds", "page.goto の所要時間", ["user", "phase"], buckets=PAGE_BUCKETS)
+READY_WAIT_SECONDS = Histogram("sf6_ready_wait_seconds", "描画待ち (PageTimings.wait) の所要時間", ["user", "phase", "step", "result"], buckets=PAGE_BUCKETS)
+EXTRACT_SECONDS = Histogram("sf6_extract_seconds", "page.evaluate / 埋め込みJSON解析による抽出時間", ["user", "phase", "kind"], buckets=tuple(sorted(set(DB_BUCKETS + PAGE_BUCKETS))))
+PAGES_TOTAL = Counter("sf6_pages_total", "取得したページ数", ["user", "phase", "backend"])
+ROWS_INSERTED_TOTAL = Counter("sf6_rows_inserted_total", "新規に保存した戦績の行数", ["user", "phase"])
+ROWS_SKIPPED_TOTAL = Counter("sf6_rows_skipped_total", "保存済みのため読み飛ばした戦績の行数", ["user", "phase"])
+DB_STATEMENT_SECONDS = Histogram("sf6_db_statement_seconds", "DB文の実行時間", ["statement", "phase"], buckets=DB_BUCKETS)
+BROWSER_LAUNCHES_TOTAL = Counter("sf6_browser_launches_total", "Chromiumの起動回数", ["result"])
+BROWSER_RECYCLES_TOTAL = Counter("sf6_browser_recycles_total", "Chromiumの再起動回数", ["reason"])
+REQUESTS_BLOCKED_TOTAL = Counter("sf6_requests_blocked_total", "resource_filter が遮断したリクエスト数", ["type", "reason"])
+RESPONSE_BYTES_TOTAL = Counter("sf6_response_bytes_total", "読み込んだレスポンスの合計バイト数 (Content-Length)", ["type"])
+LOG_RECORDS_DROPPED_TOTAL = Counter("sf6_log_records_dropped_total", "書き込み待ちが LOG_QUEUE_SIZE を超えたため捨てたログの件数")
+LOG_DB_RECORDS_LOST_TOTAL = Counter("sf6_log_db_records_lost_total", "scrape_logs へ書き込めなかったログの件数 (dropped: 書き込み待ちが一杯 / failed: INSERT失敗)", ["reason"])
+SCRAPE_RUNS_TOTAL = Counter("sf6_scrape_runs_total", "1ユーザー分の巡回の実行回数", ["user", "mode", "result"])
+SCRAPE_RUN_SECONDS = Histogram("sf6_scrape_run_seconds", "1ユーザー分の巡回の所要時間", ["user", "mode"],
+                               buckets=(5, 10, 20, 30, 60, 120, 300, 600, 1200, 1800))
+
+_server_lock = threading.Lock()
+_server_started = False
+
+def labels(**extra):
+    """現在のスレッドの user / phase に extra を加えたラベルを返す"""
+    fields = log_pipeline.current_fields()
+    return {"user": fields.get("user") or "-", "phase": fields.get("phase") or "-", **extra}
+
+@contextlib.contextmanager
+def timed(histogram, **extra):
+    """with内の処理時間を user / phase ラベル付きで記録する"""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels(**extra)).observe(time.monotonic() - started)
+
+def _phase():
+    """DB文を実行しているスレッドの処理フェーズ (ユーザーは付けない: 文の種類と掛け合わせると系列が増えすぎるため)"""
+    return log_pipeline.current_fields().get("phase") or "-"
+
+@contextlib.contextmanager
+def db_timer(statement):
+    """SQLAlchemyを通らない (raw_connection の) DB文の実行時間を記録する"""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        DB_STATEMENT_SECONDS.labels(statement=statement, phase=_phase()).observe(time.monotonic() - started)
+
+def instrument_engine(engine):
+    """SQLAlchemy経由の全てのDB文の実行時間を、先頭のキーワード (SELECT / INSERT など) と処理フェーズ別に記録する"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.monotonic()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is None:
+            return
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "-"
+        DB_STATEMENT_SECONDS.labels(statement=verb, phase=_phase()).observe(time.monotonic() - started)
+
+def start_server(write_log_func=print):
+    """/metrics を公開する (何度呼んでも1回だけ。METRICS_PORT=0 なら何もしない)"""
+    global _server_started
+    with _server_lock:
+        if _server_started or METRICS_PORT <= 0:
+            return
+        try:
+            start_http_server(METRICS_PORT)
+            _server_started = True
+            write_log_func(f"📈 メトリクスを公開しました (:{METRICS_PORT}/metrics)")
+        except OSError as e:
+            write_log_func(f"⚠️ メトリクスのポートを開けませんでした (:{METRICS_PORT}): {e}")
@@ -0,0 +1,88 @@
+# 保存済みのページ原本 (archive) から、ブラウザ版と同じ形の戦績・統計を取り出すパーサー。
+# DOMの読み取りは scraper.py の page.evaluate 内のJSと同じセレクターで行い、
+# DOMから読めない場合は埋め込みJSON (__NEXT_DATA__) にフォールバックする。
+import re
+from bs4 import BeautifulSoup
+import http_fetch
+
+# 実績タブの表示ラベル → player_stats へ渡すキー (scrape_performance_data のJSと同じ対応)
+STYLE_LABELS = {
+    "ドライブパリィ": "d_parry_pct", "ドライブインパクト": "d_impact_pct", "オーバードライブアーツ": "d_od_pct",
+    "パリィドライブラッシュ": "d_rush_p_pct", "キャンセルドライブラッシュ": "d_rush_c_pct", "ドライブリバーサル": "d_reversal_pct",
+    "Lv1": "sa1_pct", "Lv2": "sa2_pct", "Lv3": "sa3_pct", "CA": "ca_pct",
+}
+DETAIL_LABELS = {
+    "ドライブパリィ": {"ジャストパリィ回数": "just_parry"},
+    "ドライブインパクト": {
+        "決めた回数": "imp_win", "パニッシュカウンターを決めた回数": "imp_pc_win",
+        "相手のドライブインパクトに決めた回数": "imp_returned_win", "受けた回数": "imp_lose",
+        "パニッシュカウンターを受けた回数": "imp_pc_lose", "相手にドライブインパクトで返された回数": "imp_returned_lose",
+    },
+    "スタン": {"スタンさせた回数": "stun_win", "スタンさせられた回数": "stun_lose"},
+    "投げ": {"決めた回数": "throw_win", "受けた回数": "throw_lose", "投げ抜け回数": "throw_escape"},
+    "壁際": {"相手を追い詰めている時間": "wall_push", "相手に追い詰められている時間": "wall_pushed"},
+}
+
+def _cls(fragment):
+    """JSの [class*="..."] と同じ部分一致のクラス指定"""
+    return {"class": lambda c: c is not None and fragment in c}
+
+def _text(el):
+    return el.get_text(strip=True) if el is not None else ""
+
+def _num(txt):
+    try:
+        return float(re.sub(r"[^0-9.]", "", txt) or 0)
+    except ValueError:
+        return 0.0
+
+def _side(item, side):
+    parent = item.find(attrs=_cls(f"battle_data_player{side}"))
+    name = _text(item.find(attrs=_cls(f"battle_data_name_p{side}"))) or "Unknown"
+    mr, char, ctrl = 0, "Unknown", "Modern"
+    if parent is not None:
+        mr = http_fetch.normalize_rating(_text(parent.find(attrs=_cls("battle_data_lp"))))
+        char_el = parent.find(attrs=_cls("battle_data_character"))
+        img = char_el.find("img") if char_el is not None else None
+        char = (img.get("alt") if img is not None else None) or "Unknown"
+        ctrl_el = parent.find(attrs=_cls("battle_data_control"))
+        img = ctrl_el.find("img") if ctrl_el is not None else None
+        ctrl = "Classic" if img is not None and "type0" in (img.get("src") or "") else "Modern"
+    res = _text(item.find(attrs=_cls(f"battle_data_player_{side}")))
+    return {"name": name, "mr": mr, "char": char, "ctrl": ctrl, "res": res}
+
+def parse_battlelog_html(html):
+    """戦績ページのHTMLから戦績リストを取り出す"""
+    soup = BeautifulSoup(html, "html.parser")
+    results = []
+    for item in soup.select("li[data-index]"):
+        date = _text(item.find(attrs=_cls("battle_data_date")))
+        if not date:
+            continue
+        p1, p2 = _side(item, 1), _side(item, 2)
+        results.append({"id": "rank_" + re.sub(r"[^0-9]", "", date) + "_" + p1["name"] + "_" + p2["name"], "date": date, "p1": p1, "p2": p2})
+    if results:
+        return results
+    return http_fetch.parse_battlelog(http_fetch.extract_page_props(html))
+
+def parse_play_html(html):
+    """プロフィール(プレイ)ページのHTMLから実績タブの統計を取り出す"""
+    soup = BeautifulSoup(html, "html.parser")
+    stats = {}
+    for li in soup.find_all("li", attrs=_cls("battle_style_")):
+        key = STYLE_LABELS.get(_text(li.find(attrs=_cls("battle_style_type"))))
+        if key:
+            stats[key] = _num(_text(li.find(attrs=_cls("battle_style_number"))))
+    for dl in soup.find_all("dl"):
+        labels = DETAIL_LABELS.get(_text(dl.find("dt")))
+        if not labels:
+            continue
+        spans = dl.find_all("span")
+        for label, key in labels.items():
+            target = next((s for s in spans if _text(s) == label), None)
+            sibling = target.find_next_sibling() if target is not None else None
+            stats[key] = _num(_text(sibling)) if target is not None else 0.0
+    if len(stats) == len(http_fetch.PLAY_STATS_KEYS):
+        return stats
+    # 実績タブ未描画の原本 (HTTP取得分など) は埋め込みJSONから読む
+    return http_fetch.parse_play_stats(http_fetch.extract_page_props(html))
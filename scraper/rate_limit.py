@@ -0,0 +1,81 @@
+import threading
+import time
+from sqlalchemy import text
+from config import BUCKLER_RATE_PER_SEC, BUCKLER_BURST
+from database import engine
+
+class TokenBucket:
+    """スレッドセーフなトークンバケット。プロセス内の全スレッドで共有してリクエスト頻度を制限する"""
+
+    def __init__(self, rate_per_sec, burst):
+        self.rate = rate_per_sec
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """トークンが1つ溜まるまで待機してから消費する。待機した秒数を返す"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait_sec = (1 - self.tokens) / self.rate
+            time.sleep(wait_sec)
+            waited += wait_sec
+
+# 次に空く時刻 (tat) を1件分 (1/rate 秒) 先へ進め、バースト分を超えて予約した分だけ待機秒数として返す。
+# 全プロセスが同じ行を1文で更新するため、ワーカーを何台起動しても合計が rate 回/秒 に収まる。
+RESERVE_SQL = """
+    INSERT INTO rate_limits (name, tat) VALUES (:name, clock_timestamp() + make_interval(secs => :interval))
+    ON CONFLICT (name) DO UPDATE SET
+        tat = GREATEST(rate_limits.tat, clock_timestamp()) + make_interval(secs => :interval)
+    RETURNING GREATEST(0, EXTRACT(EPOCH FROM (tat - clock_timestamp())) - :tolerance)
+"""
+
+class SharedRateLimiter:
+    """DB (V21 rate_limits) 上で全ワーカープロセスが共有するレートリミッター
+
+    rate 回/秒、最大 burst 回まで連続で許可する (トークンバケットと同じ挙動のGCRA)。
+    DBに接続できないときは、このプロセス内のトークンバケットで代わりに制限する。
+    """
+
+    def __init__(self, name, rate_per_sec, burst, local_fallback=None):
+        self.name = name
+        self.rate = rate_per_sec
+        self.burst = max(1, burst)
+        self.local = local_fallback or TokenBucket(rate_per_sec, burst)
+
+    def reserve(self):
+        """1リクエスト分の枠を予約し、送信まで待つべき秒数を返す"""
+        interval = 1 / self.rate
+        with engine.begin() as conn:
+            wait = conn.execute(text(RESERVE_SQL), {"name": self.name, "interval": interval, "tolerance": self.burst * interval}).scalar()
+        return float(wait or 0)
+
+    def acquire(self):
+        """枠が空くまで待機する。待機した秒数を返す"""
+        if self.rate <= 0:
+            return 0.0
+        if engine is None:
+            return self.local.acquire()
+        try:
+            wait = self.reserve()
+        except Exception:
+            return self.local.acquire()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+# Buckler 全体 (全ワーカープロセス) で共有するリミッター
+buckler_limiter = SharedRateLimiter("buckler", BUCKLER_RATE_PER_SEC, BUCKLER_BURST)
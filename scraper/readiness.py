@@ -0,0 +1,79 @@
+import time
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+from config import READY_TIMEOUT_MS
+import metrics
+
+PERF_TAB_SELECTOR = 'li:has-text("実績"), button:has-text("実績")'
+BATTLE_STYLE_SELECTOR = 'li[class*="battle_style_"]'
+BATTLELOG_ROW_SELECTOR = 'li[data-index]'
+
+# 戦績一覧の「1行目の日時 + 行数」をページの識別子として使う
+BATTLELOG_SIGNATURE_JS = """() => {
+    const rows = document.querySelectorAll('li[data-index]');
+    const first = rows[0]?.querySelector('[class*="battle_data_date"]')?.innerText.trim() || "";
+    return first + "|" + rows.length;
+}"""
+
+class PageTimings:
+    """固定sleepの代わりに条件待機を行い、実際にかかった待機時間を記録する"""
+
+    def __init__(self, timeout_ms=READY_TIMEOUT_MS):
+        self.timeout_ms = timeout_ms
+        self.records = []  # (label, 秒, 成否)
+
+    def wait(self, label, func):
+        started = time.monotonic()
+        try:
+            func()
+            ok = True
+        except PlaywrightTimeoutError:
+            ok = False
+        elapsed = time.monotonic() - started
+        self.records.append((label, elapsed, ok))
+        metrics.READY_WAIT_SECONDS.labels(**metrics.labels(step=label, result="ok" if ok else "timeout")).observe(elapsed)
+        return ok
+
+    def goto(self, page, url):
+        """DOM構築完了までで遷移を打ち切る (networkidleは待たない)。遷移失敗は呼び出し元へ送出する"""
+        started = time.monotonic()
+        ok = False
+        try:
+            page.goto(url, wait_until="domcontentloaded", timeout=60000)
+            ok = True
+        finally:
+            elapsed = time.monotonic() - started
+            self.records.append(("goto", elapsed, ok))
+            metrics.NAVIGATION_SECONDS.labels(**metrics.labels()).observe(elapsed)
+
+    def perf_tab(self, page):
+        return self.wait("perf_tab", lambda: page.locator(PERF_TAB_SELECTOR).first.wait_for(state="visible", timeout=self.timeout_ms))
+
+    def battle_style(self, page):
+        return self.wait("battle_style", lambda: page.wait_for_selector(BATTLE_STYLE_SELECTOR, state="attached", timeout=self.timeout_ms))
+
+    def battlelog_rows(self, page):
+        return self.wait("battlelog_rows", lambda: page.wait_for_selector(BATTLELOG_ROW_SELECTOR, state="attached", timeout=self.timeout_ms))
+
+    def battlelog_signature(self, page):
+        return page.evaluate(BATTLELOG_SIGNATURE_JS)
+
+    def battlelog_changed(self, page, prev_signature):
+        """ページ送り後、戦績一覧の中身が前ページから入れ替わるまで待つ"""
+        return self.wait("next_page", lambda: page.wait_for_function(
+            f"(prev) => ({BATTLELOG_SIGNATURE_JS})() !== prev && document.querySelector('{BATTLELOG_ROW_SELECTOR}') !== null",
+            arg=prev_signature, timeout=self.timeout_ms
+        ))
+
+    def summary(self):
+        """ラベルごとの 回数 / 平均 / 最大 をログ用の1行にまとめる"""
+        grouped = {}
+        for label, sec, ok in self.records:
+            grouped.setdefault(label, []).append((sec, ok))
+        parts = []
+        for label, items in grouped.items():
+            secs = [s for s, _ in items]
+            timeouts = sum(1 for _, ok in items if not ok)
+            part = f"{label} {len(secs)}回 平均{sum(secs) / len(secs):.2f}s 最大{max(secs):.2f}s"
+            if timeouts: part += f" (タイムアウト{timeouts})"
+            parts.append(part)
+        return " / ".join(parts)
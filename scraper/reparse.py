@@ -0,0 +1,108 @@
+# ページ原本アーカイブ (archive.py) から戦績・統計を再抽出してDBへ書き込む。
+# パーサーの修正やカラム追加の後に、サイトへアクセスせず過去分を埋め直すために使う。
+#
+# 使い方 (scraper ディレクトリで実行):
+#   python reparse.py --since 2024-06-01 --kind battlelog --workers 4
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import text
+from config import JST, REPARSE_CHUNK_PAGES
+from database import engine
+from analytics import refresh_all
+from ingest import upsert_battles
+from rollups import rebuild_rollups
+from scraper import save_player_stats
+import archive
+import page_parser
+
+def load_targets(since=None, kind=None):
+    """再解析の対象を返す。戦績は内容ごとに1件、統計はユーザー・日ごとに最後に取得した1件"""
+    where, params = ["TRUE"], {}
+    if since:
+        where.append("r.fetched_at >= :since")
+        params["since"] = since
+    if kind:
+        where.append("r.kind = :kind")
+        params["kind"] = kind
+    with engine.connect() as conn:
+        battlelog = conn.execute(text(f"""
+            SELECT DISTINCT content_hash FROM raw_pages r
+            WHERE {' AND '.join(where)} AND r.kind = 'battlelog'
+        """), params).scalars().all()
+        play = conn.execute(text(f"""
+            SELECT DISTINCT ON (r.user_code, (r.fetched_at AT TIME ZONE 'Asia/Tokyo')::DATE)
+                r.content_hash, r.user_code, COALESCE(t.player_name, r.user_code) AS player_name,
+                (r.fetched_at AT TIME ZONE 'Asia/Tokyo')::DATE AS recorded_at
+            FROM raw_pages r LEFT JOIN target_users t ON t.user_code = r.user_code
+            WHERE {' AND '.join(where)} AND r.kind = 'play'
+            ORDER BY r.user_code, (r.fetched_at AT TIME ZONE 'Asia/Tokyo')::DATE, r.fetched_at DESC
+        """), params).fetchall()
+    return battlelog, play
+
+def _parse_battlelog(content_hash):
+    try:
+        return content_hash, page_parser.parse_battlelog_html(archive.load(content_hash)), None
+    except Exception as e:
+        return content_hash, [], str(e)
+
+def _parse_play(content_hash):
+    try:
+        return content_hash, page_parser.parse_play_html(archive.load(content_hash)), None
+    except Exception as e:
+        return content_hash, None, str(e)
+
+def reparse(since=None, kind=None, workers=None, write_log_func=print, chunk_pages=REPARSE_CHUNK_PAGES):
+    """アーカイブを複数プロセスで解析し、戦績は解析結果で上書き・統計は取得日の分として上書きする
+
+    戦績は chunk_pages ページずつ解析して書き込み、その単位でコミットする (メモリ使用量とトランザクションを一定に保つ)。
+    """
+    battlelog_hashes, play_rows = load_targets(since, kind)
+    write_log_func(f"🗂️ 再解析対象: 戦績 {len(battlelog_hashes)}ページ / 統計 {len(play_rows)}件")
+    errors = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parsed = new_count = updated_count = 0
+        for start in range(0, len(battlelog_hashes), chunk_pages):
+            battles = []
+            for content_hash, rows, error in executor.map(_parse_battlelog, battlelog_hashes[start:start + chunk_pages], chunksize=16):
+                if error:
+                    errors += 1
+                    write_log_func(f"⚠️ 戦績の解析に失敗しました ({content_hash[:12]}): {error}")
+                battles.extend(rows)
+            new_keys, updated_keys = upsert_battles(battles) if battles else ([], [])
+            parsed += len(battles)
+            new_count += len(new_keys)
+            updated_count += len(updated_keys)
+            write_log_func(f"⏳ 戦績 {min(start + chunk_pages, len(battlelog_hashes))} / {len(battlelog_hashes)}ページを解析しました。")
+        # 上書きした試合は取り込み時の加算では直せないため、集計テーブルを作り直す
+        if updated_count:
+            rebuild_rollups()
+        write_log_func(f"✅ 戦績 {parsed}件を解析し、新規 {new_count}件を保存・{updated_count}件を上書きしました。")
+
+        saved = 0
+        by_hash = {}
+        for content_hash, stats, error in executor.map(_parse_play, sorted({r.content_hash for r in play_rows})):
+            if error:
+                errors += 1
+                write_log_func(f"⚠️ 統計の解析に失敗しました ({content_hash[:12]}): {error}")
+            else:
+                by_hash[content_hash] = stats
+        for r in play_rows:
+            if r.content_hash in by_hash:
+                save_player_stats(r.user_code, r.player_name, by_hash[r.content_hash], recorded_at=r.recorded_at)
+                saved += 1
+        write_log_func(f"✅ 統計 {saved}件を保存しました。")
+    # 分析テーブルも書き換わった戦績・統計に合わせる。上書きした試合は差分追加では反映されないため全件を再計算する
+    if updated_count or saved:
+        refresh_all(rebuild=bool(updated_count), write_log_func=write_log_func)
+    return errors
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ページ原本アーカイブからの再解析")
+    parser.add_argument("--since", type=datetime.date.fromisoformat, help="この日以降に取得したページのみ対象にする (YYYY-MM-DD)")
+    parser.add_argument("--kind", choices=["battlelog", "play"], help="対象のページ種別 (省略時は両方)")
+    parser.add_argument("--workers", type=int, default=None, help="解析に使うプロセス数 (省略時はCPU数)")
+    args = parser.parse_args()
+    since = datetime.datetime.combine(args.since, datetime.time(), JST) if args.since else None
+    if reparse(since=since, kind=args.kind, workers=args.workers):
+        raise SystemExit(1)
@@ -0,0 +1,73 @@
+# Playwright のリクエストを横取りし、抽出に不要なリソース (画像・フォント・計測タグなど) を読み込まない。
+# 戦績の抽出は img の alt / src 属性を読むだけなので、画像本体を読み込まなくても結果は変わらない。
+from urllib.parse import urlparse
+from config import RESOURCE_FILTER, RESOURCE_ALLOWED_HOSTS, RESOURCE_BLOCKED_KEYWORDS, BUCKLER_BASE_URL
+import metrics
+
+# 読み込みを許可するリソース種別 (Playwright の request.resource_type)。プロフィール・戦績のどちらのページも
+# Next.js の描画にスクリプトとデータ取得が要るため共通。stylesheet は表示判定 (wait_for state="visible") に影響するため残す
+ALLOWED_TYPES = {"document", "script", "xhr", "fetch", "stylesheet"}
+
+def _host_allowed(host, allowed_hosts):
+    return any(host == h or host.endswith("." + h) for h in allowed_hosts)
+
+class ResourceFilter:
+    """コンテキスト単位でリクエストを遮断し、遮断件数と読み込んだバイト数を数える
+
+    使い方: rf = ResourceFilter().attach(context)
+    """
+
+    def __init__(self, allowed_hosts=None, blocked_keywords=None, enabled=RESOURCE_FILTER):
+        base_host = urlparse(BUCKLER_BASE_URL).hostname or ""
+        self.allowed_hosts = [base_host, *(allowed_hosts if allowed_hosts is not None else RESOURCE_ALLOWED_HOSTS)]
+        self.blocked_keywords = [k.lower() for k in (blocked_keywords if blocked_keywords is not None else RESOURCE_BLOCKED_KEYWORDS)]
+        self.enabled = enabled
+        self.blocked = {}        # リソース種別 → 遮断件数
+        self.allowed = 0
+        self.loaded_bytes = 0
+
+    def attach(self, context):
+        if not self.enabled:
+            return self
+        context.route("**/*", self._handle)
+        context.on("response", self._on_response)
+        return self
+
+    def block_reason(self, url, resource_type):
+        """遮断する理由を返す (読み込む場合はNone)"""
+        if resource_type not in ALLOWED_TYPES:
+            return "type"
+        parsed = urlparse(url)
+        if parsed.scheme in ("http", "https") and not _host_allowed(parsed.hostname or "", self.allowed_hosts):
+            return "third_party"
+        lowered = url.lower()
+        if any(k in lowered for k in self.blocked_keywords):
+            return "keyword"
+        return None
+
+    def _handle(self, route):
+        request = route.request
+        reason = self.block_reason(request.url, request.resource_type)
+        if reason is None:
+            self.allowed += 1
+            route.continue_()
+            return
+        self.blocked[request.resource_type] = self.blocked.get(request.resource_type, 0) + 1
+        metrics.REQUESTS_BLOCKED_TOTAL.labels(type=request.resource_type, reason=reason).inc()
+        route.abort("blockedbyclient")
+
+    def _on_response(self, response):
+        # 本文を読まずに済むよう、Content-Length から受信量を見積もる
+        try:
+            size = int(response.headers.get("content-length") or 0)
+        except ValueError:
+            size = 0
+        self.loaded_bytes += size
+        metrics.RESPONSE_BYTES_TOTAL.labels(type=response.request.resource_type).inc(size)
+
+    def summary(self):
+        if not self.enabled:
+            return "無効"
+        blocked = sum(self.blocked.values())
+        detail = ", ".join(f"{t} {n}" for t, n in sorted(self.blocked.items(), key=lambda kv: -kv[1]))
+        return f"遮断 {blocked}件 ({detail or 'なし'}) / 読込 {self.allowed}件 {self.loaded_bytes / 1024:.0f}KB"
@@ -0,0 +1,69 @@
+import argparse
+from sqlalchemy import text
+from database import engine
+
+# 新規に取り込んだ試合分だけを既存の集計へ加算する (名前は v_battle_analytics で辞書テーブルから引く)
+APPLY_DAILY_SQL = """
+    INSERT INTO daily_player_summary (my_name, day, matches, wins, max_mr)
+    SELECT my_name, played_at::DATE, COUNT(*), SUM(is_win), MAX(my_mr)
+    FROM v_battle_analytics
+    WHERE battle_key = ANY(%(keys)s) AND my_name IS NOT NULL AND played_at IS NOT NULL
+    GROUP BY my_name, played_at::DATE
+    ON CONFLICT (my_name, day) DO UPDATE SET
+        matches = daily_player_summary.matches + EXCLUDED.matches,
+        wins = daily_player_summary.wins + EXCLUDED.wins,
+        max_mr = GREATEST(daily_player_summary.max_mr, EXCLUDED.max_mr)
+"""
+
+APPLY_MATCHUP_SQL = """
+    INSERT INTO matchup_summary (my_name, opponent_char, opponent_control, matches, wins)
+    SELECT my_name, COALESCE(opponent_char, 'Unknown'), COALESCE(opponent_control, 'Unknown'), COUNT(*), SUM(is_win)
+    FROM v_battle_analytics
+    WHERE battle_key = ANY(%(keys)s) AND my_name IS NOT NULL
+    GROUP BY my_name, COALESCE(opponent_char, 'Unknown'), COALESCE(opponent_control, 'Unknown')
+    ON CONFLICT (my_name, opponent_char, opponent_control) DO UPDATE SET
+        matches = matchup_summary.matches + EXCLUDED.matches,
+        wins = matchup_summary.wins + EXCLUDED.wins
+"""
+
+REBUILD_SQL = [
+    # TRUNCATEのロックで、再構築中に取り込まれた分の加算は再構築の完了後に適用される
+    "TRUNCATE daily_player_summary, matchup_summary",
+    """
+    INSERT INTO daily_player_summary (my_name, day, matches, wins, max_mr)
+    SELECT my_name, played_at::DATE, COUNT(*), SUM(is_win), MAX(my_mr)
+    FROM v_battle_analytics
+    WHERE my_name IS NOT NULL AND played_at IS NOT NULL
+    GROUP BY my_name, played_at::DATE
+    """,
+    """
+    INSERT INTO matchup_summary (my_name, opponent_char, opponent_control, matches, wins)
+    SELECT my_name, COALESCE(opponent_char, 'Unknown'), COALESCE(opponent_control, 'Unknown'), COUNT(*), SUM(is_win)
+    FROM v_battle_analytics
+    WHERE my_name IS NOT NULL
+    GROUP BY my_name, COALESCE(opponent_char, 'Unknown'), COALESCE(opponent_control, 'Unknown')
+    """,
+]
+
+def apply_rollups(cur, battle_keys):
+    """取り込みトランザクション内で、新規試合分を集計テーブルへ加算する (cur は DB-API カーソル)"""
+    if not battle_keys:
+        return
+    cur.execute(APPLY_DAILY_SQL, {"keys": battle_keys})
+    cur.execute(APPLY_MATCHUP_SQL, {"keys": battle_keys})
+
+def rebuild_rollups():
+    """battle_facts から集計テーブルを作り直す (バックフィルや集計ロジック変更後に実行)"""
+    with engine.begin() as conn:
+        for sql in REBUILD_SQL:
+            conn.execute(text(sql))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="事前集計テーブルの管理")
+    parser.add_argument("--rebuild", action="store_true", help="battle_facts から全件を再集計する")
+    args = parser.parse_args()
+    if args.rebuild:
+        rebuild_rollups()
+        print("✅ 集計テーブルを再構築しました。")
+    else:
+        parser.print_help()
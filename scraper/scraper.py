@@ -1,13 +1,88 @@
 import time
-import random
-import datetime
 import requests
 import re
-import time
 from sqlalchemy import text
-from playwright.sync_api import sync_playwright
-from config import COOKIE_PATH, FULL_SCREENSHOT_PATH
+from config import FULL_SCREENSHOT_PATH, BUCKLER_BASE_URL, SCRAPE_BACKEND
 from database import engine
+from browser_pool import BrowserPool
+from rate_limit import buckler_limiter
+from readiness import PageTimings, PERF_TAB_SELECTOR
+from ingest import insert_battles
+from log_pipeline import log_context, set_phase
+import http_fetch
+import archive
+import checkpoints
+import metrics
+from resource_filter import ResourceFilter
+
+# 戦績一覧の各行から両プレイヤーの情報を取り出す (page_parser.parse_battlelog_html と同じ抽出規則)
+BATTLELOG_EXTRACT_JS = """() => {
+    const results = [];
+    document.querySelectorAll('li[data-index]').forEach(item => {
+        try {
+            const getP = (side) => {
+                const pClass = 'battle_data_player' + side;
+                const parent = item.querySelector(`[class*="${pClass}"]`);
+                const name = item.querySelector(`[class*="battle_data_name_p${side}"]`)?.innerText.trim() || "Unknown";
+                // http_fetch.normalize_rating と同じ規則 (最初の数字の並びを桁区切りを除いて読む)
+                const rating = (parent?.querySelector('[class*="battle_data_lp"]')?.innerText || "").match(/\\d[\\d,]*/);
+                const mr = rating ? parseInt(rating[0].replace(/,/g, "")) : 0;
+                const char = parent?.querySelector('[class*="battle_data_character"] img')?.getAttribute('alt') || "Unknown";
+                const ctrl = parent?.querySelector('[class*="battle_data_control"] img')?.getAttribute('src')?.includes('type0') ? 'Classic' : 'Modern';
+                const res = item.querySelector(`[class*="battle_data_player_${side}"]`)?.innerText.trim() || "";
+                return { name, mr, char, ctrl, res };
+            };
+            const date = item.querySelector('[class*="battle_data_date"]')?.innerText.trim();
+            if(date) {
+                const p1 = getP(1); const p2 = getP(2);
+                results.push({ id: "rank_"+date.replace(/[^0-9]/g,"")+"_"+p1.name+"_"+p2.name, date, p1, p2 });
+            }
+        } catch(e){}
+    });
+    return results;
+}"""
+
+# 実績タブの表示ラベルごとに統計値を取り出す (page_parser.parse_play_html と同じ抽出規則)
+PLAY_EXTRACT_JS = """() => {
+    const results = {};
+    const parseNum = (txt) => parseFloat(txt.replace(/[^0-9.]/g, '')) || 0;
+    document.querySelectorAll('li[class*="battle_style_"]').forEach(li => {
+        const type = li.querySelector('[class*="battle_style_type"]')?.innerText.trim();
+        const val = parseNum(li.querySelector('[class*="battle_style_number"]')?.innerText || "0");
+        if(type === "ドライブパリィ") results.d_parry_pct = val;
+        if(type === "ドライブインパクト") results.d_impact_pct = val;
+        if(type === "オーバードライブアーツ") results.d_od_pct = val;
+        if(type === "パリィドライブラッシュ") results.d_rush_p_pct = val;
+        if(type === "キャンセルドライブラッシュ") results.d_rush_c_pct = val;
+        if(type === "ドライブリバーサル") results.d_reversal_pct = val;
+        if(type === "Lv1") results.sa1_pct = val;
+        if(type === "Lv2") results.sa2_pct = val;
+        if(type === "Lv3") results.sa3_pct = val;
+        if(type === "CA") results.ca_pct = val;
+    });
+    document.querySelectorAll('dl').forEach(dl => {
+        const title = dl.querySelector('dt')?.innerText.trim();
+        const getV = (label) => {
+            const spans = Array.from(dl.querySelectorAll('span'));
+            const target = spans.find(s => s.innerText.trim() === label);
+            return target ? parseNum(target.nextElementSibling?.innerText || "0") : 0;
+        };
+        if(title === "ドライブパリィ") results.just_parry = getV("ジャストパリィ回数");
+        if(title === "ドライブインパクト") {
+            results.imp_win = getV("決めた回数");
+            results.imp_pc_win = getV("パニッシュカウンターを決めた回数");
+            results.imp_returned_win = getV("相手のドライブインパクトに決めた回数");
+            results.imp_lose = getV("受けた回数");
+            results.imp_pc_lose = getV("パニッシュカウンターを受けた回数");
+            results.imp_returned_lose = getV("相手にドライブインパクトで返された回数");
+        }
+        if(title === "スタン") { results.stun_win = getV("スタンさせた回数"); results.stun_lose = getV("スタンさせられた回数"); }
+        if(title === "投げ") { results.throw_win = getV("決めた回数"); results.throw_lose = getV("受けた回数"); results.throw_escape = getV("投げ抜け回数"); }
+        if(title === "壁際") { results.wall_push = getV("相手を追い詰めている時間"); results.wall_pushed = getV("相手に追い詰められている時間"); }
+    });
+    return results;
+}
+        """
 
 def update_public_url(write_log_func):
     """Cloudflare TunnelのメトリクスからURLを確実に抽出してDBに保存する"""
@@ -43,164 +118,253 @@ def update_public_url(write_log_func):
     write_log_func("⚠️ タイムアウト: URLが発行されませんでした。")
     return False
 
-def scrape_performance_data(page, user_id, player_name, write_log_func):
+def save_player_stats(user_id, player_name, stats, recorded_at=None):
+    """統計データを当日分 (recorded_at 指定時はその日付) として保存 (同日の再取得は上書き)"""
+    with engine.connect() as conn:
+        conn.execute(text("""
+            INSERT INTO player_stats (
+                user_id, player_name, recorded_at, d_parry_pct, d_impact_pct, d_od_pct, d_rush_p_pct, d_rush_c_pct, d_reversal_pct,
+                sa1_pct, sa2_pct, sa3_pct, ca_pct, impact_win, impact_pc_win, impact_counter_win,
+                impact_lose, impact_pc_lose, impact_counter_lose, just_parry_count,
+                throw_win, throw_lose, throw_escape, stun_win, stun_lose, wall_push_sec, wall_pushed_sec
+            ) VALUES (
+                :uid, :pname, COALESCE(:recorded_at, CURRENT_DATE), :d_parry_pct, :d_impact_pct, :d_od_pct, :d_rush_p_pct, :d_rush_c_pct, :d_reversal_pct,
+                :sa1_pct, :sa2_pct, :sa3_pct, :ca_pct, :imp_win, :imp_pc_win, :imp_returned_win,
+                :imp_lose, :imp_pc_lose, :imp_returned_lose, :just_parry,
+                :throw_win, :throw_lose, :throw_escape, :stun_win, :stun_lose, :wall_push, :wall_pushed
+            ) ON CONFLICT (user_id, recorded_at) DO UPDATE SET
+                player_name=EXCLUDED.player_name,
+                d_parry_pct=EXCLUDED.d_parry_pct, d_impact_pct=EXCLUDED.d_impact_pct, d_od_pct=EXCLUDED.d_od_pct,
+                d_rush_p_pct=EXCLUDED.d_rush_p_pct, d_rush_c_pct=EXCLUDED.d_rush_c_pct, d_reversal_pct=EXCLUDED.d_reversal_pct,
+                sa1_pct=EXCLUDED.sa1_pct, sa2_pct=EXCLUDED.sa2_pct, sa3_pct=EXCLUDED.sa3_pct, ca_pct=EXCLUDED.ca_pct,
+                impact_win=EXCLUDED.impact_win, impact_pc_win=EXCLUDED.impact_pc_win, impact_counter_win=EXCLUDED.impact_counter_win,
+                impact_lose=EXCLUDED.impact_lose, impact_pc_lose=EXCLUDED.impact_pc_lose, impact_counter_lose=EXCLUDED.impact_counter_lose,
+                just_parry_count=EXCLUDED.just_parry_count, throw_win=EXCLUDED.throw_win, throw_lose=EXCLUDED.throw_lose,
+                throw_escape=EXCLUDED.throw_escape, stun_win=EXCLUDED.stun_win, stun_lose=EXCLUDED.stun_lose,
+                wall_push_sec=EXCLUDED.wall_push_sec, wall_pushed_sec=EXCLUDED.wall_pushed_sec;
+        """), {**stats, "uid": user_id, "pname": player_name, "recorded_at": recorded_at})
+        conn.commit()
+
+def save_battles(battles):
+    """戦績を一括保存し、新規に追加された件数を返す"""
+    return len(insert_battles(battles))
+
+def start_crawl(user_code, max_pages, incremental, write_log_func):
+    """チェックポイントを開始し、前回の巡回が途中で終わっていれば続きから再開する計画を返す"""
+    plan = checkpoints.begin(user_code, max_pages, incremental)
+    if plan.resumed:
+        write_log_func(f"⏯️ 前回の巡回が途中で終わっているため、{plan.start_page}ページ目から再開します。")
+    return plan
+
+def own_fighter_name(page_battles):
+    """戦績ページの全試合に登場する名前 (= そのユーザーの Buckler 上のファイター名) を返す。決まらなければNone"""
+    names = None
+    for it in page_battles:
+        sides = {it['p1']['name'], it['p2']['name']}
+        names = sides if names is None else names & sides
+    names = (names or set()) - {"Unknown"}
+    return next(iter(names)) if len(names) == 1 else None
+
+def remember_fighter_name(user_code, page_battles):
+    """戦績からファイター名を求めて target_users.fighter_name に記録する (分析で戦績を引くのに使う)"""
+    name = own_fighter_name(page_battles)
+    if name is None:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE target_users SET fighter_name = :name WHERE user_code = :uid AND fighter_name IS DISTINCT FROM :name
+        """), {"uid": user_code, "name": name})
+
+def save_page(user_code, page_no, page_battles):
+    """1ページ分の戦績をすぐに保存してチェックポイントを進め、新規件数を返す"""
+    set_phase("ingest")
+    new_count = save_battles(page_battles)
+    checkpoints.advance(user_code, page_no, page_battles)
+    if page_no == 1:
+        remember_fighter_name(user_code, page_battles)
+    set_phase("battlelog")
+    return new_count
+
+def crawl_page_done(page_battles, plan, is_last_page):
+    """1ページ保存した後の判定。(巡回を打ち切るか, 到達点か戦績の末尾まで届いたか) を返す
+
+    差分巡回は保存済みの試合に届いた時点で打ち切る。全件巡回は到達点を過ぎても max_pages まで取得を続ける。
+    """
+    end_of_list = is_last_page or not page_battles
+    covered = end_of_list or checkpoints.covers_watermark(page_battles, plan.stop_at)
+    stop = end_of_list or (plan.incremental and checkpoints.reached_watermark(page_battles, plan.stop_at))
+    return stop, covered
+
+def finish_crawl(user_code, closed, write_log_func):
+    if checkpoints.finish(user_code, closed=closed) == "partial":
+        write_log_func("⚠️ 保存済みの戦績に届く前にページ数の上限に達しました。到達点は更新せず、次回は続きのページから取得します。")
+
+def _page_url(log_url, page_no):
+    """戦績一覧の page_no ページ目のURL (1ページ目はそのまま)"""
+    if page_no <= 1:
+        return log_url
+    base, _, fragment = log_url.partition("#")
+    return f"{base}?page={page_no}" + (f"#{fragment}" if fragment else "")
+
+def scrape_performance_data(page, user_id, player_name, write_log_func, timings=None):
     """【実績】タブから詳細統計を取得・保存"""
+    timings = timings or PageTimings()
     try:
         write_log_func(f"📊 統計解析開始 (ID: {user_id} / {player_name})")
         
         # 動いていたセレクターを維持
-        perf_tab = page.locator('li:has-text("実績"), button:has-text("実績")').first
-        if perf_tab.is_visible():
-            perf_tab.click()
-            time.sleep(random.uniform(4.0, 6.0))
+        if timings.perf_tab(page):
+            buckler_limiter.acquire()
+            page.locator(PERF_TAB_SELECTOR).first.click()
+            if not timings.battle_style(page):
+                write_log_func("⚠️ 統計項目の描画待ちがタイムアウトしました。")
         else:
             write_log_func("⚠️ '実績'ボタンが見つかりません。")
             return
 
-        stats = page.evaluate("""
-            () => {
-                const results = {};
-                const parseNum = (txt) => parseFloat(txt.replace(/[^0-9.]/g, '')) || 0;
-                document.querySelectorAll('li[class*="battle_style_"]').forEach(li => {
-                    const type = li.querySelector('[class*="battle_style_type"]')?.innerText.trim();
-                    const val = parseNum(li.querySelector('[class*="battle_style_number"]')?.innerText || "0");
-                    if(type === "ドライブパリィ") results.d_parry_pct = val;
-                    if(type === "ドライブインパクト") results.d_impact_pct = val;
-                    if(type === "オーバードライブアーツ") results.d_od_pct = val;
-                    if(type === "パリィドライブラッシュ") results.d_rush_p_pct = val;
-                    if(type === "キャンセルドライブラッシュ") results.d_rush_c_pct = val;
-                    if(type === "ドライブリバーサル") results.d_reversal_pct = val;
-                    if(type === "Lv1") results.sa1_pct = val;
-                    if(type === "Lv2") results.sa2_pct = val;
-                    if(type === "Lv3") results.sa3_pct = val;
-                    if(type === "CA") results.ca_pct = val;
-                });
-                document.querySelectorAll('dl').forEach(dl => {
-                    const title = dl.querySelector('dt')?.innerText.trim();
-                    const getV = (label) => {
-                        const spans = Array.from(dl.querySelectorAll('span'));
-                        const target = spans.find(s => s.innerText.trim() === label);
-                        return target ? parseNum(target.nextElementSibling?.innerText || "0") : 0;
-                    };
-                    if(title === "ドライブパリィ") results.just_parry = getV("ジャストパリィ回数");
-                    if(title === "ドライブインパクト") {
-                        results.imp_win = getV("決めた回数");
-                        results.imp_pc_win = getV("パニッシュカウンターを決めた回数");
-                        results.imp_returned_win = getV("相手のドライブインパクトに決めた回数");
-                        results.imp_lose = getV("受けた回数");
-                        results.imp_pc_lose = getV("パニッシュカウンターを受けた回数");
-                        results.imp_returned_lose = getV("相手にドライブインパクトで返された回数");
-                    }
-                    if(title === "スタン") { results.stun_win = getV("スタンさせた回数"); results.stun_lose = getV("スタンさせられた回数"); }
-                    if(title === "投げ") { results.throw_win = getV("決めた回数"); results.throw_lose = getV("受けた回数"); results.throw_escape = getV("投げ抜け回数"); }
-                    if(title === "壁際") { results.wall_push = getV("相手を追い詰めている時間"); results.wall_pushed = getV("相手に追い詰められている時間"); }
-                });
-                return results;
-            }
-        """)
-
-        with engine.connect() as conn:
-            conn.execute(text("""
-                INSERT INTO player_stats (
-                    user_id, player_name, recorded_at, d_parry_pct, d_impact_pct, d_od_pct, d_rush_p_pct, d_rush_c_pct, d_reversal_pct,
-                    sa1_pct, sa2_pct, sa3_pct, ca_pct, impact_win, impact_pc_win, impact_counter_win,
-                    impact_lose, impact_pc_lose, impact_counter_lose, just_parry_count,
-                    throw_win, throw_lose, throw_escape, stun_win, stun_lose, wall_push_sec, wall_pushed_sec
-                ) VALUES (
-                    :uid, :pname, CURRENT_DATE, :d_parry_pct, :d_impact_pct, :d_od_pct, :d_rush_p_pct, :d_rush_c_pct, :d_reversal_pct,
-                    :sa1_pct, :sa2_pct, :sa3_pct, :ca_pct, :imp_win, :imp_pc_win, :imp_returned_win,
-                    :imp_lose, :imp_pc_lose, :imp_returned_lose, :just_parry,
-                    :throw_win, :throw_lose, :throw_escape, :stun_win, :stun_lose, :wall_push, :wall_pushed
-                ) ON CONFLICT (user_id, recorded_at) DO UPDATE SET
-                    player_name=EXCLUDED.player_name,
-                    d_parry_pct=EXCLUDED.d_parry_pct, d_impact_pct=EXCLUDED.d_impact_pct, d_od_pct=EXCLUDED.d_od_pct,
-                    d_rush_p_pct=EXCLUDED.d_rush_p_pct, d_rush_c_pct=EXCLUDED.d_rush_c_pct, d_reversal_pct=EXCLUDED.d_reversal_pct,
-                    sa1_pct=EXCLUDED.sa1_pct, sa2_pct=EXCLUDED.sa2_pct, sa3_pct=EXCLUDED.sa3_pct, ca_pct=EXCLUDED.ca_pct,
-                    impact_win=EXCLUDED.impact_win, impact_pc_win=EXCLUDED.impact_pc_win, impact_counter_win=EXCLUDED.impact_counter_win,
-                    impact_lose=EXCLUDED.impact_lose, impact_pc_lose=EXCLUDED.impact_pc_lose, impact_counter_lose=EXCLUDED.impact_counter_lose,
-                    just_parry_count=EXCLUDED.just_parry_count, throw_win=EXCLUDED.throw_win, throw_lose=EXCLUDED.throw_lose,
-                    throw_escape=EXCLUDED.throw_escape, stun_win=EXCLUDED.stun_win, stun_lose=EXCLUDED.stun_lose,
-                    wall_push_sec=EXCLUDED.wall_push_sec, wall_pushed_sec=EXCLUDED.wall_pushed_sec;
-            """), {**stats, "uid": user_id, "pname": player_name})
-            conn.commit()
+        with metrics.timed(metrics.EXTRACT_SECONDS, kind="play"):
+            stats = page.evaluate(PLAY_EXTRACT_JS)
+
+        archive.safe_store("play", user_id, 1, page.content(), write_log_func)
+        save_player_stats(user_id, player_name, stats)
         write_log_func("✅ 統計データ保存完了")
     except Exception as e: write_log_func(f"⚠️ 統計取得エラー: {e}")
 
-def scrape_sf6(user_code, player_name, write_log_func, max_pages=5):
+def scrape_sf6_http(user_code, player_name, write_log_func, max_pages=5, incremental=False):
+    """ブラウザを使わず、保存済みCookieでページを直接取得して埋め込みJSONから保存する
+
+    ページ構造が想定と異なる場合は http_fetch.PageDataError を送出する (呼び出し元でブラウザ版へ切替)。
+    """
+    play_url = f"{BUCKLER_BASE_URL}/ja-jp/profile/{user_code}/play"
+    log_url = f"{BUCKLER_BASE_URL}/ja-jp/profile/{user_code}/battlelog/rank"
+    write_log_func(f"🚀 スクレイピング開始 [HTTP] (ID: {user_code}, 名前: {player_name})")
+
+    set_phase("stats")
+    play_html = http_fetch.fetch_page(play_url)
+    metrics.PAGES_TOTAL.labels(**metrics.labels(backend="http")).inc()
+    archive.safe_store("play", user_code, 1, play_html, write_log_func)
+    with metrics.timed(metrics.EXTRACT_SECONDS, kind="play"):
+        stats = http_fetch.parse_play_stats(http_fetch.extract_page_props(play_html))
+    save_player_stats(user_code, player_name, stats)
+    write_log_func("✅ 統計データ保存完了")
+
+    set_phase("battlelog")
+    plan = start_crawl(user_code, max_pages, incremental, write_log_func)
+    new_count, closed = 0, False
+    try:
+        current_p = plan.start_page
+        while current_p <= plan.end_page:
+            write_log_func(f"📑 戦績 {current_p}ページ目をスキャン中...")
+            html = http_fetch.fetch_page(log_url, params={"page": current_p})
+            metrics.PAGES_TOTAL.labels(**metrics.labels(backend="http")).inc()
+            archive.safe_store("battlelog", user_code, current_p, html, write_log_func)
+            with metrics.timed(metrics.EXTRACT_SECONDS, kind="battlelog"):
+                props = http_fetch.extract_page_props(html)
+                p_data = http_fetch.parse_battlelog(props)
+            if current_p == plan.start_page and checkpoints.page_misaligned(p_data, plan):
+                write_log_func("↩️ 前回の続きのページを表示できないため、1ページ目から取得し直します。")
+                plan, current_p = plan._replace(start_page=1, resumed=False), 1
+                continue
+            new_count += save_page(user_code, current_p, p_data)
+            is_last_page = current_p >= http_fetch.total_pages(props)
+            stop, closed = crawl_page_done(p_data, plan, is_last_page)
+            if stop:
+                if p_data and not is_last_page: write_log_func("🛑 保存済みの戦績に到達したため巡回を終了します。")
+                break
+            current_p += 1
+    except Exception as e:
+        checkpoints.finish(user_code, e)
+        write_log_func(f"💾 {current_p - 1}ページ目までの戦績は保存済みです (新規 {new_count}件)。次回は続きから再開します。")
+        raise
+
+    finish_crawl(user_code, closed, write_log_func)
+    write_log_func(f"🏁 完了。新規戦績: {new_count}件")
+    return True
+
+def scrape_sf6(user_code, player_name, write_log_func, max_pages=5, pool=None, incremental=False):
+    """1ユーザー分の統計と戦績を取得する
+
+    poolを渡すと起動済みのChromiumを使い回す。incremental=Trueの場合は
+    保存済みの最新試合に到達した時点でページ送りを打ち切る。
+    """
     if not user_code: return False
+    with log_context(user=player_name):
+        if SCRAPE_BACKEND == "http":
+            try:
+                return scrape_sf6_http(user_code, player_name, write_log_func, max_pages=max_pages, incremental=incremental)
+            except Exception as e:
+                write_log_func(f"↩️ HTTP取得に失敗したためブラウザで再取得します: {e}")
+        if pool is None:
+            with BrowserPool(write_log_func=write_log_func) as own_pool:
+                return scrape_sf6_browser(user_code, player_name, write_log_func, own_pool, max_pages=max_pages, incremental=incremental)
+        return scrape_sf6_browser(user_code, player_name, write_log_func, pool, max_pages=max_pages, incremental=incremental)
 
-    play_url = f"https://www.streetfighter.com/6/buckler/ja-jp/profile/{user_code}/play"
-    log_url = f"https://www.streetfighter.com/6/buckler/ja-jp/profile/{user_code}/battlelog/rank#profile_nav"
+def scrape_sf6_browser(user_code, player_name, write_log_func, pool, max_pages=5, incremental=False):
+    """Playwrightでページを描画し、DOMから統計と戦績を抽出して保存する"""
+    play_url = f"{BUCKLER_BASE_URL}/ja-jp/profile/{user_code}/play"
+    log_url = f"{BUCKLER_BASE_URL}/ja-jp/profile/{user_code}/battlelog/rank#profile_nav"
     write_log_func(f"🚀 スクレイピング開始 (ID: {user_code}, 名前: {player_name})")
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True, args=["--disable-blink-features=AutomationControlled", "--no-sandbox"])
-        context = browser.new_context(
-            storage_state=COOKIE_PATH, viewport={'width': 1280, 'height': 1200},
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0.0.0 Safari/537.36", locale="ja-JP"
-        )
+    timings = PageTimings()
+    plan = None
+    with pool.context() as context:
+        resources = ResourceFilter().attach(context)
         page = context.new_page()
         try:
-            page.goto(play_url, wait_until="networkidle", timeout=60000)
-            time.sleep(5)
+            buckler_limiter.acquire()
+            timings.goto(page, play_url)
+            metrics.PAGES_TOTAL.labels(**metrics.labels(backend="browser")).inc()
+            timings.perf_tab(page)
             # Cookieダイアログ削除
             page.evaluate("() => { document.querySelectorAll('#CybotCookiebotDialog, [class*=\"praise_\"]').forEach(el => el.remove()); }")
             
-            scrape_performance_data(page, user_code, player_name, write_log_func)
+            set_phase("stats")
+            scrape_performance_data(page, user_code, player_name, write_log_func, timings=timings)
+            set_phase("battlelog")
 
-            page.goto(log_url, wait_until="networkidle", timeout=60000)
-            time.sleep(5)
-            all_found_data = []
-            for current_p in range(1, max_pages + 1):
+            plan = start_crawl(user_code, max_pages, incremental, write_log_func)
+            new_count, closed = 0, False
+            current_p = plan.start_page
+            buckler_limiter.acquire()
+            timings.goto(page, _page_url(log_url, current_p))
+            timings.battlelog_rows(page)
+            while current_p <= plan.end_page:
                 write_log_func(f"📑 戦績 {current_p}ページ目をスキャン中...")
-                time.sleep(2)
-                p_data = page.evaluate("""() => {
-                    const results = [];
-                    document.querySelectorAll('li[data-index]').forEach(item => {
-                        try {
-                            const getP = (side) => {
-                                const pClass = 'battle_data_player' + side;
-                                const parent = item.querySelector(`[class*="${pClass}"]`);
-                                const name = item.querySelector(`[class*="battle_data_name_p${side}"]`)?.innerText.trim() || "Unknown";
-                                const mr = parseInt(parent?.querySelector('[class*="battle_data_lp"]')?.innerText.replace(/[^0-9]/g, "")) || 0;
-                                const char = parent?.querySelector('[class*="battle_data_character"] img')?.getAttribute('alt') || "Unknown";
-                                const ctrl = parent?.querySelector('[class*="battle_data_control"] img')?.getAttribute('src')?.includes('type0') ? 'Classic' : 'Modern';
-                                const res = item.querySelector(`[class*="battle_data_player_${side}"]`)?.innerText.trim() || "";
-                                return { name, mr, char, ctrl, res };
-                            };
-                            const date = item.querySelector('[class*="battle_data_date"]')?.innerText.trim();
-                            if(date) {
-                                const p1 = getP(1); const p2 = getP(2);
-                                results.push({ id: "rank_"+date.replace(/[^0-9]/g,"")+"_"+p1.name+"_"+p2.name, date, p1, p2 });
-                            }
-                        } catch(e){}
-                    });
-                    return results;
-                }""")
-                if p_data: all_found_data.extend(p_data)
-                if current_p < max_pages:
-                    btn = page.locator("li.next:not(.disabled)").first
-                    if btn.is_visible():
-                        btn.click()
-                        page.wait_for_load_state("networkidle")
-                        time.sleep(3)
-                    else: break
-
-            new_count = 0
-            if all_found_data:
-                with engine.connect() as conn:
-                    for it in all_found_data:
-                        dt = datetime.datetime.strptime(it['date'], "%Y/%m/%d %H:%M")
-                        r = conn.execute(text("""
-                            INSERT INTO battle_results (battle_id, played_at, mode, p1_name, p1_char, p1_mr, p1_control, p1_result, p2_name, p2_char, p2_mr, p2_control, p2_result)
-                            VALUES (:bid, :pat, 'RankMatch', :p1n, :p1c, :p1m, :p1ctrl, :p1r, :p2n, :p2c, :p2m, :p2ctrl, :p2r)
-                            ON CONFLICT (battle_id) DO NOTHING
-                        """), {"bid":it['id'], "pat":dt, "p1n":it['p1']['name'], "p1c":it['p1']['char'], "p1m":it['p1']['mr'], "p1ctrl":it['p1']['ctrl'], "p1r":it['p1']['res'], "p2n":it['p2']['name'], "p2c":it['p2']['char'], "p2m":it['p2']['mr'], "p2ctrl":it['p2']['ctrl'], "p2r":it['p2']['res']})
-                        if r.rowcount > 0: new_count += 1
-                    conn.commit()
+                with metrics.timed(metrics.EXTRACT_SECONDS, kind="battlelog"):
+                    p_data = page.evaluate(BATTLELOG_EXTRACT_JS)
+                metrics.PAGES_TOTAL.labels(**metrics.labels(backend="browser")).inc()
+                archive.safe_store("battlelog", user_code, current_p, page.content(), write_log_func)
+                if current_p == plan.start_page and checkpoints.page_misaligned(p_data, plan):
+                    write_log_func("↩️ 前回の続きのページを表示できないため、1ページ目から取得し直します。")
+                    plan, current_p = plan._replace(start_page=1, resumed=False), 1
+                    buckler_limiter.acquire()
+                    timings.goto(page, log_url)
+                    timings.battlelog_rows(page)
+                    continue
+                new_count += save_page(user_code, current_p, p_data)
+                btn = page.locator("li.next:not(.disabled)").first
+                is_last_page = not btn.is_visible()
+                stop, closed = crawl_page_done(p_data, plan, is_last_page)
+                if stop:
+                    if p_data and not is_last_page: write_log_func("🛑 保存済みの戦績に到達したため巡回を終了します。")
+                    break
+                if current_p >= plan.end_page: break
+                signature = timings.battlelog_signature(page)
+                buckler_limiter.acquire()
+                btn.click()
+                if not timings.battlelog_changed(page, signature):
+                    # 続きのページは保存していないため、次回はこのページの次から再開する
+                    raise TimeoutError("次ページの描画待ちがタイムアウトしました。")
+                current_p += 1
+
+            finish_crawl(user_code, closed, write_log_func)
+            write_log_func(f"⏱️ 待機計測: {timings.summary()}")
+            write_log_func(f"🧹 リソース制限: {resources.summary()}")
             write_log_func(f"🏁 完了。新規戦績: {new_count}件")
             return True
         except Exception as e:
             write_log_func(f"💥 エラー: {e}")
+            if plan is not None:
+                checkpoints.finish(user_code, e)
+                write_log_func(f"💾 {current_p - 1}ページ目までの戦績は保存済みです (新規 {new_count}件)。次回は続きから再開します。")
             return False
-        finally: browser.close()
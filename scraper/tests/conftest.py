@@ -0,0 +1,11 @@
+# scraper ディレクトリのモジュールは「from config import ...」のように直接importするため、パスを通す
+# (Botのコンテナと同じく discord_bot にも通す)。
+# DATABASE_URL が無い環境では database.engine は None になり、DBを使うテストはスキップされる。
+import os
+import sys
+
+SCRAPER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_DIR = os.path.join(os.path.dirname(SCRAPER_DIR), "discord_bot")
+for path in (BOT_DIR, SCRAPER_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,53 @@
+import pandas as pd
+import analytics
+from scraper import own_fighter_name
+
+def battle(p1, p2):
+    return {"id": f"rank_{p1}_{p2}", "date": "2024/05/01 12:00", "p1": {"name": p1}, "p2": {"name": p2}}
+
+def test_own_fighter_name_is_the_name_in_every_battle():
+    assert own_fighter_name([battle("Me", "A"), battle("B", "Me"), battle("Me", "C")]) == "Me"
+    # 同じ相手としか対戦していなければ決められない
+    assert own_fighter_name([battle("Me", "A"), battle("A", "Me")]) is None
+    assert own_fighter_name([]) is None
+
+class FakeConn:
+    def __init__(self, active):
+        self.active = active
+
+    def execute(self, *args, **kwargs):
+        return self
+
+    def scalars(self):
+        return iter(self.active)
+
+def test_evict_untargeted_drops_users_no_longer_active(monkeypatch):
+    monkeypatch.setattr(analytics, "_histories", {"111": ("Me", pd.DataFrame()), "222": ("Old", pd.DataFrame())})
+    analytics.evict_untargeted(FakeConn(["111"]))
+    assert list(analytics._histories) == ["111"]
+
+def history(rows):
+    return pd.DataFrame([
+        {"battle_key": i, "played_at": pd.Timestamp(at), "my_char": "Ryu", "my_mr": mr,
+         "opponent_char": opp, "opponent_control": "Classic", "is_win": win}
+        for i, (at, mr, opp, win) in enumerate(rows)
+    ])
+
+def test_compute_streaks_sessions_and_matrix():
+    hist = history([
+        ("2024-05-01 12:00", 1500, "Ken", 1),
+        ("2024-05-01 12:05", 1510, "Ken", 1),
+        ("2024-05-01 12:10", 0, "Luke", 0),      # MR未計測は直前の値で埋める
+        ("2024-05-01 18:00", 1505, "Ken", 0),    # 30分以上空いたので別セッション
+        ("2024-05-01 18:05", 1495, "Luke", 0),
+    ])
+    summary, session_no, sessions, matrix = analytics.compute(hist, window=2, gap_min=30)
+    assert summary["matches"] == 5 and summary["wins"] == 2
+    assert summary["current_streak"] == -3
+    assert summary["best_win_streak"] == 2 and summary["worst_lose_streak"] == 3
+    assert summary["rolling_win_rate"] == 0.0
+    assert list(session_no) == [0, 0, 0, 1, 1]
+    assert list(sessions["mr_delta"]) == [10, -10]
+    assert summary["latest_mr"] == 1495
+    ken = matrix[matrix["opponent_char"] == "Ken"].iloc[0]
+    assert (ken["matches"], ken["wins"]) == (3, 2)
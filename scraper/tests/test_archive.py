@@ -0,0 +1,24 @@
+from sqlalchemy import create_engine, text
+import archive
+
+def test_store_deduplicates_content_and_round_trips(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'raw.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE raw_pages (content_hash TEXT, user_code TEXT, kind TEXT, page_no INTEGER)"))
+    monkeypatch.setattr(archive, "engine", engine)
+    monkeypatch.setattr(archive, "ARCHIVE_PAGES", True)
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+
+    html = "<html>戦績</html>"
+    first = archive.store("battlelog", "111", 1, html)
+    second = archive.store("battlelog", "111", 2, html)
+    assert first == second
+    assert archive.load(first) == html
+    # 同じ内容のファイルは1つだけ、取得履歴はページごとに残る
+    assert len(list((tmp_path / "archive").rglob("*.zst"))) == 1
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM raw_pages")).scalar() == 2
+
+def test_store_is_disabled_by_archive_pages(monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_PAGES", False)
+    assert archive.store("battlelog", "111", 1, "<html></html>") is None
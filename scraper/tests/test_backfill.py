@@ -0,0 +1,20 @@
+from backfill import PageQueue
+
+def battle(bid):
+    return {"id": bid, "p1": {"mr": 0}, "p2": {"mr": 0}}
+
+def test_empty_page_stops_handing_out_later_pages():
+    progress = []
+    queue = PageQueue(range(2, 6), 5, on_progress=lambda done, total: progress.append((done, total)))
+    assert queue.next() == 2
+    queue.done(2, [])
+    assert queue.last_page == 1
+    assert queue.next() is None
+    assert progress == [(1, 1)]
+
+def test_battles_merges_pages_in_order_without_duplicates():
+    queue = PageQueue([], 3)
+    queue.done(2, [battle("b"), battle("c")])
+    queue.done(1, [battle("a"), battle("b")])
+    queue.done(3, [battle("d")])
+    assert [b["id"] for b in queue.battles()] == ["a", "b", "c", "d"]
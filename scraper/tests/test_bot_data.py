@@ -0,0 +1,23 @@
+import asyncio
+import bot_data
+
+def test_status_cache_reads_once_until_invalidated(monkeypatch):
+    loads = []
+    monkeypatch.setattr(bot_data, "_load_status", lambda key: loads.append(key) or f"v{len(loads)}")
+    cache = bot_data.StatusCache()
+
+    async def scenario():
+        first = await cache.get("public_url")
+        cached = await cache.get("public_url")
+        cache.invalidate("public_url")
+        return first, cached, await cache.get("public_url")
+    assert asyncio.run(scenario()) == ("v1", "v1", "v2")
+    assert loads == ["public_url", "public_url"]
+
+def test_player_stats_cache_applies_partial_reloads():
+    cache = bot_data.PlayerStatsCache()
+    cache._apply(None, {"Alice": {"matches": 1}, "Bob": {"matches": 2}})
+    cache._apply({"Alice", "Bob"}, {"Alice": {"matches": 3}})
+    assert cache.get("alice") == {"matches": 3}
+    assert cache.get("Bob") is None
+    assert cache.names("AL") == ["Alice"]
@@ -0,0 +1,41 @@
+import subprocess
+import sys
+import psutil
+import pytest
+from browser_pool import chromium_rss_mb, find_process_with_arg
+
+def _spawn(*args):
+    # 起動し終えてからRSSを測れるよう、準備完了を1行出力させる
+    proc = subprocess.Popen([sys.executable, "-c", "import time; print('ready', flush=True); time.sleep(60)", *args],
+                            stdout=subprocess.PIPE, text=True)
+    proc.stdout.readline()
+    return proc
+
+@pytest.fixture
+def two_browsers():
+    # ワーカーの2スレッドがそれぞれ起動したChromiumの代わり
+    procs = [_spawn("--sf6-browser-pool=a"), _spawn("--sf6-browser-pool=b")]
+    yield procs
+    for p in procs:
+        p.kill()
+        p.wait()
+
+def test_find_process_with_arg_matches_only_its_own_marker(two_browsers):
+    a, b = two_browsers
+    assert find_process_with_arg("--sf6-browser-pool=a") == a.pid
+    assert find_process_with_arg("--sf6-browser-pool=b") == b.pid
+    assert find_process_with_arg("--sf6-browser-pool=missing") is None
+
+def test_chromium_rss_excludes_other_pools(two_browsers):
+    a, b = two_browsers
+    other = psutil.Process(b.pid).memory_info().rss / (1024 * 1024)
+    rss = chromium_rss_mb(a.pid)
+    own = psutil.Process(a.pid).memory_info().rss / (1024 * 1024)
+    assert 0 < rss
+    # もう一方のプールのChromiumを足していれば、自分のRSS + 相手のRSS の近くになる
+    assert rss < own + other / 2
+
+def test_chromium_rss_of_exited_process_is_zero():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    assert chromium_rss_mb(proc.pid) == 0.0
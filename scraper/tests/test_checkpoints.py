@@ -0,0 +1,77 @@
+import datetime
+from collections import namedtuple
+from checkpoints import CrawlPlan, covers_watermark, page_misaligned, plan_from_row, reached_watermark
+from scraper import crawl_page_done
+
+Row = namedtuple("Row", ["status", "last_page", "end_page", "max_pages", "incremental", "cursor_played_at", "stop_at"])
+
+W = datetime.datetime(2024, 5, 1, 12, 0)
+
+def battle(date):
+    return {"id": f"rank_{date}", "date": date, "p1": {"mr": 0}, "p2": {"mr": 0}}
+
+NEW = [battle("2024/05/02 10:00"), battle("2024/05/02 09:00")]
+OLD = [battle("2024/05/01 12:30"), battle("2024/05/01 11:00")]
+
+def test_reached_watermark():
+    assert reached_watermark([], W)
+    assert not reached_watermark(NEW, W)
+    assert reached_watermark(OLD, W)
+    assert not reached_watermark(NEW, None)
+
+def test_covers_watermark_without_watermark():
+    assert covers_watermark(NEW, None)
+    assert not covers_watermark(NEW, W)
+
+def test_fresh_plan_without_checkpoint():
+    assert plan_from_row(None, 5, True, W) == CrawlPlan(1, 5, W, True, None, False)
+
+def test_completed_checkpoint_starts_over():
+    row = Row("completed", 3, 5, 5, True, W, W)
+    assert plan_from_row(row, 5, True, W).start_page == 1
+
+def test_failed_checkpoint_resumes_after_last_saved_page():
+    cursor = datetime.datetime(2024, 5, 2, 8, 0)
+    row = Row("failed", 3, 5, 5, True, cursor, W)
+    assert plan_from_row(row, 5, True, None) == CrawlPlan(4, 5, W, True, cursor, True)
+
+def test_partial_incremental_checkpoint_continues_for_another_max_pages():
+    row = Row("partial", 2, 2, 2, True, W, W)
+    plan = plan_from_row(row, 2, True, W)
+    assert (plan.start_page, plan.end_page, plan.stop_at) == (3, 4, W)
+
+def test_partial_is_not_continued_by_full_crawl():
+    row = Row("partial", 2, 2, 2, True, W, W)
+    assert plan_from_row(row, 2, False, W).start_page == 1
+
+def test_checkpoint_with_different_request_starts_over():
+    row = Row("failed", 3, 5, 5, True, W, W)
+    assert plan_from_row(row, 10, True, None) == CrawlPlan(1, 10, None, True, None, False)
+    assert plan_from_row(row, 5, False, None) == CrawlPlan(1, 5, None, False, None, False)
+
+def test_page_misaligned_only_when_resumed():
+    cursor = datetime.datetime(2024, 5, 2, 9, 30)
+    plan = CrawlPlan(4, 5, W, True, cursor, True)
+    assert page_misaligned(NEW[:1], plan)           # ?page=N が効かず1ページ目が返った
+    assert not page_misaligned(NEW[1:] + OLD, plan)
+    assert not page_misaligned(NEW, plan._replace(resumed=False))
+
+def test_incremental_crawl_stops_and_closes_at_watermark():
+    plan = CrawlPlan(1, 2, W, True, None, False)
+    assert crawl_page_done(NEW, plan, False) == (False, False)
+    assert crawl_page_done(OLD, plan, False) == (True, True)
+
+def test_hitting_max_pages_before_watermark_leaves_gap_open():
+    # 最後のページ (max_pages) でも保存済みの試合に届かなければ closed=False → 到達点を進めない
+    plan = CrawlPlan(1, 1, W, True, None, False)
+    stop, closed = crawl_page_done(NEW, plan, False)
+    assert not closed
+
+def test_end_of_list_closes_crawl():
+    plan = CrawlPlan(1, 5, W, True, None, False)
+    assert crawl_page_done(NEW, plan, True) == (True, True)
+    assert crawl_page_done([], plan, False) == (True, True)
+
+def test_full_crawl_does_not_stop_at_watermark():
+    plan = CrawlPlan(1, 5, W, False, None, False)
+    assert crawl_page_done(OLD, plan, False) == (False, True)
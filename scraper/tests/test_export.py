@@ -0,0 +1,62 @@
+import pyarrow.parquet as pq
+from sqlalchemy import create_engine, text
+import export
+
+def test_write_chunks_partitions_by_month_and_is_idempotent(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER, played_at TEXT)"))
+        conn.execute(text("INSERT INTO t VALUES (1, '2024-04-30 23:00:00'), (2, '2024-05-01 00:10:00'), (3, '2024-05-02 12:00:00')"))
+    monkeypatch.setattr(export, "engine", engine)
+    monkeypatch.setattr(export, "EXPORT_DIR", str(tmp_path / "export"))
+    monkeypatch.setattr(export, "EXPORT_CHUNK_ROWS", 2)
+
+    sql = "SELECT id, played_at FROM t WHERE id > :last_id ORDER BY id"
+    for _ in range(2):
+        # 同じ到達点から再実行しても同じファイルが上書きされるだけ
+        assert export.write_chunks(sql, {"last_id": 0}, "battles", "played_at", "0", lambda m: None) == 3
+    root = tmp_path / "export" / "battles"
+    assert sorted(p.name for p in root.iterdir()) == ["month=2024-04", "month=2024-05"]
+    assert pq.read_table(root).num_rows == 3
+
+def test_export_battles_rerun_after_failure_reuses_pending_range(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("""CREATE TABLE export_watermarks (name TEXT PRIMARY KEY, last_id INTEGER, last_date DATE,
+                             pending_id INTEGER, pending_date DATE, updated_at TIMESTAMP)"""))
+        conn.execute(text("CREATE TABLE v_battle_results (id INTEGER, played_at TEXT)"))
+        conn.execute(text("INSERT INTO v_battle_results VALUES (1, '2024-05-01 00:00:00'), (2, '2024-05-01 01:00:00'), (3, '2024-05-01 02:00:00')"))
+    monkeypatch.setattr(export, "engine", engine)
+    monkeypatch.setattr(export, "EXPORT_DIR", str(tmp_path / "export"))
+    monkeypatch.setattr(export, "EXPORT_CHUNK_ROWS", 2)
+    monkeypatch.setattr(export, "BATTLES_SQL", "SELECT id, played_at FROM v_battle_results WHERE id > :last_id AND id <= :upper_id ORDER BY id")
+    monkeypatch.setattr(export, "committed_upper_id",
+                        lambda: engine.connect().execute(text("SELECT COALESCE(MAX(id), 0) FROM v_battle_results")).scalar())
+    write_chunks = export.write_chunks
+    failing = {"battle_facts": True}
+
+    def fake_write_chunks(sql, params, dataset, date_column, tag, write_log_func):
+        if dataset == "battle_facts":
+            if failing.pop(dataset, False):
+                raise RuntimeError("書き出し失敗")
+            return 0
+        return write_chunks(sql, params, dataset, date_column, tag, write_log_func)
+    monkeypatch.setattr(export, "write_chunks", fake_write_chunks)
+
+    try:
+        export.export_battles(lambda m: None)
+    except RuntimeError:
+        pass
+    with engine.connect() as conn:
+        assert export.load_watermark(conn, "battle_results") == (None, None, 3, None)
+
+    # 失敗後に戦績が増えても (上限 3 → 5)、再実行はまず前回と同じ範囲を書き直す
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO v_battle_results VALUES (4, '2024-05-01 03:00:00'), (5, '2024-05-01 04:00:00')"))
+    assert export.export_battles(lambda m: None) == 3
+    with engine.connect() as conn:
+        assert export.load_watermark(conn, "battle_results") == (3, None, None, None)
+    assert export.export_battles(lambda m: None) == 2
+
+    ids = sorted(pq.read_table(tmp_path / "export" / "battle_results").column("id").to_pylist())
+    assert ids == [1, 2, 3, 4, 5]
@@ -0,0 +1,60 @@
+import json
+import pytest
+import http_fetch
+from http_fetch import PageDataError, extract_page_props, parse_battlelog, parse_play_stats, total_pages
+
+def page_html(page_props):
+    data = json.dumps({"props": {"pageProps": page_props}})
+    return f'<html><body><script id="__NEXT_DATA__" type="application/json" crossorigin="anonymous">{data}</script></body></html>'
+
+def side(name, mr, rounds, input_type=0):
+    return {"player": {"fighter_id": name}, "character_name": "Ryu", "master_rating": mr,
+            "battle_input_type": input_type, "round_results": rounds}
+
+def test_extract_page_props():
+    assert extract_page_props(page_html({"total_page": 3})) == {"total_page": 3}
+    with pytest.raises(PageDataError):
+        extract_page_props("<html></html>")
+
+def test_parse_battlelog_matches_browser_format():
+    uploaded_at = 1714532400  # 2024/05/01 12:00 JST
+    props = {"replay_list": [{"uploaded_at": uploaded_at,
+                              "player1_info": side("Alice", 1500, [1, 0, 1]),
+                              "player2_info": {**side("Bob", 0, [0, 1, 0], input_type=1), "league_point": 8000}}]}
+    [battle] = parse_battlelog(props)
+    assert battle["id"] == "rank_202405011200_Alice_Bob"
+    assert battle["date"] == "2024/05/01 12:00"
+    assert battle["p1"] == {"name": "Alice", "mr": 1500, "char": "Ryu", "ctrl": "Classic", "res": "WIN"}
+    # マスター未満でMRが0のプレイヤーはリーグポイントを使う
+    assert battle["p2"] == {"name": "Bob", "mr": 8000, "char": "Ryu", "ctrl": "Modern", "res": "LOSE"}
+
+def test_parse_battlelog_marks_draw_for_both_players():
+    props = {"replay_list": [{"uploaded_at": 1714532400,
+                              "player1_info": side("Alice", 1500, [1, 0, 0]),
+                              "player2_info": side("Bob", 1500, [0, 1, 0])}]}
+    [battle] = parse_battlelog(props)
+    assert (battle["p1"]["res"], battle["p2"]["res"]) == ("DRAW", "DRAW")
+
+def test_normalize_rating_matches_displayed_text():
+    # 埋め込みJSONの数値と、ブラウザ版が読む画面表示は同じ値になる (battle_key が一致する)
+    assert http_fetch.normalize_rating(1580) == http_fetch.normalize_rating("1,580 MR") == 1580
+    assert http_fetch.normalize_rating(25000) == http_fetch.normalize_rating("25,000 LP") == 25000
+    assert http_fetch.normalize_rating(1580.0) == 1580
+    assert http_fetch.normalize_rating("") == http_fetch.normalize_rating(None) == 0
+
+def test_parse_battlelog_requires_replay_list():
+    with pytest.raises(PageDataError):
+        parse_battlelog({})
+
+def test_parse_play_stats():
+    stats = {key: i for i, key in enumerate(http_fetch.PLAY_STATS_KEYS.values())}
+    result = parse_play_stats({"play": {"battle_stats": stats}})
+    assert result["d_parry_pct"] == 0.0
+    assert result["wall_pushed"] == float(len(stats) - 1)
+    del stats["corner_time"]
+    with pytest.raises(PageDataError, match="corner_time"):
+        parse_play_stats({"play": {"battle_stats": stats}})
+
+def test_total_pages_defaults_to_one():
+    assert total_pages({"total_page": 7}) == 7
+    assert total_pages({}) == 1
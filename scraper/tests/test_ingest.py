@@ -0,0 +1,50 @@
+import hashlib
+import os
+import re
+import pytest
+from ingest import battle_key, parse_played_at
+
+MIGRATION = os.path.join(os.path.dirname(__file__), "..", "..", "flyway", "sql", "V17__normalize_battle_results.sql")
+
+def battle(bid, p1_mr, p2_mr):
+    return {"id": bid, "p1": {"mr": p1_mr}, "p2": {"mr": p2_mr}}
+
+SAMPLES = [
+    battle("rank_202405011200_Alice_Bob", 1500, 1620),
+    battle("rank_202405011200_Alice_Bob", 1500, 1625),
+    battle("rank_202405011201_りゅう_けん", None, 0),
+    battle("rank_202405011202_A_B", 0, None),
+]
+
+def sql_equivalent(it):
+    # V17 の battle_key(): ('x' || substr(md5(...), 1, 16))::BIT(64)::BIGINT と同じ計算
+    source = f"{it['id']}|{it['p1']['mr'] or 0}|{it['p2']['mr'] or 0}"
+    value = int(hashlib.md5(source.encode("utf-8")).hexdigest()[:16], 16)
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def test_battle_key_matches_sql_definition():
+    for it in SAMPLES:
+        assert battle_key(it) == sql_equivalent(it)
+        assert -(1 << 63) <= battle_key(it) < (1 << 63)
+
+def test_battle_key_distinguishes_mr_and_treats_missing_mr_as_zero():
+    assert battle_key(SAMPLES[0]) != battle_key(SAMPLES[1])
+    assert battle_key(battle("x", None, None)) == battle_key(battle("x", 0, 0))
+
+def test_parse_played_at():
+    assert parse_played_at("2024/05/01 09:07").isoformat() == "2024-05-01T09:07:00"
+
+def test_battle_key_parity_with_postgres():
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL が未設定")
+    from sqlalchemy import create_engine, text
+    with open(MIGRATION, encoding="utf-8") as f:
+        function_sql = re.search(r"CREATE OR REPLACE FUNCTION battle_key.*?LANGUAGE SQL IMMUTABLE;", f.read(), re.S).group(0)
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text(function_sql))
+        for it in SAMPLES:
+            expected = conn.execute(text("SELECT battle_key(:bid, :p1, :p2)"),
+                                    {"bid": it["id"], "p1": it["p1"]["mr"], "p2": it["p2"]["mr"]}).scalar()
+            assert battle_key(it) == expected
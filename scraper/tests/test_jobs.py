@@ -0,0 +1,142 @@
+import datetime
+import os
+import pytest
+from sqlalchemy import create_engine, text
+import jobs
+from jobs import due_slots
+
+MIGRATIONS = [os.path.join(os.path.dirname(__file__), "..", "..", "flyway", "sql", name)
+              for name in ("V11__create_scrape_jobs.sql", "V14__add_backfill_jobs.sql")]
+# 本物のテーブルを壊さないよう、専用のスキーマにジョブキューを作って試す
+SCHEMA = "test_jobs"
+
+def test_due_slots_within_an_hour_of_run_time():
+    now = datetime.datetime(2024, 5, 1, 9, 30)
+    assert due_slots(now, ["09:00", "21:00"]) == ["2024-05-01 09:00"]
+    assert due_slots(now.replace(hour=10, minute=0), ["09:00"]) == []
+    assert due_slots(now.replace(hour=8, minute=59), ["09:00"]) == []
+
+def test_due_slots_ignores_malformed_times():
+    assert due_slots(datetime.datetime(2024, 5, 1, 9, 0), ["bad", "09:00"]) == ["2024-05-01 09:00"]
+
+@pytest.fixture
+def db_engine(monkeypatch):
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL が未設定")
+    admin = create_engine(url)
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    engine = create_engine(url, connect_args={"options": f"-c search_path={SCHEMA}"})
+    with engine.begin() as conn:
+        for path in MIGRATIONS:
+            with open(path, encoding="utf-8") as f:
+                conn.execute(text(f.read()))
+        conn.execute(text("CREATE TABLE target_users (user_code TEXT PRIMARY KEY, player_name TEXT, is_active BOOLEAN)"))
+    monkeypatch.setattr(jobs, "engine", engine)
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 2)
+    yield engine
+    engine.dispose()
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    admin.dispose()
+
+def job_state(engine, job_id):
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT status, attempts, locked_by, last_error, finished_at,
+                lease_until > CURRENT_TIMESTAMP AS leased,
+                EXTRACT(EPOCH FROM run_after - CURRENT_TIMESTAMP) AS wait_sec
+            FROM scrape_jobs WHERE id = :id
+        """), {"id": job_id}).fetchone()
+
+def expire_lease(engine, job_id):
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE scrape_jobs SET lease_until = CURRENT_TIMESTAMP - INTERVAL '1 minute' WHERE id = :id"), {"id": job_id})
+
+def make_due(engine, job_id):
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE scrape_jobs SET run_after = CURRENT_TIMESTAMP - INTERVAL '1 second' WHERE id = :id"), {"id": job_id})
+
+def test_claim_skips_locked_rows_and_reclaims_expired_leases(db_engine):
+    jobs.enqueue_user("u1", "A")
+    jobs.enqueue_user("u2", "B")
+    # 別のワーカーが取得中 (行ロック中) のジョブは待たずに飛ばす
+    with db_engine.connect() as other:
+        tx = other.begin()
+        other.execute(text("SELECT id FROM scrape_jobs WHERE user_code = 'u1' FOR UPDATE"))
+        assert jobs.claim("w1").user_code == "u2"
+        tx.rollback()
+    first = jobs.claim("w1")
+    assert (first.user_code, first.attempts) == ("u1", 1)
+    # リース中のジョブは他のワーカーに取られない
+    assert jobs.claim("w2") is None
+
+    # リースが切れたジョブは別のワーカーが取り直す
+    expire_lease(db_engine, first.id)
+    again = jobs.claim("w2")
+    assert (again.id, again.attempts) == (first.id, 2)
+    state = job_state(db_engine, first.id)
+    assert (state.status, state.locked_by, state.leased) == ("running", "w2", True)
+
+def test_renew_extends_only_own_running_jobs(db_engine):
+    jobs.enqueue_user("u1", "A")
+    job = jobs.claim("w1")
+    expire_lease(db_engine, job.id)
+    jobs.renew([job.id], "w2")
+    assert job_state(db_engine, job.id).leased is False
+    jobs.renew([job.id], "w1")
+    assert job_state(db_engine, job.id).leased is True
+    jobs.renew([], "w1")
+
+def test_fail_backs_off_then_gives_up_at_max_attempts(db_engine):
+    jobs.enqueue_user("u1", "A")
+    job = jobs.claim("w1")
+    # 取得していないワーカーからの失敗報告は無視する
+    jobs.fail(job.id, "w2", "other")
+    assert job_state(db_engine, job.id).status == "running"
+
+    jobs.fail(job.id, "w1", "boom")
+    state = job_state(db_engine, job.id)
+    assert (state.status, state.last_error, state.finished_at, state.leased) == ("queued", "boom", None, None)
+    # 試行回数×5分 後まで再実行しない
+    assert 290 <= state.wait_sec <= 300
+    assert jobs.claim("w1") is None
+
+    make_due(db_engine, job.id)
+    retry = jobs.claim("w1")
+    assert (retry.id, retry.attempts) == (job.id, 2)
+    jobs.fail(job.id, "w1", "boom again")
+    state = job_state(db_engine, job.id)
+    assert state.status == "failed" and state.finished_at is not None
+    make_due(db_engine, job.id)
+    assert jobs.claim("w1") is None
+
+def test_reap_expired_fails_only_exhausted_jobs(db_engine):
+    jobs.enqueue_user("u1", "A")
+    jobs.enqueue_user("u2", "B")
+    exhausted, retriable = jobs.claim("w1"), jobs.claim("w1")
+    expire_lease(db_engine, exhausted.id)
+    expire_lease(db_engine, retriable.id)
+    # u1 は取り直されて試行回数 (2回) を使い切ったまま、またリースが切れる
+    assert jobs.claim("w2").id == exhausted.id
+    expire_lease(db_engine, exhausted.id)
+
+    jobs.reap_expired()
+    state = job_state(db_engine, exhausted.id)
+    assert (state.status, state.last_error) == ("failed", "lease expired")
+    assert state.finished_at is not None
+    # 試行回数が残っているジョブはそのまま (次の claim で取り直される)
+    assert job_state(db_engine, retriable.id).status == "running"
+    assert jobs.claim("w2").id == retriable.id
+
+def test_enqueue_active_users_is_idempotent_per_slot(db_engine):
+    with db_engine.begin() as conn:
+        conn.execute(text("INSERT INTO target_users VALUES ('u1', 'A', TRUE), ('u2', 'B', TRUE), ('u3', 'C', FALSE)"))
+    assert jobs.enqueue_active_users(slot_key="2024-05-01 09:00") == 2
+    assert jobs.enqueue_active_users(slot_key="2024-05-01 09:00") == 0
+    assert jobs.enqueue_active_users(slot_key="2024-05-01 21:00") == 2
+    with db_engine.connect() as conn:
+        rows = conn.execute(text("SELECT user_code, max_attempts FROM scrape_jobs ORDER BY user_code, slot_key")).fetchall()
+    assert [tuple(r) for r in rows] == [("u1", 2), ("u1", 2), ("u2", 2), ("u2", 2)]
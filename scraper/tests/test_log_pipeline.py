@@ -0,0 +1,75 @@
+import logging
+from sqlalchemy import create_engine, text
+from prometheus_client import REGISTRY
+import log_pipeline
+
+def log_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'logs.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE scrape_logs (id INTEGER PRIMARY KEY, logged_at TEXT, host TEXT, user_name TEXT, phase TEXT, duration REAL, message TEXT)
+        """))
+    return engine
+
+def record(message, **fields):
+    return {"at": "2024-06-01 12:00:00", "message": message, **fields}
+
+def lost(reason):
+    return REGISTRY.get_sample_value("sf6_log_db_records_lost_total", {"reason": reason}) or 0
+
+def test_db_writer_batches_records(tmp_path):
+    engine = log_db(tmp_path)
+    writer = log_pipeline._DBWriter(engine, batch_size=2, flush_sec=5).start()
+    with log_pipeline.log_context(user="alice", phase="battlelog"):
+        writer.put(record("ok", duration=1.5, **log_pipeline.current_fields()))
+    writer.put(record("second"))
+    writer.put(record("third"))
+    writer.stop()
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT user_name, phase, duration, message FROM scrape_logs ORDER BY id")).fetchall()
+    assert [tuple(r) for r in rows] == [("alice", "battlelog", 1.5, "ok"), (None, None, None, "second"), (None, None, None, "third")]
+    assert writer.written == 3
+
+def test_db_writer_counts_failed_and_dropped_records(tmp_path):
+    # scrape_logs が無いDB → INSERTが失敗する
+    writer = log_pipeline._DBWriter(create_engine(f"sqlite:///{tmp_path / 'empty.db'}"), queue_size=1)
+    failed, dropped = lost("failed"), lost("dropped")
+    writer.flush([record("a"), record("b")])
+    assert lost("failed") == failed + 2
+    assert writer.failing
+
+    writer.put(record("queued"))
+    writer.put(record("overflow"))   # スレッド未起動で1件しか積めない
+    assert lost("dropped") == dropped + 1
+
+def test_full_queue_drops_and_counts(monkeypatch):
+    import queue
+    monkeypatch.setattr(log_pipeline, "dropped", 0)
+    logger = logging.getLogger("test_log_pipeline_queue")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    log_queue = queue.Queue(1)
+    logger.addHandler(log_pipeline._DropWhenFullHandler(log_queue))
+
+    for i in range(3):
+        logger.info("line %d", i)
+    assert log_queue.qsize() == 1
+    assert log_pipeline.dropped == 2
+
+def test_recent_filters_this_process_records(monkeypatch):
+    import collections
+    monkeypatch.setattr(log_pipeline, "_records", collections.deque(maxlen=3))
+    monkeypatch.setattr(log_pipeline, "_listener", object())   # ファイル出力は起動しない
+    monkeypatch.setattr(log_pipeline, "_logger", logging.getLogger("test_log_pipeline_recent"))
+    with log_pipeline.log_context(user="alice", phase="battlelog"):
+        log_pipeline.write_log("a1")
+        log_pipeline.write_log("a2", phase="ingest")
+    log_pipeline.write_log("other")
+    log_pipeline.write_log("bob", user="bob")
+
+    # 上限を超えた古いものから捨てられる
+    assert [r["message"] for r in log_pipeline.recent()] == ["bob", "other", "a2"]
+    assert [r["message"] for r in log_pipeline.recent(user="alice")] == ["a2"]
+    assert [r["message"] for r in log_pipeline.recent(phase="ingest")] == ["a2"]
+    assert log_pipeline.users() == ["alice", "bob"]
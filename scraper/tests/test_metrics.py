@@ -0,0 +1,19 @@
+from prometheus_client import REGISTRY
+import metrics
+import log_pipeline
+
+def test_histogram_buckets_are_sorted():
+    # prometheus_client は昇順でないバケットを import 時に拒否する
+    for histogram in (metrics.NAVIGATION_SECONDS, metrics.EXTRACT_SECONDS, metrics.DB_STATEMENT_SECONDS):
+        assert histogram._upper_bounds == sorted(histogram._upper_bounds)
+
+def test_labels_follow_log_context():
+    with log_pipeline.log_context(user="alice", phase="battlelog"):
+        assert metrics.labels(backend="http") == {"user": "alice", "phase": "battlelog", "backend": "http"}
+    assert metrics.labels() == {"user": "-", "phase": "-"}
+
+def test_db_timer_is_labelled_by_phase():
+    with log_pipeline.log_context(user="alice", phase="ingest"):
+        with metrics.db_timer("test_statement"):
+            pass
+    assert REGISTRY.get_sample_value("sf6_db_statement_seconds_count", {"statement": "test_statement", "phase": "ingest"}) == 1
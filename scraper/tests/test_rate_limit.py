@@ -0,0 +1,61 @@
+import os
+import pytest
+import rate_limit
+from rate_limit import SharedRateLimiter, TokenBucket
+
+MIGRATION = os.path.join(os.path.dirname(__file__), "..", "..", "flyway", "sql", "V21__create_rate_limits.sql")
+
+def test_token_bucket_allows_burst_then_waits(monkeypatch):
+    clock = [100.0]
+    slept = []
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: clock[0])
+    def fake_sleep(sec):
+        slept.append(sec)
+        clock[0] += sec
+    monkeypatch.setattr(rate_limit.time, "sleep", fake_sleep)
+
+    bucket = TokenBucket(rate_per_sec=2, burst=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert slept == [pytest.approx(0.5)]
+
+def test_token_bucket_refills_over_time(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: clock[0])
+    bucket = TokenBucket(rate_per_sec=1, burst=1)
+    assert bucket.acquire() == 0.0
+    clock[0] += 1.0
+    assert bucket.acquire() == 0.0
+
+def test_zero_rate_is_unlimited():
+    assert TokenBucket(0, 1).acquire() == 0.0
+    assert SharedRateLimiter("t", 0, 1).acquire() == 0.0
+
+def test_shared_limiter_falls_back_to_local_bucket_without_db(monkeypatch):
+    monkeypatch.setattr(rate_limit, "engine", None)
+    calls = []
+    local = TokenBucket(1, 1)
+    monkeypatch.setattr(local, "acquire", lambda: calls.append(1) or 0.0)
+    SharedRateLimiter("t", 1, 1, local_fallback=local).acquire()
+    assert calls == [1]
+
+@pytest.fixture
+def db_engine(monkeypatch):
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL が未設定")
+    from sqlalchemy import create_engine, text
+    engine = create_engine(url)
+    with engine.begin() as conn, open(MIGRATION, encoding="utf-8") as f:
+        conn.execute(text(f.read()))
+        conn.execute(text("DELETE FROM rate_limits WHERE name LIKE 'test_%'"))
+    monkeypatch.setattr(rate_limit, "engine", engine)
+    return engine
+
+def test_shared_limiter_spaces_requests_across_instances(db_engine):
+    # 別プロセスのワーカーの代わりに、同じ名前のリミッターを2つ作って交互に予約する
+    a, b = SharedRateLimiter("test_shared", 10, 2), SharedRateLimiter("test_shared", 10, 2)
+    waits = [a.reserve(), b.reserve(), a.reserve(), b.reserve()]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(0.1, abs=0.05)
+    assert waits[3] == pytest.approx(0.2, abs=0.05)
@@ -0,0 +1,13 @@
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+from readiness import PageTimings
+
+def test_wait_records_timeouts_instead_of_raising():
+    timings = PageTimings(timeout_ms=10)
+    assert timings.wait("perf_tab", lambda: None)
+
+    def timeout():
+        raise PlaywrightTimeoutError("timeout")
+    assert not timings.wait("perf_tab", timeout)
+    assert [(label, ok) for label, _, ok in timings.records] == [("perf_tab", True), ("perf_tab", False)]
+    assert timings.summary().startswith("perf_tab 2回")
+    assert "(タイムアウト1)" in timings.summary()
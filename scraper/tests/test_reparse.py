@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+import reparse
+
+def test_reparse_writes_and_commits_per_chunk(monkeypatch):
+    calls, rebuilt, refreshed = [], [], []
+    monkeypatch.setattr(reparse, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(reparse, "load_targets", lambda since, kind: (["h1", "h2", "h3"], []))
+    monkeypatch.setattr(reparse, "_parse_battlelog", lambda h: (h, [{"page": h}], None))
+    monkeypatch.setattr(reparse, "upsert_battles", lambda battles: calls.append([b["page"] for b in battles]) or (["new"], ["updated"]))
+    monkeypatch.setattr(reparse, "rebuild_rollups", lambda: rebuilt.append(True))
+    monkeypatch.setattr(reparse, "refresh_all", lambda rebuild, write_log_func: refreshed.append(rebuild))
+
+    assert reparse.reparse(workers=2, write_log_func=lambda m: None, chunk_pages=2) == 0
+    assert calls == [["h1", "h2"], ["h3"]]
+    # 上書きした試合があれば集計テーブルを作り直す
+    assert rebuilt == [True]
+    # 分析テーブルも全件を再計算する
+    assert refreshed == [True]
+
+def test_reparse_skips_analytics_when_nothing_changed(monkeypatch):
+    refreshed = []
+    monkeypatch.setattr(reparse, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(reparse, "load_targets", lambda since, kind: (["h1"], []))
+    monkeypatch.setattr(reparse, "_parse_battlelog", lambda h: (h, [{"page": h}], None))
+    monkeypatch.setattr(reparse, "upsert_battles", lambda battles: ([], []))
+    monkeypatch.setattr(reparse, "refresh_all", lambda rebuild, write_log_func: refreshed.append(rebuild))
+
+    assert reparse.reparse(workers=1, write_log_func=lambda m: None) == 0
+    assert refreshed == []
@@ -0,0 +1,55 @@
+# 各イメージの requirements.txt が、そのイメージで import されるモジュールの依存を全て含んでいるかを確認する。
+# discord-bot イメージは scraper ディレクトリを /app/shared としてマウントし、scraper.py などを import するため、
+# 共有モジュールが新しいパッケージを使い始めたら Bot 側の requirements.txt にも追加が必要になる。
+import ast
+import os
+import sys
+
+SCRAPER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_DIR = os.path.join(os.path.dirname(SCRAPER_DIR), "discord_bot")
+
+# import名 → pipのパッケージ名 (同じものは省略)
+PIP_NAMES = {"psycopg2": "psycopg2-binary", "discord": "discord.py", "bs4": "beautifulsoup4"}
+
+def _imports(path):
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(a.name.split(".")[0] for a in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module.split(".")[0])
+    return names
+
+def _third_party(entry_files, search_dirs):
+    """entry_files から辿れる全モジュールの、標準ライブラリ以外の import を返す"""
+    local = {os.path.splitext(f)[0]: os.path.join(d, f) for d in search_dirs for f in os.listdir(d) if f.endswith(".py")}
+    seen, pending, external = set(), list(entry_files), set()
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        for name in _imports(path):
+            if name in local:
+                pending.append(local[name])
+            elif name not in sys.stdlib_module_names:
+                external.add(name)
+    return external
+
+def _requirements(path):
+    with open(path, encoding="utf-8") as f:
+        return {line.split("==")[0].split(">=")[0].strip().lower() for line in f if line.strip() and not line.startswith("#")}
+
+def _missing(external, requirements):
+    return sorted(n for n in external if PIP_NAMES.get(n, n).lower().replace("_", "-") not in {r.replace("_", "-") for r in requirements})
+
+def test_bot_requirements_cover_shared_modules():
+    external = _third_party([os.path.join(BOT_DIR, "bot.py")], [BOT_DIR, SCRAPER_DIR])
+    assert _missing(external, _requirements(os.path.join(BOT_DIR, "requirements.txt"))) == []
+
+def test_scraper_requirements_cover_all_modules():
+    entries = [os.path.join(SCRAPER_DIR, f) for f in os.listdir(SCRAPER_DIR) if f.endswith(".py")]
+    external = _third_party(entries, [SCRAPER_DIR])
+    assert _missing(external, _requirements(os.path.join(SCRAPER_DIR, "requirements.txt"))) == []
@@ -0,0 +1,8 @@
+from resource_filter import ResourceFilter
+
+def test_block_reason():
+    rf = ResourceFilter(allowed_hosts=["streetfighter.com"], blocked_keywords=["cookiebot"], enabled=True)
+    assert rf.block_reason("https://www.streetfighter.com/6/buckler/ja-jp/profile/1/battlelog", "document") is None
+    assert rf.block_reason("https://www.streetfighter.com/6/buckler/assets/a.png", "image") == "type"
+    assert rf.block_reason("https://cdn.example.com/app.js", "script") == "third_party"
+    assert rf.block_reason("https://consent.streetfighter.com/cookiebot.js", "script") == "keyword"
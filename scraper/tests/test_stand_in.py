@@ -0,0 +1,27 @@
+import re
+import http_fetch
+import ingest
+import page_parser
+from bench.stand_in import render_battlelog, render_play
+
+def test_battlelog_html_and_embedded_json_agree():
+    # ブラウザ版 (クラス名から抽出) と HTTP版 (埋め込みJSON) が同じ試合を返すこと
+    html = render_battlelog("1234567890", 2, 5)
+    from_html = page_parser.parse_battlelog_html(html)
+    from_json = http_fetch.parse_battlelog(http_fetch.extract_page_props(html))
+    assert len(from_html) == 10
+    assert from_html == from_json
+    assert http_fetch.total_pages(http_fetch.extract_page_props(html)) == 5
+
+def test_battle_keys_agree_between_backends():
+    # 画面表示のMRは桁区切り付き ("1,580 MR")。どちらの取得方法でも同じ試合は同じ battle_key になる
+    html = render_battlelog("1234567890", 1, 5)
+    assert re.search(r'battle_data_lp">\d,\d{3} MR<', html)
+    from_html = [ingest.battle_key(b) for b in page_parser.parse_battlelog_html(html)]
+    from_json = [ingest.battle_key(b) for b in http_fetch.parse_battlelog(http_fetch.extract_page_props(html))]
+    assert from_html == from_json
+    assert len(set(from_html)) == 10
+
+def test_play_page_has_every_stat():
+    stats = page_parser.parse_play_html(render_play("1234567890"))
+    assert set(stats) == set(http_fetch.PLAY_STATS_KEYS)
@@ -0,0 +1,112 @@
+import os
+import signal
+import socket
+import threading
+import time
+from config import ENV_ERROR, CRAWL_CONCURRENCY, JOB_LEASE_SEC, JOB_POLL_SEC
+from database import init_db
+from scraper import scrape_sf6
+from backfill import backfill_user
+from browser_pool import BrowserPool
+from log_pipeline import write_log, log_context
+import jobs
+import analytics
+import metrics
+
+# コンテナを複数起動しても区別できるよう ホスト名:PID をワーカーIDにする
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_held = set()
+_held_lock = threading.Lock()
+
+def crawl_loop(stop_event):
+    """ジョブを1件ずつ取得して巡回する。スレッドごとにChromiumを1つ使い回す"""
+    with BrowserPool(write_log_func=write_log) as pool:
+        while not stop_event.is_set():
+            try:
+                job = jobs.claim(WORKER_ID)
+            except Exception as e:
+                write_log(f"💥 ジョブ取得エラー: {e}")
+                job = None
+            if job is None:
+                stop_event.wait(JOB_POLL_SEC)
+                continue
+            run_job(job, pool)
+
+def run_job(job, pool):
+    with _held_lock: _held.add(job.id)
+    started = time.monotonic()
+    with log_context(user=job.player_name, phase="crawl"):
+        try:
+            if job.mode == "backfill":
+                ok = backfill_user(job.user_code, job.player_name, write_log, pool=pool, max_pages=job.max_pages,
+                                   on_progress=lambda done, total: jobs.progress(job.id, done, total))
+            else:
+                ok = scrape_sf6(job.user_code, job.player_name, write_log, max_pages=job.max_pages, pool=pool, incremental=job.incremental)
+            error = None if ok else f"{job.mode} returned False"
+        except Exception as e:
+            ok, error = False, e
+        elapsed = time.monotonic() - started
+        metrics.SCRAPE_RUNS_TOTAL.labels(user=job.player_name, mode=job.mode, result="ok" if ok else "error").inc()
+        metrics.SCRAPE_RUN_SECONDS.labels(user=job.player_name, mode=job.mode).observe(elapsed)
+        try:
+            if ok:
+                jobs.complete(job.id, WORKER_ID)
+                write_log(f"✅ ジョブ#{job.id} {job.player_name} 完了 ({elapsed:.1f}秒)", duration=round(elapsed, 2))
+                refresh_analytics(job)
+            else:
+                jobs.fail(job.id, WORKER_ID, error)
+                write_log(f"❌ ジョブ#{job.id} {job.player_name} 失敗 (試行 {job.attempts}/{job.max_attempts}): {error}", duration=round(elapsed, 2))
+                # 失敗までに取得したページの戦績は保存済みのため、分析にも反映しておく
+                refresh_analytics(job)
+        finally:
+            with _held_lock: _held.discard(job.id)
+
+def refresh_analytics(job):
+    """取り込み後に分析テーブルを更新する。失敗してもジョブは成功のままにする"""
+    try:
+        analytics.refresh_player(job.user_code, write_log_func=write_log)
+    except Exception as e:
+        write_log(f"⚠️ 分析の更新に失敗しました: {e}")
+
+def heartbeat_loop(stop_event):
+    """実行中ジョブのリース延長・期限切れジョブの整理・定期ジョブの登録を行う"""
+    interval = max(5, JOB_LEASE_SEC // 3)
+    last_schedule_check = 0.0
+    while not stop_event.is_set():
+        try:
+            with _held_lock: held = list(_held)
+            jobs.renew(held, WORKER_ID)
+            jobs.reap_expired()
+            if time.monotonic() - last_schedule_check >= 60:
+                jobs.enqueue_scheduled(write_log)
+                last_schedule_check = time.monotonic()
+        except Exception as e:
+            write_log(f"⚠️ ワーカー管理処理でエラー: {e}")
+        stop_event.wait(min(interval, 60))
+
+def main():
+    if ENV_ERROR:
+        return
+    init_db()
+    metrics.start_server(write_log)
+    write_log(f"🛠️ ワーカー起動 (ID: {WORKER_ID}, 同時実行数: {CRAWL_CONCURRENCY})")
+    stop_event = threading.Event()
+    threads = [threading.Thread(target=heartbeat_loop, args=(stop_event,), name="JobHeartbeat", daemon=True)]
+    threads += [
+        threading.Thread(target=crawl_loop, args=(stop_event,), name=f"CrawlWorker-{i+1}", daemon=True)
+        for i in range(max(1, CRAWL_CONCURRENCY))
+    ]
+    # docker stop (SIGTERM) でも新規ジョブの取得をやめて終了する。実行中のジョブはリース切れ後に再実行される
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    for t in threads: t.start()
+    try:
+        while not stop_event.is_set():
+            stop_event.wait(1)
+    except KeyboardInterrupt:
+        stop_event.set()
+    write_log("🛑 ワーカーを停止します。")
+    for t in threads: t.join(timeout=30)
+
+if __name__ == "__main__":
+    main()